@@ -0,0 +1,167 @@
+"""
+Columnar export of audit results to Parquet or Arrow IPC.
+
+Rows are buffered and written out one row group (Parquet) or record batch
+(Arrow) at a time, so memory stays bounded by ``row_group_size`` however
+many rows are exported. Status, risk level and domain are dictionary
+encoded and ``created_at`` is a UTC timestamp, so the files load straight
+into typed dataframe columns:
+
+    pd.read_parquet("audits.parquet")
+    pa.ipc.open_file("audits.arrow").read_all()
+
+Requires pyarrow (``pip install pyarrow``), which is not needed by the
+rest of the package.
+"""
+
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+from .audit_store import AuditStore, get_audit_store
+
+FORMATS = ("parquet", "arrow")
+DEFAULT_ROW_GROUP_SIZE = 20_000
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise ImportError("Audit export requires pyarrow: pip install pyarrow") from e
+    return pa
+
+
+def audit_schema():
+    pa = _pyarrow()
+    category = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        pa.field("id", pa.int64()),
+        pa.field("company_url", pa.string()),
+        pa.field("domain", category),
+        pa.field("url", pa.string()),
+        pa.field("title", pa.string()),
+        pa.field("status", category),
+        pa.field("risk_level", category),
+        pa.field("analysis", pa.large_string()),
+        pa.field("content_preview", pa.string()),
+        pa.field("created_at", pa.timestamp("us", tz="UTC")),
+    ])
+
+
+class AuditExporter:
+    """Streaming writer of audit result rows.
+
+    Use as a context manager; ``write`` accepts rows as returned by
+    ``AuditStore`` (or ``result_row``) and flushes every ``row_group_size``
+    rows.
+    """
+
+    def __init__(self, path: str, fmt: str = "parquet", row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format {fmt!r}; expected one of {FORMATS}")
+        self.path = path
+        self.fmt = fmt
+        self.row_group_size = row_group_size
+        self.rows_written = 0
+        self._pa = _pyarrow()
+        self._schema = audit_schema()
+        self._buffer: Dict[str, List[Any]] = {name: [] for name in self._schema.names}
+        self._categories: Dict[str, Dict[str, int]] = {}
+        self._buffered = 0
+        self._writer = None
+        self._sink = None
+
+    def __enter__(self) -> "AuditExporter":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def open(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if self.fmt == "parquet":
+            import pyarrow.parquet as pq
+
+            self._writer = pq.ParquetWriter(self.path, self._schema, compression="zstd")
+        else:
+            self._sink = self._pa.OSFile(self.path, "wb")
+            options = self._pa.ipc.IpcWriteOptions(compression="zstd", emit_dictionary_deltas=True)
+            self._writer = self._pa.ipc.new_file(self._sink, self._schema, options=options)
+
+    def write(self, row: Dict[str, Any]) -> None:
+        for name, column in self._buffer.items():
+            value = row.get(name)
+            if name == "created_at" and value is not None:
+                value = int(value * 1_000_000)
+            column.append(value)
+        self._buffered += 1
+        if self._buffered >= self.row_group_size:
+            self.flush()
+
+    def write_many(self, rows: Iterable[Dict[str, Any]]) -> None:
+        for row in rows:
+            self.write(row)
+
+    def _column(self, field: Any) -> Any:
+        values = self._buffer[field.name]
+        if not self._pa.types.is_dictionary(field.type):
+            return self._pa.array(values, type=field.type)
+        # Categories keep one growing dictionary per column, so every batch's
+        # dictionary extends the previous one (required for Arrow IPC files).
+        categories = self._categories.setdefault(field.name, {})
+        indices = [None if v is None else categories.setdefault(v, len(categories)) for v in values]
+        return self._pa.DictionaryArray.from_arrays(
+            self._pa.array(indices, type=field.type.index_type),
+            self._pa.array(list(categories), type=field.type.value_type),
+        )
+
+    def flush(self) -> None:
+        if not self._buffered:
+            return
+        batch = self._pa.record_batch([self._column(f) for f in self._schema], schema=self._schema)
+        if self.fmt == "parquet":
+            self._writer.write_batch(batch, row_group_size=self._buffered)
+        else:
+            self._writer.write_batch(batch)
+        self.rows_written += self._buffered
+        for column in self._buffer.values():
+            column.clear()
+        self._buffered = 0
+
+    def close(self) -> None:
+        if self._writer is None:
+            return
+        self.flush()
+        self._writer.close()
+        if self._sink is not None:
+            self._sink.close()
+        self._writer = self._sink = None
+
+
+def export_audits(
+    path: str,
+    fmt: str = "parquet",
+    store: Optional[AuditStore] = None,
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+    **filters: Any,
+) -> int:
+    """
+    Export stored audit results matching ``filters`` (see AuditStore.query).
+
+    Args:
+        path: Output file path
+        fmt: "parquet" or "arrow"
+        store: Store to read from (defaults to the shared AUDIT_DB store)
+        row_group_size: Rows per row group / record batch
+
+    Returns:
+        Number of rows written
+    """
+    store = store or get_audit_store()
+    with AuditExporter(path, fmt=fmt, row_group_size=row_group_size) as exporter:
+        for batch in store.iter_results(batch_size=row_group_size, **filters):
+            exporter.write_many(batch)
+    print(f"[audit] exported {exporter.rows_written} results to {path}")
+    return exporter.rows_written
+
@@ -0,0 +1,352 @@
+"""
+Shared company audit queue with leased jobs, for running many audit workers.
+
+    python -m agents.audit_queue enqueue companies.txt      # one URL per line
+    python -m agents.audit_queue work --processes 8         # on each machine
+    python -m agents.audit_queue status
+
+Jobs live in the audit database (AUDIT_DB), next to the results. A worker
+leases one company at a time and renews the lease with heartbeats while it
+audits the site. A worker that dies stops heartbeating, so its lease expires
+after AUDIT_JOB_LEASE_S (default 120 s) and another worker picks the job up.
+A job that fails AUDIT_JOB_MAX_ATTEMPTS times (default 3) is marked failed,
+as is one whose lease expired that many times (a page that kills workers).
+
+A job's results are inserted in the same transaction that marks it done,
+and only while the worker still holds its lease. A worker that lost its
+lease therefore cannot write, and each company's results are stored once.
+
+Workers on several machines can share one database file on a network
+filesystem with working POSIX locks; set AUDIT_DB_JOURNAL_MODE=DELETE there,
+since WAL only works within one machine.
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from .audit_store import INSERT_COLUMNS, SCHEMA as AUDIT_SCHEMA, connect, result_row
+from .metrics import counter
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit_jobs (
+    company_url TEXT PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'queued',
+    worker_id TEXT,
+    lease_expires_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    result_count INTEGER,
+    enqueued_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_audit_jobs_status ON audit_jobs (status, enqueued_at);
+"""
+
+AUDIT_JOBS = counter("audit_jobs", "Audit queue jobs finished by outcome (done, retried, failed, lost)", ["outcome"])
+
+
+class LeaseLost(RuntimeError):
+    """The worker's lease expired or was taken over by another worker."""
+
+
+class AuditQueue:
+    """Company audit jobs in the shared audit database."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        lease_s: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+    ):
+        self.path = path or os.getenv("AUDIT_DB", os.path.join(os.getenv("TMPDIR", "/tmp"), "audits.sqlite3"))
+        self.lease_s = lease_s or float(os.getenv("AUDIT_JOB_LEASE_S", "120"))
+        self.max_attempts = max_attempts or int(os.getenv("AUDIT_JOB_MAX_ATTEMPTS", "3"))
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(AUDIT_SCHEMA + SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread: the heartbeat thread writes alongside the worker.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path, timeout=30)
+        return conn
+
+    def enqueue(self, company_urls: Iterable[str]) -> int:
+        """Add companies; ones already queued, running or audited are left alone."""
+        now = time.time()
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO audit_jobs (company_url, enqueued_at) VALUES (?, ?)",
+                [(url, now) for url in company_urls],
+            )
+            return conn.total_changes - before
+
+    def lease(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Claim the oldest queued job, or one whose lease has expired.
+
+        An expired job that has already used ``max_attempts`` is marked failed
+        instead: its worker died mid-audit (OOM, segfault, SIGKILL) without
+        reaching fail(), and leasing it again would just kill another worker.
+        """
+        conn = self._connect()
+        now = time.time()
+        # IMMEDIATE takes the write lock up front, so two workers can't claim the same row.
+        conn.execute("BEGIN IMMEDIATE")
+        with conn:
+            poisoned = conn.execute(
+                "SELECT company_url, worker_id, attempts FROM audit_jobs "
+                "WHERE status = 'leased' AND lease_expires_at < ? AND attempts >= ?",
+                (now, self.max_attempts),
+            ).fetchall()
+            for job in poisoned:
+                conn.execute(
+                    "UPDATE audit_jobs SET status = 'failed', lease_expires_at = NULL, finished_at = ?, "
+                    "error = ? WHERE company_url = ?",
+                    (now, f"Worker {job['worker_id']} died during attempt {job['attempts']} of {self.max_attempts}",
+                     job["company_url"]),
+                )
+            row = conn.execute(
+                "SELECT company_url, status, worker_id, attempts FROM audit_jobs "
+                "WHERE status = 'queued' OR (status = 'leased' AND lease_expires_at < ?) "
+                "ORDER BY enqueued_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE audit_jobs SET status = 'leased', worker_id = ?, lease_expires_at = ?, "
+                    "attempts = attempts + 1 WHERE company_url = ?",
+                    (worker_id, now + self.lease_s, row["company_url"]),
+                )
+        for job in poisoned:
+            print(f"[queue] Poison job {job['company_url']}: its worker died on all "
+                  f"{job['attempts']} attempt(s); marked failed")
+            AUDIT_JOBS.labels(outcome="failed").inc()
+        if row is None:
+            return None
+        if row["status"] == "leased":
+            print(f"[queue] Re-leasing {row['company_url']} abandoned by {row['worker_id']}")
+        return {"company_url": row["company_url"], "attempt": row["attempts"] + 1}
+
+    def heartbeat(self, company_url: str, worker_id: str) -> bool:
+        """Extend the lease; False if the worker no longer holds it."""
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE audit_jobs SET lease_expires_at = ? "
+                "WHERE company_url = ? AND worker_id = ? AND status = 'leased'",
+                (time.time() + self.lease_s, company_url, worker_id),
+            ).rowcount == 1
+
+    def complete(self, company_url: str, worker_id: str, results: List[Any]) -> int:
+        """Store results and mark the job done in one transaction, if the lease is still ours."""
+        now = time.time()
+        rows = [tuple(result_row(company_url, r, now).values()) for r in results]
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        with conn:
+            done = conn.execute(
+                "UPDATE audit_jobs SET status = 'done', result_count = ?, finished_at = ?, error = NULL "
+                "WHERE company_url = ? AND worker_id = ? AND status = 'leased'",
+                (len(rows), now, company_url, worker_id),
+            ).rowcount
+            if not done:
+                raise LeaseLost(f"Lease on {company_url} lost before its results were stored")
+            conn.executemany(
+                f"INSERT INTO audit_results ({', '.join(INSERT_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in INSERT_COLUMNS)})",
+                rows,
+            )
+        return len(rows)
+
+    def fail(self, company_url: str, worker_id: str, error: str) -> str:
+        """Requeue the job, or mark it failed after ``max_attempts``; returns the new status."""
+        conn = self._connect()
+        # Same fencing as complete(): a re-leased job must not be touched by its previous worker.
+        conn.execute("BEGIN IMMEDIATE")
+        with conn:
+            row = conn.execute(
+                "SELECT attempts FROM audit_jobs WHERE company_url = ? AND worker_id = ? AND status = 'leased'",
+                (company_url, worker_id),
+            ).fetchone()
+            if row is None:
+                return "lost"
+            status = "failed" if row["attempts"] >= self.max_attempts else "queued"
+            conn.execute(
+                "UPDATE audit_jobs SET status = ?, error = ?, lease_expires_at = NULL, finished_at = ? "
+                "WHERE company_url = ? AND worker_id = ? AND status = 'leased'",
+                (status, error[:1000], time.time() if status == "failed" else None, company_url, worker_id),
+            )
+        return status
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._connect().execute(
+            "SELECT status, COUNT(*) AS n FROM audit_jobs GROUP BY status"
+        ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+# -----------------------------
+# Workers
+# -----------------------------
+
+class _Heartbeat(threading.Thread):
+    """Renews a job's lease every third of the lease period until stopped.
+
+    A renewal that fails with a database error (e.g. "database is locked")
+    is retried on the next tick; once the lease would expire without a
+    successful renewal, the lease is treated as lost.
+    """
+
+    def __init__(self, queue: AuditQueue, company_url: str, worker_id: str):
+        super().__init__(name=f"heartbeat-{company_url}", daemon=True)
+        self.queue = queue
+        self.company_url = company_url
+        self.worker_id = worker_id
+        self.lost = threading.Event()
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        renewed_at = time.monotonic()
+        while not self._done.wait(self.queue.lease_s / 3):
+            try:
+                held = self.queue.heartbeat(self.company_url, self.worker_id)
+            except sqlite3.Error as e:
+                # Stop one tick early: the next attempt would come after the lease expired.
+                if time.monotonic() - renewed_at + self.queue.lease_s / 3 >= self.queue.lease_s:
+                    print(f"[worker {self.worker_id}] Could not renew the lease on {self.company_url}: {e}")
+                    self.lost.set()
+                    return
+                continue
+            if not held:
+                self.lost.set()
+                return
+            renewed_at = time.monotonic()
+
+    def stop(self) -> None:
+        self._done.set()
+        self.join()
+
+
+def _iter_audit(analyzer: str):
+    if analyzer == "gemini":
+        from .lead_finder import LeadFinderAgent
+
+        return LeadFinderAgent(os.environ["GOOGLE_API_KEY"]).iter_company_website
+    from .chief_marketing_agent.sub_agents.lead_finder_agent.agent import iter_company_website
+
+    return iter_company_website
+
+
+def run_worker(
+    path: Optional[str] = None,
+    analyzer: str = "heuristic",
+    wait: bool = False,
+    poll_s: Optional[float] = None,
+    worker_id: Optional[str] = None,
+) -> Dict[str, int]:
+    """Audit queued companies until the queue is drained (or forever with ``wait``)."""
+    queue = AuditQueue(path)
+    poll_s = poll_s or float(os.getenv("AUDIT_QUEUE_POLL_S", "1"))
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    iter_company_website = _iter_audit(analyzer)
+    outcomes = {"done": 0, "retried": 0, "failed": 0, "lost": 0}
+    while True:
+        job = queue.lease(worker_id)
+        if job is None:
+            counts = queue.counts()
+            # Leased jobs may still be abandoned by a dead worker, so keep polling until they finish.
+            if not wait and not counts.get("queued") and not counts.get("leased"):
+                break
+            time.sleep(poll_s)
+            continue
+        company_url = job["company_url"]
+        heartbeat = _Heartbeat(queue, company_url, worker_id)
+        heartbeat.start()
+        try:
+            results = []
+            # Strict discovery raises if the home page can't be fetched, so an
+            # empty result means the site has no product pages, not an outage.
+            for result in iter_company_website(company_url, record=False, strict=True):
+                results.append(result)
+                if heartbeat.lost.is_set():
+                    raise LeaseLost(f"Lease on {company_url} lost during the audit")
+            heartbeat.stop()
+            if results and not any(result.get("compliance_status") != "ERROR" for result in results):
+                # Every page errored: retry (up to max_attempts) instead of
+                # recording the company as done.
+                raise RuntimeError(f"No page analysed successfully ({len(results)} error result(s))")
+            count = queue.complete(company_url, worker_id, results)
+            outcome = "done"
+            print(f"[worker {worker_id}] {company_url}: {count} result(s)")
+        except LeaseLost as e:
+            outcome = "lost"
+            print(f"[worker {worker_id}] {e}")
+        except Exception as e:
+            status = queue.fail(company_url, worker_id, f"{type(e).__name__}: {e}")
+            outcome = {"queued": "retried", "failed": "failed"}.get(status, "lost")
+            print(f"[worker {worker_id}] {company_url} failed (attempt {job['attempt']}, {status}): {e}")
+        finally:
+            heartbeat.stop()
+        outcomes[outcome] += 1
+        AUDIT_JOBS.labels(outcome=outcome).inc()
+    print(f"[worker {worker_id}] Finished: {outcomes}")
+    return outcomes
+
+
+def _worker_process(path: Optional[str], analyzer: str, wait: bool) -> None:
+    run_worker(path, analyzer, wait)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Shared audit queue and workers")
+    parser.add_argument("--db", help="audit database shared by all workers (default AUDIT_DB)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    enqueue = commands.add_parser("enqueue", help="add company URLs (arguments or a file with one per line)")
+    enqueue.add_argument("sources", nargs="+", help="URLs or files of URLs")
+    work = commands.add_parser("work", help="run audit workers")
+    work.add_argument("--processes", type=int, default=1, help="worker processes on this machine")
+    work.add_argument("--analyzer", choices=["heuristic", "gemini"], default="heuristic",
+                      help="rule-based check, or the Gemini LeadFinderAgent (needs GOOGLE_API_KEY)")
+    work.add_argument("--wait", action="store_true", help="keep polling for new jobs instead of exiting")
+    commands.add_parser("status", help="job counts by status")
+    args = parser.parse_args(argv)
+
+    if args.command == "enqueue":
+        urls: List[str] = []
+        for source in args.sources:
+            if os.path.isfile(source):
+                with open(source) as f:
+                    urls += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+            else:
+                urls.append(source)
+        print(f"Queued {AuditQueue(args.db).enqueue(urls)} new of {len(urls)} companies")
+    elif args.command == "status":
+        print(AuditQueue(args.db).counts())
+    else:
+        AuditQueue(args.db)  # create the schema before the workers start
+        # Spawned (not forked) so no worker inherits the parent's SQLite connections.
+        context = multiprocessing.get_context("spawn")
+        processes = [
+            context.Process(target=_worker_process, args=(args.db, args.analyzer, args.wait))
+            for _ in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        print(AuditQueue(args.db).counts())
+        return 0 if all(p.exitcode == 0 for p in processes) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
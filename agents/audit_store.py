@@ -0,0 +1,235 @@
+"""
+Audit results store - compliance results from analyze_company_website in SQLite.
+
+Every audited page is written as one row, so historical questions (e.g. all
+NON-COMPLIANT pages for a domain last month) are answered by an indexed query
+instead of a re-crawl. The database runs in WAL mode so the API can read
+while a crawl is writing.
+
+The location comes from the AUDIT_DB env var (default $TMPDIR/audits.sqlite3).
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit_results (
+    id INTEGER PRIMARY KEY,
+    company_url TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    url TEXT NOT NULL,
+    title TEXT,
+    status TEXT NOT NULL,
+    risk_level TEXT,
+    analysis TEXT,
+    content_preview TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_audit_domain_created ON audit_results (domain, created_at);
+CREATE INDEX IF NOT EXISTS idx_audit_url ON audit_results (url);
+CREATE INDEX IF NOT EXISTS idx_audit_status_created ON audit_results (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_audit_risk_created ON audit_results (risk_level, created_at);
+CREATE INDEX IF NOT EXISTS idx_audit_created ON audit_results (created_at);
+"""
+
+COLUMNS = [
+    "id", "company_url", "domain", "url", "title", "status",
+    "risk_level", "analysis", "content_preview", "created_at",
+]
+
+INSERT_COLUMNS = COLUMNS[1:]
+
+MAX_PAGE_SIZE = 500
+# Results buffered by streaming crawls before each bulk insert.
+AUDIT_BATCH_SIZE = 20
+
+_RISK_RE = re.compile(r"risk level:?\**\s*\[?(HIGH|MEDIUM|LOW)", re.IGNORECASE)
+# Heuristic results carry no risk level; derive one from the status.
+_STATUS_RISK = {"NON-COMPLIANT": "HIGH", "NEEDS REVIEW": "MEDIUM", "COMPLIANT": "LOW"}
+
+
+def domain_of(url: str) -> str:
+    netloc = urlparse(url if "//" in url else f"//{url}").netloc.lower()
+    return netloc[4:] if netloc.startswith("www.") else netloc
+
+
+def risk_level_for(result: Dict[str, Any]) -> Optional[str]:
+    match = _RISK_RE.search(result.get("analysis") or "")
+    if match:
+        return match.group(1).upper()
+    return _STATUS_RISK.get(result.get("compliance_status", ""))
+
+
+def result_row(company_url: str, result: Dict[str, Any], created_at: float) -> Dict[str, Any]:
+    """Table row (without id) for one analyze_company_website result."""
+    return {
+        "company_url": company_url,
+        "domain": domain_of(result.get("url") or company_url),
+        "url": result.get("url", ""),
+        "title": result.get("title"),
+        "status": result.get("compliance_status", "NEEDS REVIEW"),
+        "risk_level": risk_level_for(result),
+        "analysis": result.get("analysis"),
+        "content_preview": result.get("content_preview"),
+        "created_at": created_at,
+    }
+
+
+def connect(path: str, timeout: float = 10) -> sqlite3.Connection:
+    """Connection with the store's pragmas.
+
+    WAL needs shared memory on one machine; when workers on several hosts
+    share the database over a network filesystem, set
+    AUDIT_DB_JOURNAL_MODE=DELETE.
+    """
+    journal_mode = os.getenv("AUDIT_DB_JOURNAL_MODE", "WAL").upper()
+    if journal_mode not in ("WAL", "DELETE", "TRUNCATE", "PERSIST"):
+        raise ValueError(f"Unsupported AUDIT_DB_JOURNAL_MODE: {journal_mode}")
+    conn = sqlite3.connect(path, timeout=timeout)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA journal_mode={journal_mode}")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class AuditStore:
+    """SQLite-backed store of per-page compliance results."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("AUDIT_DB", os.path.join(os.getenv("TMPDIR", "/tmp"), "audits.sqlite3"))
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; FastAPI runs sync endpoints in a thread pool.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+    def record_results(
+        self,
+        company_url: str,
+        results: Iterable[Dict[str, Any]],
+    ) -> int:
+        """Bulk-insert one audit's page results in a single transaction."""
+        now = time.time()
+        rows = [tuple(result_row(company_url, r, now).values()) for r in results]
+        if not rows:
+            return 0
+        with self._connect() as conn:
+            conn.executemany(
+                f"INSERT INTO audit_results ({', '.join(INSERT_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in INSERT_COLUMNS)})",
+                rows,
+            )
+        return len(rows)
+
+    @staticmethod
+    def _where(
+        domain: Optional[str] = None,
+        url: Optional[str] = None,
+        status: Optional[str] = None,
+        risk_level: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ) -> Tuple[str, List[Any]]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        for column, value in (
+            ("domain", domain_of(domain) if domain else None),
+            ("url", url),
+            ("status", status.upper() if status else None),
+            ("risk_level", risk_level.upper() if risk_level else None),
+        ):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        return (f" WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+    def query(
+        self,
+        domain: Optional[str] = None,
+        url: Optional[str] = None,
+        status: Optional[str] = None,
+        risk_level: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> Dict[str, Any]:
+        """Filtered page of results, newest first.
+
+        Returns:
+            Dict with items, total, limit and offset
+        """
+        where, params = self._where(domain, url, status, risk_level, since, until)
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        offset = max(0, offset)
+
+        conn = self._connect()
+        total = conn.execute(f"SELECT COUNT(*) FROM audit_results{where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM audit_results{where} ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+            [*params, limit, offset],
+        ).fetchall()
+        return {"items": [dict(row) for row in rows], "total": total, "limit": limit, "offset": offset}
+
+    def iter_results(self, batch_size: int = 10_000, **filters: Any) -> Iterator[List[Dict[str, Any]]]:
+        """All matching results, oldest first, in batches of at most ``batch_size`` rows.
+
+        Uses its own connection and steps the cursor lazily, so memory stays
+        bounded by the batch size however many rows match.
+        """
+        where, params = self._where(**filters)
+        conn = connect(self.path)
+        try:
+            cursor = conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM audit_results{where} ORDER BY created_at, id", params
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [dict(row) for row in rows]
+        finally:
+            conn.close()
+
+
+_store: Optional[AuditStore] = None
+_store_lock = threading.Lock()
+
+
+def get_audit_store() -> AuditStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = AuditStore()
+        return _store
+
+
+def record_audit(company_url: str, results: List[Any]) -> None:
+    """Persist results (dicts or ComplianceResult records) from a crawl.
+
+    Storage failures never fail the audit itself.
+    """
+    if not results or os.getenv("AUDIT_DB_DISABLED") == "1":
+        return
+    try:
+        count = get_audit_store().record_results(company_url, results)
+        print(f"[audit] stored {count} results for {domain_of(company_url)}")
+    except sqlite3.Error as e:
+        print(f"[audit] could not store results: {e}")
@@ -0,0 +1,428 @@
+"""
+Record/replay of HTTP and model calls ("cassettes").
+
+In record mode every ``requests`` call, LiteLlm completion and Gemini
+``generate_content`` call is passed through and its response saved to a
+JSON cassette file. In replay mode the same calls are answered from the
+cassette without touching the network, optionally sleeping for the
+recorded (or a fixed) latency so timings stay realistic.
+
+    with use_cassette("cassettes/acme.json", mode="record"):
+        pipeline.run(payload)
+
+Requests are matched by a hash of their content (method and URL; model
+messages and tools; Gemini prompt). Repeated identical requests are
+answered in recorded order. Streamed HTTP responses are recorded once the
+caller has read (or abandoned) the body. When nothing matches, a model call falls back
+to the oldest unused response recorded for the same agent (same system
+instructions), e.g. when a prompt embeds a generated id; any other miss
+raises ``CassetteMiss``. Random choices that shape prompts (the KOL A/B
+assignment) draw their seed from ``random_seed()``, which records it in
+the cassette, so a replay makes the same choices.
+
+The server and scripts can enable a cassette with env vars: CASSETTE_MODE
+(record / replay), CASSETTE_PATH and CASSETTE_LATENCY ("recorded" or
+seconds; default no added latency).
+
+HTTP calls to the trace collector (OTEL_EXPORTER_OTLP_ENDPOINT) and to any
+URL prefix listed in CASSETTE_PASSTHROUGH (comma-separated) bypass the
+cassette: they are sent as usual and neither recorded nor replayed.
+"""
+
+import asyncio
+import atexit
+import base64
+import hashlib
+import json
+import os
+import secrets
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set
+
+import requests
+
+CASSETTE_VERSION = 1
+MODES = ("record", "replay")
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+def _canonical(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    return value
+
+
+def request_key(kind: str, *parts: Any) -> str:
+    payload = json.dumps([kind, *(_canonical(p) for p in parts)], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """Recorded interactions, keyed by request hash."""
+
+    def __init__(self, path: str, mode: str = "replay", latency: Optional[str] = None, allow_repeats: bool = False):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}; expected one of {MODES}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        # Serve the same recorded response for every matching request (benchmark loops).
+        self.allow_repeats = allow_repeats
+        self.interactions: List[Dict[str, Any]] = []
+        self.misses = 0
+        self._unused: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._used: Set[int] = set()
+        self._lock = threading.Lock()
+        if mode == "replay":
+            self.load()
+
+    def load(self) -> None:
+        with open(self.path) as f:
+            data = json.load(f)
+        if data.get("version") != CASSETTE_VERSION:
+            raise ValueError(
+                f"Cassette {self.path} has version {data.get('version')}, expected {CASSETTE_VERSION}; re-record it"
+            )
+        self.interactions = data["interactions"]
+        for interaction in self.interactions:
+            self._unused.setdefault(interaction["key"], deque()).append(interaction)
+
+    def save(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            data = {"version": CASSETTE_VERSION, "created": time.time(), "interactions": self.interactions}
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=1, default=str)
+        os.replace(tmp_path, self.path)
+        print(f"[cassette] saved {len(data['interactions'])} interactions to {self.path}")
+
+    def record(
+        self, kind: str, key: str, request: Dict[str, Any], response: Any, latency: float, group: Optional[str] = None
+    ) -> None:
+        with self._lock:
+            self.interactions.append({
+                "kind": kind,
+                "key": key,
+                "group": group,
+                "request": request,
+                "response": response,
+                "latency": round(latency, 4),
+            })
+
+    def take(self, kind: str, key: str, group: Optional[str] = None) -> Dict[str, Any]:
+        """The next recorded response for ``key``; without one, the oldest unused one in ``group``."""
+        with self._lock:
+            queue = self._unused.get(key)
+            if self.allow_repeats and queue:
+                return queue[0]
+            while queue and id(queue[0]) in self._used:
+                queue.popleft()
+            if queue:
+                interaction = queue.popleft()
+            else:
+                self.misses += 1
+                interaction = None
+                if group is not None:
+                    interaction = next((
+                        i for i in self.interactions
+                        if i["kind"] == kind and i.get("group") == group and id(i) not in self._used
+                    ), None)
+                if interaction is None:
+                    raise CassetteMiss(f"No recorded {kind} response matches {key[:12]} in {self.path}")
+            self._used.add(id(interaction))
+        return interaction
+
+    def delay(self, interaction: Dict[str, Any]) -> float:
+        if not self.latency:
+            return 0.0
+        if self.latency == "recorded":
+            return float(interaction.get("latency", 0.0))
+        return float(self.latency)
+
+
+# -----------------------------
+# Serialization of responses
+# -----------------------------
+
+def _dump_http(response: requests.Response, body: bytes) -> Dict[str, Any]:
+    return {
+        "status_code": response.status_code,
+        "reason": response.reason,
+        "url": response.url,
+        "headers": dict(response.headers),
+        "encoding": response.encoding,
+        "body": base64.b64encode(body).decode("ascii"),
+    }
+
+
+def _load_http(data: Dict[str, Any]) -> requests.Response:
+    if "error" in data:
+        # Raise the recorded exception type, so e.g. timeouts replay as timeouts.
+        error = getattr(requests.exceptions, data["error"].split(":", 1)[0], None)
+        if not (isinstance(error, type) and issubclass(error, requests.exceptions.RequestException)):
+            error = requests.exceptions.RequestException
+        raise error(data["error"])
+    response = requests.Response()
+    response.status_code = data["status_code"]
+    response.reason = data.get("reason")
+    response.url = data["url"]
+    response.headers = requests.structures.CaseInsensitiveDict(data["headers"])
+    response.encoding = data.get("encoding")
+    response._content = base64.b64decode(data["body"])
+    response._content_consumed = True
+    return response
+
+
+def _dump_model(response: Any) -> Dict[str, Any]:
+    return json.loads(json.dumps(response.model_dump(), default=str))
+
+
+def _agent_group(messages: Any) -> str:
+    # An agent is identified by its system instructions.
+    system = [m for m in _canonical(messages) if isinstance(m, dict) and m.get("role") == "system"]
+    return request_key("llm-agent", system)
+
+
+def _body_error(error: Exception) -> str:
+    # Body reads raise urllib3 errors; record the requests exception fetch would surface.
+    kind = "ReadTimeout" if "Timeout" in type(error).__name__ else "ConnectionError"
+    return f"{kind}: {error}"
+
+
+class _RecordingBody:
+    """Wraps a streamed response's raw body and reports it once the caller has read it.
+
+    ``finish(body, error)`` is called once: with the body at end of stream,
+    or with an error if reading failed or the caller closed the response
+    early (e.g. ``fetch`` abandoning a download over its time budget).
+    """
+
+    def __init__(self, raw: Any, finish: Any):
+        self._raw = raw
+        self._finish = finish
+        self._chunks: List[bytes] = []
+        self._finished = False
+        if hasattr(raw, "read1"):
+            self.read1 = self._read1
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._raw, name)
+
+    def _done(self, error: Optional[str] = None) -> None:
+        if not self._finished:
+            self._finished = True
+            self._finish(b"".join(self._chunks), error)
+
+    def _read(self, read: Any, eof_if_short: bool, *args: Any, **kwargs: Any) -> bytes:
+        try:
+            chunk = read(*args, **kwargs)
+        except Exception as e:
+            self._done(_body_error(e))
+            raise
+        self._chunks.append(chunk)
+        if not chunk or eof_if_short:
+            self._done()
+        return chunk
+
+    def read(self, amt: Optional[int] = None, *args: Any, **kwargs: Any) -> bytes:
+        return self._read(self._raw.read, amt is None, amt, *args, **kwargs)
+
+    def _read1(self, amt: Optional[int] = None, *args: Any, **kwargs: Any) -> bytes:
+        return self._read(self._raw.read1, False, amt, *args, **kwargs)
+
+    def stream(self, *args: Any, **kwargs: Any) -> Iterator[bytes]:
+        try:
+            for chunk in self._raw.stream(*args, **kwargs):
+                self._chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            self._done(_body_error(e))
+            raise
+        self._done()
+
+    def close(self) -> None:
+        self._done("ReadTimeout: response closed before its body was read")
+        self._raw.close()
+
+
+# -----------------------------
+# Patching
+# -----------------------------
+
+def _passthrough_prefixes() -> List[str]:
+    # Telemetry export is not part of the recorded workload.
+    prefixes = [p.strip() for p in os.getenv("CASSETTE_PASSTHROUGH", "").split(",") if p.strip()]
+    endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+    if endpoint:
+        prefixes.append(endpoint.rstrip("/") + "/")
+    return prefixes
+
+
+def _patch_requests(cassette: Cassette) -> Any:
+    original = requests.Session.request
+    passthrough = tuple(_passthrough_prefixes())
+
+    def request(session: requests.Session, method: str, url: str, params: Any = None, **kwargs: Any) -> Any:
+        full_url = requests.Request(method, url, params=params).prepare().url
+        if passthrough and full_url.startswith(passthrough):
+            return original(session, method, url, params=params, **kwargs)
+        key = request_key("http", method.upper(), full_url)
+        if cassette.mode == "replay":
+            interaction = cassette.take("http", key)
+            time.sleep(cassette.delay(interaction))
+            return _load_http(interaction["response"])
+        started = time.perf_counter()
+        try:
+            response = original(session, method, url, params=params, **kwargs)
+        except requests.exceptions.RequestException as e:
+            cassette.record("http", key, {"method": method, "url": full_url},
+                            {"error": f"{type(e).__name__}: {e}"}, time.perf_counter() - started)
+            raise
+        if not kwargs.get("stream"):
+            # requests has already read the whole body.
+            cassette.record("http", key, {"method": method, "url": full_url},
+                            _dump_http(response, response.content), time.perf_counter() - started)
+            return response
+
+        # Streamed: record once the caller has read the body, so its own
+        # limits (fetch's download time budget) still apply while recording.
+        def finish(body: bytes, error: Optional[str]) -> None:
+            cassette.record("http", key, {"method": method, "url": full_url},
+                            {"error": error} if error else _dump_http(response, body),
+                            time.perf_counter() - started)
+
+        response.raw = _RecordingBody(response.raw, finish)
+        return response
+
+    requests.Session.request = request
+    return lambda: setattr(requests.Session, "request", original)
+
+
+def _patch_litellm(cassette: Cassette) -> Any:
+    try:
+        from google.adk.models.lite_llm import LiteLLMClient
+    except ImportError:
+        return lambda: None
+    original = LiteLLMClient.acompletion
+
+    async def acompletion(client: Any, model: Any, messages: Any, tools: Any, **kwargs: Any) -> Any:
+        if kwargs.get("stream"):
+            if cassette.mode == "replay":
+                raise CassetteMiss("Streaming completions cannot be replayed")
+            return await original(client, model=model, messages=messages, tools=tools, **kwargs)
+        # The model is left out of the key so replays survive routing changes.
+        key = request_key("llm", messages, tools)
+        group = _agent_group(messages)
+        if cassette.mode == "replay":
+            from litellm import ModelResponse
+
+            interaction = cassette.take("llm", key, group)
+            await asyncio.sleep(cassette.delay(interaction))
+            return ModelResponse(**interaction["response"])
+        started = time.perf_counter()
+        response = await original(client, model=model, messages=messages, tools=tools, **kwargs)
+        cassette.record("llm", key, {"model": model}, _dump_model(response), time.perf_counter() - started, group)
+        return response
+
+    LiteLLMClient.acompletion = acompletion
+    return lambda: setattr(LiteLLMClient, "acompletion", original)
+
+
+def _patch_genai(cassette: Cassette) -> Any:
+    try:
+        from google.genai import models, types
+    except ImportError:
+        return lambda: None
+    original = models.Models.generate_content
+
+    def generate_content(client: Any, *, model: str, contents: Any, config: Any = None) -> Any:
+        key = request_key("genai", model, contents)
+        if cassette.mode == "replay":
+            interaction = cassette.take("genai", key)
+            time.sleep(cassette.delay(interaction))
+            return types.GenerateContentResponse.model_validate(interaction["response"])
+        started = time.perf_counter()
+        response = original(client, model=model, contents=contents, config=config)
+        cassette.record("genai", key, {"model": model}, _dump_model(response), time.perf_counter() - started)
+        return response
+
+    models.Models.generate_content = generate_content
+    return lambda: setattr(models.Models, "generate_content", original)
+
+
+_active: Optional[Cassette] = None
+
+
+def random_seed() -> Optional[int]:
+    """Seed for a random choice: recorded in, or replayed from, the active cassette.
+
+    Returns None (seed from the OS) when no cassette is installed.
+    """
+    cassette = _active
+    if cassette is None:
+        return None
+    key = request_key("seed")
+    if cassette.mode == "replay":
+        return int(cassette.take("seed", key)["response"])
+    seed = secrets.randbits(64)
+    cassette.record("seed", key, {}, seed, 0.0)
+    return seed
+
+
+def install(cassette: Cassette) -> Any:
+    """Route HTTP and model calls through ``cassette``; returns an uninstall function."""
+    global _active
+    restores = [_patch_requests(cassette), _patch_litellm(cassette), _patch_genai(cassette)]
+    _active = cassette
+
+    def uninstall() -> None:
+        global _active
+        for restore in reversed(restores):
+            restore()
+        if _active is cassette:
+            _active = None
+
+    return uninstall
+
+
+@contextmanager
+def use_cassette(
+    path: str, mode: str = "replay", latency: Optional[str] = None, allow_repeats: bool = False
+) -> Iterator[Cassette]:
+    cassette = Cassette(path, mode=mode, latency=latency, allow_repeats=allow_repeats)
+    uninstall = install(cassette)
+    try:
+        yield cassette
+    finally:
+        uninstall()
+        if mode == "record":
+            cassette.save()
+        elif cassette.misses:
+            print(f"[cassette] {cassette.misses} model calls were answered by another prompt of the same agent in {path}")
+
+
+def install_from_env() -> Optional[Cassette]:
+    """Enable the cassette configured by CASSETTE_MODE / CASSETTE_PATH, if any."""
+    mode = os.getenv("CASSETTE_MODE", "")
+    if not mode:
+        return None
+    path = os.getenv("CASSETTE_PATH", os.path.join("cassettes", "default.json"))
+    cassette = Cassette(path, mode=mode, latency=os.getenv("CASSETTE_LATENCY") or None)
+    install(cassette)
+    if mode == "record":
+        atexit.register(cassette.save)
+    print(f"[cassette] {mode} mode using {path}")
+    return cassette
@@ -1,11 +1,11 @@
 from google.adk.agents import LlmAgent
-from google.adk.models.lite_llm import LiteLlm
 import os
 
+from ....model_router import model_for
 from .settings import DESCRIPTION, INSTRUCTION
 
 agent = LlmAgent(
-    model= LiteLlm(model="claude-3-7-sonnet-20250219"),
+    model=model_for("email_drafter_agent"),
     name="email_drafter_agent",
     description=DESCRIPTION,
     instruction=INSTRUCTION,
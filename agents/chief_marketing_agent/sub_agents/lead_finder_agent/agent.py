@@ -1,26 +1,31 @@
 from google.adk.agents import LlmAgent 
-from google.adk.models.lite_llm import LiteLlm
-from typing import List, Dict, Optional
-import requests
+from typing import Dict, Iterator, List, Optional
+import re
+import time
 from bs4 import BeautifulSoup
 
+from ....audit_store import AUDIT_BATCH_SIZE, domain_of, record_audit
+from ....compliance_record import ComplianceResult
+from ....deadline import current_deadline
+from ....fetch import fetch
+from ....model_router import model_for
+from ....profiling import mark as profile_mark, profile, requested as profiling_requested, save_profile
+from ....tracing import span
 from .settings import DESCRIPTION, INSTRUCTION
 
-def find_drug_product_pages(base_url: str) -> List[str]:
+def find_drug_product_pages(base_url: str, strict: bool = False) -> List[str]:
     """
     Find relevant drug product pages on a company website.
 
     Args:
         base_url: The company's base website URL
+        strict: Raise if the home page can't be fetched instead of returning []
 
     Returns:
         List of URLs potentially containing drug product information
     """
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        response = requests.get(base_url, headers=headers, timeout=10)
+        response = fetch(base_url)
         response.raise_for_status()
 
         soup = BeautifulSoup(response.content, 'html.parser')
@@ -53,41 +58,82 @@ def find_drug_product_pages(base_url: str) -> List[str]:
 
     except Exception as e:
         print(f"Error finding product pages: {str(e)}")
+        if strict:
+            raise
         return []
 
-def analyze_company_website(company_url: str) -> List[Dict]:
+
+def iter_company_website(company_url: str, record: bool = True, strict: bool = False) -> Iterator[ComplianceResult]:
     """
-    Main method to analyze a company website for FDA compliance.
+    Analyze a company website for FDA compliance, yielding each page's result as soon as it is ready.
+
+    Results are also written to the audit store in small batches unless
+    ``record`` is False (e.g. when the caller stores them itself).
 
     Args:
         company_url: The biotech company's website URL
+        record: Whether to write results to the audit store
+        strict: Raise if the home page can't be fetched, so an unreachable
+            site isn't mistaken for one without product pages
 
-    Returns:
-        List of compliance analysis results for each page
+    Yields:
+        ComplianceResult for each analyzed page
     """
     print(f"Analyzing company website: {company_url}")
 
     # Find relevant product pages
     print("Finding drug product pages...")
-    product_urls = find_drug_product_pages(company_url)
+    product_urls = find_drug_product_pages(company_url, strict=strict)
     print(f"Found {len(product_urls)} relevant pages")
 
-    # Analyze each page
-    results = []
-    for url in product_urls:
-        print(f"\nAnalyzing: {url}")
+    pending: List[ComplianceResult] = []
+    try:
+        for url in product_urls:
+            if current_deadline().expired():
+                print("Deadline reached – skipping remaining pages")
+                break
+            print(f"\nAnalyzing: {url}")
+
+            # The span ends before the yield, so it never stays open while the caller holds the generator.
+            with span("lead_finder.page", url=url) as page_span:
+                # Scrape the page
+                content = scrape_webpage(url)
+                if not content:
+                    continue
+
+                # Check compliance
+                result = ComplianceResult.from_dict(check_fda_compliance(content))
+                page_span.set("compliance_status", result.compliance_status)
+            print(f"Status: {result.compliance_status}")
+
+            if record:
+                pending.append(result)
+            if len(pending) >= AUDIT_BATCH_SIZE:
+                record_audit(company_url, pending)
+                pending = []
+                profile_mark("audit batch")
+            yield result
+    finally:
+        record_audit(company_url, pending)
 
-        # Scrape the page
-        content = scrape_webpage(url)
-        if not content:
-            continue
 
-        # Check compliance
-        analysis = check_fda_compliance(content)
-        results.append(analysis)
+def analyze_company_website(company_url: str) -> List[Dict]:
+    """
+    Main method to analyze a company website for FDA compliance.
 
-        print(f"Status: {analysis['compliance_status']}")
+    Results are also written to the audit store (see ``iter_company_website``).
+    With PROFILE=1 the batch is profiled and the profile saved under $ARTIFACT_DIR/profiles.
 
+    Args:
+        company_url: The biotech company's website URL
+
+    Returns:
+        List of compliance analysis results for each page
+    """
+    with profile(f"audit-{domain_of(company_url)}-{int(time.time())}", enabled=profiling_requested()) as profiler:
+        results = [result.to_dict() for result in iter_company_website(company_url)]
+    if profiler is not None:
+        save_profile(profiler)
     return results
 
 def scrape_webpage(url: str) -> Optional[Dict[str, str]]:
@@ -101,10 +147,7 @@ def scrape_webpage(url: str) -> Optional[Dict[str, str]]:
         Dictionary containing the page title, text content, and URL
     """
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
+        response = fetch(url)
         response.raise_for_status()
 
         soup = BeautifulSoup(response.content, 'html.parser')
@@ -128,6 +171,107 @@ def scrape_webpage(url: str) -> Optional[Dict[str, str]]:
         print(f"Error scraping {url}: {str(e)}")
         return None
 
+KEYWORDS_RISK = [
+    "risk",
+    "side effect",
+    "adverse",
+    "safety",
+    "important safety information",
+    "isi",
+]
+KEYWORDS_BENEFIT = [
+    "effective",
+    "efficacy",
+    "improves",
+    "benefit",
+    "superior",
+    "best in class",
+]
+KEYWORDS_INDICATION = [
+    "indication",
+    "indicated",
+    "for the treatment of",
+    "for adults with",
+]
+KEYWORDS_LABELING = [
+    "prescribing information",
+    "labeling",
+    "pi",
+    "full prescribing",
+]
+RED_FLAGS = [
+    "cure",
+    "no side effects",
+    "guaranteed",
+    "safe and effective",
+    "miracle",
+]
+
+
+def _keywords_re(keywords: List[str]) -> "re.Pattern[str]":
+    # One pass per keyword list. Whole words only ("pi" must not match
+    # "pipeline", "cure" not "secure"), allowing plural and inflected endings
+    # ("side effects", "cured"); the keyword itself is captured.
+    alternation = "|".join(re.escape(k) for k in sorted(keywords, key=len, reverse=True))
+    return re.compile(rf"\b({alternation})(?:s|es|d|ed|ly|ness)?\b")
+
+
+_RISK_RE = _keywords_re(KEYWORDS_RISK)
+_BENEFIT_RE = _keywords_re(KEYWORDS_BENEFIT)
+_INDICATION_RE = _keywords_re(KEYWORDS_INDICATION)
+_LABELING_RE = _keywords_re(KEYWORDS_LABELING)
+_RED_FLAG_RE = _keywords_re(RED_FLAGS)
+
+
+def _has_keyword(text: str, keywords: List[str], pattern: "re.Pattern[str]", whole_words: bool) -> bool:
+    # Substring tests are much cheaper than the regex scan and rule out most
+    # text; the regex only confirms a candidate is a whole word.
+    return any(k in text for k in keywords) and (not whole_words or pattern.search(text) is not None)
+
+
+def find_red_flags(text: str, whole_words: bool = False) -> List[str]:
+    """
+    Absolute-claim phrases (RED_FLAGS) present in text.
+
+    Args:
+        text: Promotional copy or scraped page text
+        whole_words: Match whole words only ("cure" but not "secure")
+
+    Returns:
+        The matching RED_FLAGS entries, in list order
+    """
+    text = (text or "").lower()
+    candidates = [k for k in RED_FLAGS if k in text]
+    if not whole_words or not candidates:
+        return candidates
+    found = set(_RED_FLAG_RE.findall(text))
+    return [k for k in candidates if k in found]
+
+
+def scan_compliance_rules(text: str, whole_words: bool = False) -> Dict[str, object]:
+    """
+    Apply the keyword rules behind check_fda_compliance to a piece of text.
+
+    Args:
+        text: Promotional copy or scraped page text
+        whole_words: Match keywords as whole words only. check_fda_compliance
+            keeps the original substring matching so stored audit results
+            stay comparable; campaign prechecks use whole words.
+
+    Returns:
+        Dict of has_risk, has_benefit_claims, has_indication, has_labeling_ref
+        and red_flags (the absolute-claim phrases found)
+    """
+    text = (text or "").lower()
+    return {
+        "has_risk": _has_keyword(text, KEYWORDS_RISK, _RISK_RE, whole_words),
+        "has_benefit_claims": _has_keyword(text, KEYWORDS_BENEFIT, _BENEFIT_RE, whole_words),
+        "has_indication": _has_keyword(text, KEYWORDS_INDICATION, _INDICATION_RE, whole_words),
+        "has_labeling_ref": _has_keyword(text, KEYWORDS_LABELING, _LABELING_RE, whole_words),
+        "red_flags": find_red_flags(text, whole_words),
+    }
+
+
 def check_fda_compliance(content: Dict[str, str]) -> Dict:
     """
     Heuristic FDA compliance check for scraped content.
@@ -138,49 +282,12 @@ def check_fda_compliance(content: Dict[str, str]) -> Dict:
     Returns:
         Dict containing compliance_status, analysis text, and preview
     """
-    text = (content.get("content") or "").lower()
-
-    keywords_risk = [
-        "risk",
-        "side effect",
-        "adverse",
-        "safety",
-        "important safety information",
-        "isi",
-    ]
-    keywords_benefit = [
-        "effective",
-        "efficacy",
-        "improves",
-        "benefit",
-        "superior",
-        "best in class",
-    ]
-    keywords_indication = [
-        "indication",
-        "indicated",
-        "for the treatment of",
-        "for adults with",
-    ]
-    keywords_labeling = [
-        "prescribing information",
-        "labeling",
-        "pi",
-        "full prescribing",
-    ]
-    red_flags = [
-        "cure",
-        "no side effects",
-        "guaranteed",
-        "safe and effective",
-        "miracle",
-    ]
-
-    has_risk = any(k in text for k in keywords_risk)
-    has_benefit_claims = any(k in text for k in keywords_benefit)
-    has_indication = any(k in text for k in keywords_indication)
-    has_labeling_ref = any(k in text for k in keywords_labeling)
-    has_red_flags = any(k in text for k in red_flags)
+    rules = scan_compliance_rules(content.get("content") or "")
+    has_risk = rules["has_risk"]
+    has_benefit_claims = rules["has_benefit_claims"]
+    has_indication = rules["has_indication"]
+    has_labeling_ref = rules["has_labeling_ref"]
+    has_red_flags = bool(rules["red_flags"])
 
     # Determine compliance status
     if has_benefit_claims and not has_risk:
@@ -219,7 +326,7 @@ def check_fda_compliance(content: Dict[str, str]) -> Dict:
     }
 
 agent = LlmAgent(
-    model= LiteLlm(model="claude-3-7-sonnet-20250219"),
+    model=model_for("lead_finder_agent"),
     name="lead_finder_agent",
     description=DESCRIPTION,
     instruction=INSTRUCTION,
@@ -1,11 +1,11 @@
 from google.adk.agents import LlmAgent
-from google.adk.models.lite_llm import LiteLlm
 import os
 
+from ....model_router import model_for
 from .settings import DESCRIPTION, INSTRUCTION
 
 agent = LlmAgent(
-    model= LiteLlm(model="claude-3-7-sonnet-20250219"),
+    model=model_for("scope_report_agent"),
     name="scope_report_agent",
     description=DESCRIPTION,
     instruction=INSTRUCTION,
@@ -0,0 +1,76 @@
+"""
+Compact record type for per-page compliance results.
+
+A crawl keeps one ComplianceResult per analyzed page. The record uses
+__slots__ and keeps the large text fields (analysis, content preview)
+zlib-compressed, decompressing them only when they are read. It still
+behaves like the result dicts it replaces for read access
+(``result["compliance_status"]``, ``result.get("url")``).
+"""
+
+import zlib
+from typing import Any, Dict, Optional
+
+# Texts shorter than this are stored as-is; compression would not pay off.
+COMPRESS_MIN_CHARS = 256
+
+
+def _pack(text: Optional[str]) -> Any:
+    if text is None or len(text) < COMPRESS_MIN_CHARS:
+        return text
+    return zlib.compress(text.encode("utf-8"), 6)
+
+
+def _unpack(value: Any) -> Optional[str]:
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode("utf-8")
+    return value
+
+
+class ComplianceResult:
+    """Compliance analysis of one page."""
+
+    __slots__ = ("url", "title", "compliance_status", "_analysis", "_content_preview")
+
+    FIELDS = ("url", "title", "compliance_status", "analysis", "content_preview")
+
+    def __init__(
+        self,
+        url: str,
+        title: Optional[str],
+        compliance_status: str,
+        analysis: Optional[str] = None,
+        content_preview: Optional[str] = None,
+    ):
+        self.url = url
+        self.title = title
+        self.compliance_status = compliance_status
+        self._analysis = _pack(analysis)
+        self._content_preview = _pack(content_preview)
+
+    @classmethod
+    def from_dict(cls, result: Dict[str, Any]) -> "ComplianceResult":
+        return cls(**{name: result.get(name) for name in cls.FIELDS})
+
+    @property
+    def analysis(self) -> Optional[str]:
+        return _unpack(self._analysis)
+
+    @property
+    def content_preview(self) -> Optional[str]:
+        return _unpack(self._content_preview)
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = getattr(self, key, None) if key in self.FIELDS else None
+        return default if value is None else value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def __repr__(self) -> str:
+        return f"ComplianceResult(url={self.url!r}, compliance_status={self.compliance_status!r})"
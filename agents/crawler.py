@@ -0,0 +1,463 @@
+"""
+Polite multi-domain crawler for batch audits.
+
+    scheduler = CrawlScheduler(workers=16)
+    scheduler.add_companies(["https://a-bio.com", "https://b-pharma.com"])
+    scheduler.run()
+
+The frontier lives in SQLite (CRAWL_DB, default $TMPDIR/crawl_frontier.sqlite3),
+so an interrupted crawl resumes where it stopped. Each URL is a task:
+
+- ``discover`` - a company home page; ``find_drug_product_pages`` turns it
+  into ``page`` tasks
+- ``page`` - a product page; it is scraped, checked with the heuristic
+  ``check_fda_compliance`` and written to the audit store
+
+Tasks are grouped per host. A host has at most one request in flight and
+waits ``max(CRAWL_DELAY_S, robots.txt Crawl-delay)`` between requests;
+robots.txt Disallow rules are honoured. A host with a long Crawl-delay only
+holds up its own tasks. Tasks that fail (including a home page that could
+not be fetched) are marked ``failed``; re-adding the company or passing
+``--retry-failed`` queues them again.
+A pool of CRAWL_WORKERS threads always takes the host whose next request is
+due soonest, so throughput grows with the number of hosts while every site
+sees a polite request rate.
+
+    python -m agents.crawler https://a-bio.com https://b-pharma.com --workers 16
+    python -m agents.crawler --resume --retry-failed
+"""
+
+import argparse
+import heapq
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+from .audit_store import record_audit
+from .fetch import HEADERS, fetch
+from .metrics import QUEUE_DEPTH
+from .tracing import span
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS crawl_frontier (
+    url TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    company_url TEXT NOT NULL,
+    host TEXT NOT NULL,
+    priority REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    error TEXT,
+    added_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_frontier_host_status_priority ON crawl_frontier (host, status, priority, added_at);
+CREATE INDEX IF NOT EXISTS idx_frontier_status ON crawl_frontier (status);
+CREATE TABLE IF NOT EXISTS crawl_hosts (
+    host TEXT PRIMARY KEY,
+    next_fetch_at REAL NOT NULL DEFAULT 0,
+    robots TEXT,
+    robots_fetched_at REAL
+);
+"""
+
+# Task priorities: lower runs first within a host.
+DISCOVER_PRIORITY = 0.0
+PAGE_PRIORITY = 1.0
+ROBOTS_TTL_S = 24 * 3600
+
+# (kind, url, priority) tasks a handler wants added to the frontier.
+NewTask = Tuple[str, str, float]
+Handler = Callable[[Dict[str, Any]], Iterable[NewTask]]
+
+
+def host_of(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+def crawl_delay(robots: str, user_agent: str = HEADERS["User-Agent"]) -> Optional[float]:
+    """Crawl-delay for ``user_agent`` (or ``*``); unlike RobotFileParser, accepts fractions."""
+    product = user_agent.split("/")[0].lower()
+    delays: Dict[str, float] = {}
+    agents: List[str] = []
+    in_rules = False
+    for line in robots.splitlines():
+        key, _, value = line.split("#", 1)[0].partition(":")
+        key, value = key.strip().lower(), value.strip()
+        if key == "user-agent":
+            if in_rules:
+                agents, in_rules = [], False
+            agents.append(value.lower())
+        elif key:
+            in_rules = True
+            if key == "crawl-delay":
+                try:
+                    delay = float(value)
+                except ValueError:
+                    continue
+                for agent in agents:
+                    delays.setdefault(agent, delay)
+    return delays.get(product, delays.get("*"))
+
+
+class Frontier:
+    """SQLite-backed crawl frontier and per-host politeness state."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv(
+            "CRAWL_DB", os.path.join(os.getenv("TMPDIR", "/tmp"), "crawl_frontier.sqlite3")
+        )
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per worker thread.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, company_url: str, tasks: Iterable[NewTask]) -> int:
+        """Queue tasks; URLs already in the frontier (in any state) are ignored."""
+        now = time.time()
+        rows = [(url, kind, company_url, host_of(url), priority, now, now) for kind, url, priority in tasks]
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO crawl_frontier "
+                "(url, kind, company_url, host, priority, added_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            return conn.total_changes - before
+
+    def claim(self, host: str) -> Optional[Dict[str, Any]]:
+        """Mark the host's most urgent queued task in progress and return it."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT url, kind, company_url, host, priority FROM crawl_frontier "
+                "WHERE host = ? AND status = 'queued' ORDER BY priority, added_at LIMIT 1",
+                (host,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE crawl_frontier SET status = 'in_progress', updated_at = ? WHERE url = ?",
+                (time.time(), row["url"]),
+            )
+        return dict(row)
+
+    def finish(self, url: str, status: str, error: Optional[str] = None) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE crawl_frontier SET status = ?, error = ?, updated_at = ? WHERE url = ?",
+                (status, error, time.time(), url),
+            )
+
+    def requeue(self, priorities: Dict[str, float]) -> int:
+        """Queue already-known URLs again (e.g. for a re-crawl) with new priorities."""
+        now = time.time()
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "UPDATE crawl_frontier SET status = 'queued', priority = ?, error = NULL, updated_at = ? "
+                "WHERE url = ? AND status != 'in_progress'",
+                [(priority, now, url) for url, priority in priorities.items()],
+            )
+            return conn.total_changes - before
+
+    def requeue_failed(self, urls: Optional[Iterable[str]] = None) -> int:
+        """Queue failed tasks again: all of them, or only those in ``urls``."""
+        now = time.time()
+        with self._connect() as conn:
+            if urls is None:
+                return conn.execute(
+                    "UPDATE crawl_frontier SET status = 'queued', error = NULL, updated_at = ? WHERE status = 'failed'",
+                    (now,),
+                ).rowcount
+            before = conn.total_changes
+            conn.executemany(
+                "UPDATE crawl_frontier SET status = 'queued', error = NULL, updated_at = ? "
+                "WHERE url = ? AND status = 'failed'",
+                [(now, url) for url in urls],
+            )
+            return conn.total_changes - before
+
+    def requeue_in_progress(self) -> int:
+        """Return tasks left in progress by an interrupted run to the queue."""
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE crawl_frontier SET status = 'queued' WHERE status = 'in_progress'"
+            ).rowcount
+
+    def has_queued(self, host: str) -> bool:
+        row = self._connect().execute(
+            "SELECT 1 FROM crawl_frontier WHERE host = ? AND status = 'queued' LIMIT 1", (host,)
+        ).fetchone()
+        return row is not None
+
+    def queued_hosts(self) -> Dict[str, float]:
+        """Hosts with queued tasks and when each may next be fetched."""
+        rows = self._connect().execute(
+            "SELECT DISTINCT f.host, COALESCE(h.next_fetch_at, 0) AS next_fetch_at FROM crawl_frontier f "
+            "LEFT JOIN crawl_hosts h ON h.host = f.host WHERE f.status = 'queued'"
+        ).fetchall()
+        return {row["host"]: row["next_fetch_at"] for row in rows}
+
+    def host_state(self, host: str) -> Dict[str, Any]:
+        row = self._connect().execute(
+            "SELECT next_fetch_at, robots, robots_fetched_at FROM crawl_hosts WHERE host = ?", (host,)
+        ).fetchone()
+        return dict(row) if row else {"next_fetch_at": 0.0, "robots": None, "robots_fetched_at": None}
+
+    def set_next_fetch(self, host: str, next_fetch_at: float) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO crawl_hosts (host, next_fetch_at) VALUES (?, ?) "
+                "ON CONFLICT(host) DO UPDATE SET next_fetch_at = excluded.next_fetch_at",
+                (host, next_fetch_at),
+            )
+
+    def set_robots(self, host: str, robots: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO crawl_hosts (host, robots, robots_fetched_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(host) DO UPDATE SET robots = excluded.robots, "
+                "robots_fetched_at = excluded.robots_fetched_at",
+                (host, robots, time.time()),
+            )
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._connect().execute(
+            "SELECT status, COUNT(*) AS n FROM crawl_frontier GROUP BY status"
+        ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+def audit_task(task: Dict[str, Any]) -> List[NewTask]:
+    """Default handler: discover product pages, or audit one page into the audit store."""
+    from .chief_marketing_agent.sub_agents.lead_finder_agent.agent import (
+        check_fda_compliance,
+        find_drug_product_pages,
+        scrape_webpage,
+    )
+
+    if task["kind"] == "discover":
+        # strict: a home page that can't be fetched fails the task (so it can be retried)
+        # rather than completing it with no pages.
+        urls = find_drug_product_pages(task["url"], strict=True)
+        # Keep the page order as a tie-breaker: earlier links matched more keywords.
+        return [("page", url, PAGE_PRIORITY + i / 1000) for i, url in enumerate(urls)]
+    content = scrape_webpage(task["url"])
+    if not content:
+        raise RuntimeError("page could not be scraped")
+    record_audit(task["company_url"], [check_fda_compliance(content)])
+    return []
+
+
+class CrawlScheduler:
+    """Worker pool over a ``Frontier`` that keeps every host at a polite request rate."""
+
+    def __init__(
+        self,
+        frontier: Optional[Frontier] = None,
+        workers: Optional[int] = None,
+        delay: Optional[float] = None,
+        handler: Handler = audit_task,
+    ):
+        self.frontier = frontier or Frontier()
+        self.workers = workers or int(os.getenv("CRAWL_WORKERS", "8"))
+        self.delay = delay if delay is not None else float(os.getenv("CRAWL_DELAY_S", "1"))
+        self.handler = handler
+        self._robots: Dict[str, RobotFileParser] = {}
+        self._crawl_delays: Dict[str, Optional[float]] = {}
+        # (next fetch time, host) for hosts with queued work that are not in flight.
+        self._ready: List[Tuple[float, str]] = []
+        self._scheduled: Set[str] = set()
+        self._active = 0
+        self._cond = threading.Condition()
+        self._processed = 0
+        self._max_tasks: Optional[int] = None
+        self._ready_gauge = QUEUE_DEPTH.labels(queue="crawl_ready_hosts")
+
+    def add_companies(self, company_urls: Iterable[str]) -> int:
+        """Queue new companies; a known company whose home page failed is queued again."""
+        company_urls = list(company_urls)
+        added = 0
+        for company_url in company_urls:
+            added += self.frontier.add(company_url, [("discover", company_url, DISCOVER_PRIORITY)])
+        return added + self.frontier.requeue_failed(company_urls)
+
+    # -----------------------------
+    # Politeness
+    # -----------------------------
+
+    def _robots_for(self, host: str, scheme: str) -> Tuple[RobotFileParser, bool]:
+        """(parser, fetched) - ``fetched`` means robots.txt used this host's request slot."""
+        parser = self._robots.get(host)
+        if parser is not None:
+            return parser, False
+        state = self.frontier.host_state(host)
+        fetched = False
+        robots = state["robots"]
+        if robots is None or time.time() - (state["robots_fetched_at"] or 0) > ROBOTS_TTL_S:
+            fetched = True
+            robots = ""
+            try:
+                response = fetch(f"{scheme}://{host}/robots.txt")
+                if response.status_code < 500:
+                    robots = response.text if response.status_code == 200 else ""
+                    # Only a definite answer is kept across runs; errors are retried next run.
+                    self.frontier.set_robots(host, robots)
+            except Exception as e:
+                print(f"[crawl] robots.txt for {host} unavailable ({e}); assuming no restrictions")
+        parser = RobotFileParser()
+        parser.parse(robots.splitlines())
+        self._robots[host] = parser
+        self._crawl_delays[host] = crawl_delay(robots)
+        return parser, fetched
+
+    def _delay_for(self, host: str) -> float:
+        # The site's Crawl-delay is honoured in full; other hosts keep the workers busy meanwhile.
+        return max(self.delay, self._crawl_delays.get(host) or 0.0)
+
+    # -----------------------------
+    # Workers
+    # -----------------------------
+
+    def _schedule(self, host: str, at: float) -> None:
+        # Caller holds self._cond.
+        if host not in self._scheduled:
+            self._scheduled.add(host)
+            heapq.heappush(self._ready, (at, host))
+            self._ready_gauge.set(len(self._ready))
+            self._cond.notify()
+
+    def _next_host(self) -> Optional[str]:
+        with self._cond:
+            while True:
+                if self._max_tasks is not None and self._processed >= self._max_tasks:
+                    return None
+                now = time.time()
+                if self._ready and self._ready[0][0] <= now:
+                    _, host = heapq.heappop(self._ready)
+                    self._ready_gauge.set(len(self._ready))
+                    self._active += 1
+                    self._processed += 1
+                    return host
+                if not self._ready and not self._active:
+                    self._cond.notify_all()
+                    return None
+                self._cond.wait(self._ready[0][0] - now if self._ready else None)
+
+    def _process(self, host: str) -> None:
+        task = self.frontier.claim(host)
+        if task is None:
+            return
+        url = task["url"]
+        parsed = urlparse(url)
+        robots, fetched = self._robots_for(host, parsed.scheme or "https")
+        if fetched:
+            # robots.txt took this slot; the task runs after the crawl delay.
+            self.frontier.finish(url, "queued")
+            return
+        if not robots.can_fetch(HEADERS["User-Agent"], url):
+            self.frontier.finish(url, "disallowed")
+            return
+        with span("crawl.task", url=url, kind=task["kind"], host=host) as s:
+            try:
+                new_tasks = list(self.handler(task))
+            except Exception as e:
+                print(f"[crawl] {url} failed: {e}")
+                self.frontier.finish(url, "failed", str(e)[:500])
+                s.set("error", str(e)[:200])
+                return
+        added = self.frontier.add(task["company_url"], new_tasks)
+        self.frontier.finish(url, "done")
+        if added:
+            new_hosts = {host_of(new_url) for _, new_url, _ in new_tasks} - {host}
+            with self._cond:
+                new_hosts -= self._scheduled
+            for new_host in new_hosts:
+                next_fetch_at = self.frontier.host_state(new_host)["next_fetch_at"]
+                with self._cond:
+                    self._schedule(new_host, next_fetch_at)
+
+    def _worker(self) -> None:
+        while True:
+            host = self._next_host()
+            if host is None:
+                return
+            try:
+                self._process(host)
+            finally:
+                # The delay runs from when the request finished, so slow hosts are not hit back to back.
+                next_fetch_at = time.time() + self._delay_for(host)
+                self.frontier.set_next_fetch(host, next_fetch_at)
+                with self._cond:
+                    self._active -= 1
+                    self._scheduled.discard(host)
+                    if self.frontier.has_queued(host):
+                        self._schedule(host, next_fetch_at)
+                    self._cond.notify_all()
+
+    def run(self, max_tasks: Optional[int] = None) -> Dict[str, Any]:
+        """Crawl until the frontier is empty (or ``max_tasks`` requests were made)."""
+        started = time.time()
+        requeued = self.frontier.requeue_in_progress()
+        if requeued:
+            print(f"[crawl] Resuming {requeued} interrupted task(s)")
+        self._max_tasks = max_tasks
+        self._processed = 0
+        # Reload robots.txt from the frontier each run so long-lived schedulers honour its TTL.
+        self._robots.clear()
+        self._crawl_delays.clear()
+        with self._cond:
+            for host, next_fetch_at in self.frontier.queued_hosts().items():
+                self._schedule(host, next_fetch_at)
+        threads = [
+            threading.Thread(target=self._worker, name=f"crawl-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counts = self.frontier.counts()
+        elapsed = time.time() - started
+        print(f"[crawl] {self._processed} request slot(s) in {elapsed:.1f}s: {counts}")
+        return {"requests": self._processed, "elapsed_s": round(elapsed, 2), "status": counts}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Polite multi-domain batch audit crawl")
+    parser.add_argument("company_urls", nargs="*", help="company websites to audit")
+    parser.add_argument("--workers", type=int, help="worker threads (default CRAWL_WORKERS or 8)")
+    parser.add_argument("--delay", type=float, help="minimum seconds between requests to a host")
+    parser.add_argument("--db", help="frontier database (default CRAWL_DB)")
+    parser.add_argument("--max-tasks", type=int, help="stop after this many requests")
+    parser.add_argument("--resume", action="store_true", help="only continue the existing frontier")
+    parser.add_argument("--retry-failed", action="store_true", help="queue failed tasks again")
+    args = parser.parse_args(argv)
+    if not args.company_urls and not args.resume:
+        parser.error("give company URLs or --resume")
+
+    scheduler = CrawlScheduler(Frontier(args.db), workers=args.workers, delay=args.delay)
+    if args.company_urls:
+        print(f"[crawl] Queued {scheduler.add_companies(args.company_urls)} company site(s)")
+    if args.retry_failed:
+        print(f"[crawl] Retrying {scheduler.frontier.requeue_failed()} failed task(s)")
+    scheduler.run(args.max_tasks)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
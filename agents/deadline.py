@@ -0,0 +1,61 @@
+"""
+Request deadlines shared by the pipeline stages, model calls and scrapers.
+
+A Deadline is installed for the current context with ``use_deadline`` and
+read back with ``current_deadline()``, so it reaches code that is invoked
+indirectly (e.g. scraper functions called as agent tools) without changing
+their signatures.
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when work is attempted after the request deadline."""
+
+
+class Deadline:
+    """Absolute point in time by which a request must be answered."""
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds if seconds is not None else None
+
+    def remaining(self) -> float:
+        if self.expires_at is None:
+            return float("inf")
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def timeout(self, default: float) -> float:
+        """``default`` capped by the time left; raises once the deadline has passed."""
+        remaining = self.remaining()
+        if remaining <= 0.0:
+            raise DeadlineExceeded("Request deadline exceeded")
+        return min(default, remaining)
+
+    def __repr__(self) -> str:
+        return f"Deadline(remaining={self.remaining():.2f}s)"
+
+
+NO_DEADLINE = Deadline(None)
+
+_current: contextvars.ContextVar[Deadline] = contextvars.ContextVar("deadline", default=NO_DEADLINE)
+
+
+def current_deadline() -> Deadline:
+    return _current.get()
+
+
+@contextmanager
+def use_deadline(deadline: Deadline) -> Iterator[Deadline]:
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
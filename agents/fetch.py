@@ -0,0 +1,316 @@
+"""
+HTTP fetching for the scrapers.
+
+Every page the lead finders download goes through ``fetch``, which applies
+the scraper headers and the request deadline, records per-host latency
+and response size metrics and opens an ``http.fetch`` trace span.
+
+Hosts are tracked individually (see ``HostHealth``):
+
+- the timeout adapts to the host's observed latency - a multiple of its
+  recent p95, between FETCH_MIN_TIMEOUT and the caller's timeout. Timed-out
+  attempts count as samples of at least the timeout, and samples expire
+  after FETCH_SAMPLE_TTL_S, so a host that slows down gets a longer timeout;
+- a circuit breaker opens after FETCH_BREAKER_FAILURES consecutive
+  failures (errors, timeouts, 5xx, 429) and fails fast for a cool-off
+  period that doubles on each repeated trip. Once it expires a single
+  probe request is let through with the caller's full timeout; success
+  closes the breaker.
+
+Host state is saved to FETCH_HOST_STATE, so later batch runs skip
+known-bad hosts without waiting on them again. Saves merge with the file
+under a lock, so concurrent workers and crawlers share breaker state
+instead of overwriting each other's.
+
+The timeout bounds the whole download, not just each socket read: bodies
+are streamed and abandoned once the time budget is spent.
+"""
+
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+import urllib3
+
+from .deadline import current_deadline
+from .metrics import FETCH_BREAKER_EVENTS, FETCH_BYTES, FETCH_HOST_LABEL, FETCH_SECONDS
+from .tracing import span
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+DEFAULT_TIMEOUT = 10.0
+CHUNK_SIZE = 64 * 1024
+
+
+class HostUnavailable(requests.exceptions.ConnectionError):
+    """Raised without a request while a host's circuit breaker is open."""
+
+
+class HostHealth:
+    """Per-host latency window and circuit breaker, persisted across runs."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        window: int = 50,
+        min_samples: int = 5,
+        timeout_multiplier: Optional[float] = None,
+        min_timeout: Optional[float] = None,
+        failure_threshold: Optional[int] = None,
+        cooloff: Optional[float] = None,
+        max_cooloff: Optional[float] = None,
+        sample_ttl: Optional[float] = None,
+        save_interval: float = 30.0,
+    ):
+        self.path = path or os.getenv(
+            "FETCH_HOST_STATE", os.path.join(os.getenv("TMPDIR", "/tmp"), "fetch_hosts.json")
+        )
+        self.window = window
+        self.min_samples = min_samples
+        self.timeout_multiplier = timeout_multiplier or float(os.getenv("FETCH_TIMEOUT_MULTIPLIER", "3"))
+        self.min_timeout = min_timeout or float(os.getenv("FETCH_MIN_TIMEOUT", "2"))
+        self.failure_threshold = failure_threshold or int(os.getenv("FETCH_BREAKER_FAILURES", "3"))
+        self.cooloff = cooloff or float(os.getenv("FETCH_BREAKER_COOLOFF_S", "300"))
+        self.max_cooloff = max_cooloff or float(os.getenv("FETCH_BREAKER_MAX_COOLOFF_S", "21600"))
+        self.sample_ttl = sample_ttl or float(os.getenv("FETCH_SAMPLE_TTL_S", "3600"))
+        self.save_interval = save_interval
+        # [epoch s, seconds] per host; wall-clock, since samples are shared across runs.
+        self._latencies: Dict[str, Deque[List[float]]] = {}
+        # host -> {"failures": consecutive failures, "trips": times opened in a row, "open_until": epoch s}
+        self._breakers: Dict[str, Dict[str, Any]] = {}
+        # Changes since the last save, merged into the file by ``save``:
+        # new latency samples, and when each host's breaker last changed.
+        self._new_samples: Dict[str, List[List[float]]] = {}
+        self._changed: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+        self._load()
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        hosts = state.get("hosts") if isinstance(state, dict) else None
+        return hosts if isinstance(hosts, dict) else {}
+
+    def _load(self, hosts: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+        # Adopt saved state, except breakers this process changed since its last save.
+        for host, entry in (self._read() if hosts is None else hosts).items():
+            # Bare floats are samples saved before they carried a timestamp; drop them.
+            samples = [s for s in entry.get("latencies", []) if isinstance(s, list) and len(s) == 2]
+            self._latencies[host] = deque(samples, maxlen=self.window)
+            if host in self._changed or self._breakers.get(host, {}).get("probing"):
+                continue
+            if entry.get("failures") or entry.get("trips"):
+                self._breakers[host] = {
+                    "failures": entry.get("failures", 0),
+                    "trips": entry.get("trips", 0),
+                    "open_until": entry.get("open_until", 0.0),
+                }
+            else:
+                self._breakers.pop(host, None)
+
+    def _merge(self, hosts: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        for host, samples in self._new_samples.items():
+            entry = hosts.setdefault(host, {})
+            saved = [s for s in entry.get("latencies", []) if isinstance(s, list) and len(s) == 2]
+            entry["latencies"] = [[round(at, 1), round(seconds, 4)] for at, seconds in (saved + samples)[-self.window:]]
+        for host, changed_at in self._changed.items():
+            entry = hosts.setdefault(host, {})
+            # A breaker change saved by another process after ours wins.
+            if entry.get("changed_at", 0.0) > changed_at:
+                continue
+            breaker = self._breakers.get(host)
+            entry.update(
+                failures=breaker["failures"] if breaker else 0,
+                trips=breaker["trips"] if breaker else 0,
+                open_until=breaker["open_until"] if breaker else 0.0,
+                changed_at=changed_at,
+            )
+        return hosts
+
+    def save(self, force: bool = False) -> None:
+        """Merge this process's changes into the state file; without ``force`` at most once per ``save_interval``.
+
+        The file is re-read and rewritten under an exclusive lock on
+        ``<path>.lock``, and hosts this process hasn't changed pick up the
+        saved state, so breakers opened by other processes apply here too.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._saved_at < self.save_interval:
+                return
+            self._saved_at = now
+            directory = os.path.dirname(self.path) or "."
+            try:
+                os.makedirs(directory, exist_ok=True)
+                with open(self.path + ".lock", "a") as lock:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                    hosts = self._merge(self._read())
+                    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+                    with os.fdopen(fd, "w") as f:
+                        json.dump({"hosts": hosts}, f)
+                    os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"[fetch] Could not save host state to {self.path}: {e}")
+                return
+            self._new_samples.clear()
+            self._changed.clear()
+            self._load(hosts)
+
+    def timeout_for(self, host: str, default: float = DEFAULT_TIMEOUT) -> float:
+        """``timeout_multiplier`` x the host's recent p95, clamped to [min_timeout, default].
+
+        A breaker probe gets ``default``: the samples that tripped the breaker
+        may be too short for a host that is slow but alive.
+        """
+        cutoff = time.time() - self.sample_ttl
+        with self._lock:
+            if self._breakers.get(host, {}).get("probing"):
+                return default
+            samples = sorted(seconds for at, seconds in self._latencies.get(host, ()) if at >= cutoff)
+        if len(samples) < self.min_samples:
+            return default
+        p95 = samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+        return max(min(self.min_timeout, default), min(default, p95 * self.timeout_multiplier))
+
+    def allow(self, host: str, probe_timeout: float = DEFAULT_TIMEOUT) -> bool:
+        """False while the host's breaker is open; after the cool-off, admits one probe."""
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None or breaker["failures"] < self.failure_threshold:
+                return True
+            now = time.time()
+            if now < breaker["open_until"]:
+                return False
+            # Hold the breaker open while the probe runs so concurrent callers keep failing fast.
+            breaker["open_until"] = now + probe_timeout
+            breaker["probing"] = True
+            return True
+
+    def open_until(self, host: str) -> float:
+        with self._lock:
+            return self._breakers.get(host, {}).get("open_until", 0.0)
+
+    def _add_sample(self, host: str, seconds: float) -> None:
+        sample = [time.time(), seconds]
+        self._latencies.setdefault(host, deque(maxlen=self.window)).append(sample)
+        self._new_samples.setdefault(host, []).append(sample)
+
+    def record_success(self, host: str, seconds: float) -> None:
+        with self._lock:
+            self._add_sample(host, seconds)
+            closed = self._breakers.pop(host, None)
+            if closed:
+                self._changed[host] = time.time()
+        if closed and closed["failures"] >= self.failure_threshold:
+            FETCH_BREAKER_EVENTS.labels(host=FETCH_HOST_LABEL(host), event="closed").inc()
+            print(f"[fetch] Circuit closed for {host}")
+            self.save(force=True)
+        else:
+            self.save()
+
+    def record_failure(self, host: str, timed_out_after: Optional[float] = None) -> None:
+        """Count a failure; ``timed_out_after`` also records a latency sample for a timeout."""
+        with self._lock:
+            if timed_out_after is not None:
+                self._add_sample(host, timed_out_after)
+            breaker = self._breakers.setdefault(host, {"failures": 0, "trips": 0, "open_until": 0.0})
+            breaker["failures"] += 1
+            self._changed[host] = time.time()
+            # Failures of requests already in flight when the breaker opened don't extend the cool-off.
+            opened = breaker["failures"] == self.failure_threshold or breaker.pop("probing", False)
+            if opened:
+                cooloff = min(self.max_cooloff, self.cooloff * 2 ** breaker["trips"])
+                breaker["trips"] += 1
+                breaker["open_until"] = time.time() + cooloff
+        if opened:
+            FETCH_BREAKER_EVENTS.labels(host=FETCH_HOST_LABEL(host), event="opened").inc()
+            print(f"[fetch] Circuit open for {host} for {cooloff:.0f}s after {breaker['failures']} failures")
+            self.save(force=True)
+
+
+hosts = HostHealth()
+
+
+def _iter_body(response: requests.Response):
+    read1 = getattr(response.raw, "read1", None)
+    if read1 is None:
+        # urllib3 < 2: each chunk waits until it is full.
+        yield from response.iter_content(CHUNK_SIZE)
+        return
+    # read1 returns whatever has arrived, so a slow sender can't hold a
+    # chunk (and the time check below) open for long.
+    while True:
+        try:
+            chunk = read1(CHUNK_SIZE, decode_content=True)
+        except urllib3.exceptions.ReadTimeoutError as e:
+            raise requests.exceptions.ReadTimeout(e)
+        except urllib3.exceptions.HTTPError as e:
+            raise requests.exceptions.ConnectionError(e)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _read_body(response: requests.Response, started: float, budget: float) -> None:
+    # requests' timeout applies to each socket read, so a server dripping
+    # bytes could stretch a download indefinitely; check the total instead.
+    chunks = []
+    for chunk in _iter_body(response):
+        chunks.append(chunk)
+        if time.perf_counter() - started > budget:
+            response.close()
+            raise requests.exceptions.ReadTimeout(f"{response.url}: download exceeded {budget:.1f}s")
+    response._content = b"".join(chunks)
+
+
+def fetch(url: str, timeout: float = DEFAULT_TIMEOUT) -> requests.Response:
+    """GET ``url`` with a per-host adaptive timeout, capped by ``timeout`` and the request deadline.
+
+    Raises ``HostUnavailable`` without sending anything while the host's breaker is open.
+    """
+    host = urlparse(url).netloc.lower()
+    if not hosts.allow(host, timeout):
+        FETCH_BREAKER_EVENTS.labels(host=FETCH_HOST_LABEL(host), event="rejected").inc()
+        raise HostUnavailable(f"Skipping {url}: circuit open for {host} until {time.ctime(hosts.open_until(host))}")
+    host_timeout = hosts.timeout_for(host, timeout)
+    effective_timeout = current_deadline().timeout(host_timeout)
+    started = time.perf_counter()
+    status = "error"
+    with span("http.fetch", **{"http.method": "GET", "http.url": url, "net.peer.name": host}) as s:
+        s.set("http.timeout", round(effective_timeout, 3))
+        try:
+            try:
+                response = requests.get(url, headers=HEADERS, timeout=effective_timeout, stream=True)
+                _read_body(response, started, effective_timeout)
+            except requests.exceptions.Timeout:
+                # A timeout cut short by the request deadline says nothing about the host.
+                if effective_timeout >= host_timeout:
+                    hosts.record_failure(host, max(time.perf_counter() - started, effective_timeout))
+                raise
+            except requests.exceptions.RequestException:
+                hosts.record_failure(host)
+                raise
+            status = f"{response.status_code // 100}xx"
+            if response.status_code >= 500 or response.status_code == 429:
+                hosts.record_failure(host)
+            else:
+                hosts.record_success(host, time.perf_counter() - started)
+            size = len(response.content)
+            FETCH_BYTES.labels(host=FETCH_HOST_LABEL(host)).observe(size)
+            s.set("http.status_code", response.status_code)
+            s.set("http.response_content_length", size)
+            return response
+        finally:
+            FETCH_SECONDS.labels(host=FETCH_HOST_LABEL(host), status=status).observe(time.perf_counter() - started)
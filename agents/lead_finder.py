@@ -7,10 +7,18 @@ is FDA compliant for drug product marketing materials.
 
 from google import genai
 from google.genai import types
-import requests
 from bs4 import BeautifulSoup
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 import re
+import time
+
+from .audit_store import AUDIT_BATCH_SIZE, domain_of, record_audit
+from .compliance_record import ComplianceResult
+from .deadline import current_deadline
+from .fetch import fetch
+from .metrics import LLM_CALL_SECONDS, LLM_TOKENS
+from .profiling import mark as profile_mark, profile, requested as profiling_requested, save_profile
+from .tracing import span
 
 
 class LeadFinderAgent:
@@ -52,10 +60,7 @@ class LeadFinderAgent:
             Dictionary containing the page title, text content, and URL
         """
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=10)
+            response = fetch(url)
             response.raise_for_status()
 
             soup = BeautifulSoup(response.content, 'html.parser')
@@ -79,6 +84,13 @@ class LeadFinderAgent:
             print(f"Error scraping {url}: {str(e)}")
             return None
 
+    def _http_options(self) -> Optional[types.HttpOptions]:
+        """Cap the model request timeout by the current request deadline, if any."""
+        remaining = current_deadline().remaining()
+        if remaining == float("inf"):
+            return None
+        return types.HttpOptions(timeout=int(current_deadline().timeout(remaining) * 1000))
+
     def check_fda_compliance(self, content: Dict[str, str]) -> Dict:
         """
         Check if the scraped content is FDA compliant using Gemini.
@@ -130,14 +142,24 @@ Be thorough and specific in identifying potential violations.
 """
 
         try:
-            response = self.client.models.generate_content(
-                model=self.model_id,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    temperature=0.3,
-                    max_output_tokens=2000,
+            with span("llm lead_finder", role="lead_finder", model=self.model_id) as llm_span:
+                started = time.perf_counter()
+                response = self.client.models.generate_content(
+                    model=self.model_id,
+                    contents=prompt,
+                    config=types.GenerateContentConfig(
+                        temperature=0.3,
+                        max_output_tokens=2000,
+                        http_options=self._http_options(),
+                    )
                 )
-            )
+                LLM_CALL_SECONDS.labels(role="lead_finder", model=self.model_id).observe(time.perf_counter() - started)
+                usage = response.usage_metadata
+                if usage is not None:
+                    LLM_TOKENS.labels(role="lead_finder", kind="prompt").observe(usage.prompt_token_count or 0)
+                    LLM_TOKENS.labels(role="lead_finder", kind="completion").observe(usage.candidates_token_count or 0)
+                    llm_span.set("tokens.prompt", usage.prompt_token_count or 0)
+                    llm_span.set("tokens.completion", usage.candidates_token_count or 0)
 
             analysis_text = response.text
 
@@ -166,21 +188,19 @@ Be thorough and specific in identifying potential violations.
                 "content_preview": content['content'][:500]
             }
 
-    def find_drug_product_pages(self, base_url: str) -> List[str]:
+    def find_drug_product_pages(self, base_url: str, strict: bool = False) -> List[str]:
         """
         Find relevant drug product pages on a company website.
 
         Args:
             base_url: The company's base website URL
+            strict: Raise if the home page can't be fetched instead of returning []
 
         Returns:
             List of URLs potentially containing drug product information
         """
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            response = requests.get(base_url, headers=headers, timeout=10)
+            response = fetch(base_url)
             response.raise_for_status()
 
             soup = BeautifulSoup(response.content, 'html.parser')
@@ -213,41 +233,82 @@ Be thorough and specific in identifying potential violations.
 
         except Exception as e:
             print(f"Error finding product pages: {str(e)}")
+            if strict:
+                raise
             return []
 
-    def analyze_company_website(self, company_url: str) -> List[Dict]:
+    def iter_company_website(
+        self, company_url: str, record: bool = True, strict: bool = False
+    ) -> Iterator[ComplianceResult]:
         """
-        Main method to analyze a company website for FDA compliance.
+        Analyze a company website for FDA compliance, yielding each page's result as soon as it is ready.
+
+        Results are also written to the audit store in small batches unless
+        ``record`` is False (e.g. when the caller stores them itself).
 
         Args:
             company_url: The biotech company's website URL
+            record: Whether to write results to the audit store
+            strict: Raise if the home page can't be fetched, so an unreachable
+                site isn't mistaken for one without product pages
 
-        Returns:
-            List of compliance analysis results for each page
+        Yields:
+            ComplianceResult for each analyzed page
         """
         print(f"Analyzing company website: {company_url}")
 
         # Find relevant product pages
         print("Finding drug product pages...")
-        product_urls = self.find_drug_product_pages(company_url)
+        product_urls = self.find_drug_product_pages(company_url, strict=strict)
         print(f"Found {len(product_urls)} relevant pages")
 
-        # Analyze each page
-        results = []
-        for url in product_urls:
-            print(f"\nAnalyzing: {url}")
+        pending: List[ComplianceResult] = []
+        try:
+            for url in product_urls:
+                if current_deadline().expired():
+                    print("Deadline reached – skipping remaining pages")
+                    break
+                print(f"\nAnalyzing: {url}")
+
+                # The span ends before the yield, so it never stays open while the caller holds the generator.
+                with span("lead_finder.page", url=url) as page_span:
+                    # Scrape the page
+                    content = self.scrape_webpage(url)
+                    if not content:
+                        continue
+
+                    # Check compliance
+                    result = ComplianceResult.from_dict(self.check_fda_compliance(content))
+                    page_span.set("compliance_status", result.compliance_status)
+                print(f"Status: {result.compliance_status}")
+
+                if record:
+                    pending.append(result)
+                if len(pending) >= AUDIT_BATCH_SIZE:
+                    record_audit(company_url, pending)
+                    pending = []
+                    profile_mark("audit batch")
+                yield result
+        finally:
+            record_audit(company_url, pending)
 
-            # Scrape the page
-            content = self.scrape_webpage(url)
-            if not content:
-                continue
+    def analyze_company_website(self, company_url: str) -> List[Dict]:
+        """
+        Main method to analyze a company website for FDA compliance.
 
-            # Check compliance
-            analysis = self.check_fda_compliance(content)
-            results.append(analysis)
+        Results are also written to the audit store (see ``iter_company_website``).
+        With PROFILE=1 the batch is profiled and the profile saved under $ARTIFACT_DIR/profiles.
 
-            print(f"Status: {analysis['compliance_status']}")
+        Args:
+            company_url: The biotech company's website URL
 
+        Returns:
+            List of compliance analysis results for each page
+        """
+        with profile(f"audit-{domain_of(company_url)}-{int(time.time())}", enabled=profiling_requested()) as profiler:
+            results = [result.to_dict() for result in self.iter_company_website(company_url)]
+        if profiler is not None:
+            save_profile(profiler)
         return results
 
 
@@ -1,9 +1,10 @@
-from .agent import build_marketing_pipeline, root_agent, deploy_markdown
+from .agent import build_marketing_pipeline, root_agent, deploy_markdown, render_deployment_markdown
 
 __all__ = [
     "build_marketing_pipeline",
     "root_agent",
     "deploy_markdown",
+    "render_deployment_markdown",
 ]
 
 
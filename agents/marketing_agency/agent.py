@@ -1,11 +1,17 @@
+import os
 import random
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Literal, Optional
 
+from pydantic import BaseModel, Field
 from google.adk.agents import LlmAgent, SequentialAgent, ParallelAgent, LoopAgent
-from google.adk.models.lite_llm import LiteLlm
 from google.adk.tools.agent_tool import AgentTool
 
+from ..cassette import random_seed
 from ..chief_marketing_agent.agent import agent as scoping_agent
+from ..model_router import model_for
+from .aggregation import aggregate_kol_feedback
+from .compaction import compact_superseded_tool_results
+from .stats import balanced_labels
 
 
 def _print_header(title: str) -> None:
@@ -19,7 +25,7 @@ def _print_header(title: str) -> None:
 # -----------------------------
 
 ceo_agent = LlmAgent(
-    model=LiteLlm(model="claude-3-7-sonnet-20250219"),
+    model=model_for("ceo_agent"),
     name="ceo_agent",
     description="CEO reviews brief, sets strategy, provides sign-off",
     instruction=(
@@ -29,7 +35,7 @@ ceo_agent = LlmAgent(
 )
 
 copywriter_agent = LlmAgent(
-    model=LiteLlm(model="claude-3-7-sonnet-20250219"),
+    model=model_for("copywriter_agent"),
     name="copywriter_agent",
     description="Creates campaign brief with A/B variants",
     instruction=(
@@ -40,7 +46,7 @@ copywriter_agent = LlmAgent(
 )
 
 legal_agent = LlmAgent(
-    model=LiteLlm(model="claude-3-7-sonnet-20250219"),
+    model=model_for("legal_agent"),
     name="legal_agent",
     description="Ensures claims are compliant; sets all_clear flag",
     instruction=(
@@ -51,7 +57,7 @@ legal_agent = LlmAgent(
 )
 
 market_research_agent = LlmAgent(
-    model=LiteLlm(model="claude-3-7-sonnet-20250219"),
+    model=model_for("market_research_agent"),
     name="market_research_agent",
     description="Designs quick KOL feedback plan and survey",
     instruction=(
@@ -63,7 +69,7 @@ market_research_agent = LlmAgent(
 
 def make_kol_agent(kol_id: int) -> LlmAgent:
     return LlmAgent(
-        model=LiteLlm(model="claude-3-7-sonnet-20250219"),
+        model=model_for(f"kol_{kol_id}"),
         name=f"kol_{kol_id}",
         description="Key opinion leader providing structured feedback",
         instruction=(
@@ -73,15 +79,97 @@ def make_kol_agent(kol_id: int) -> LlmAgent:
     )
 
 
+NUM_KOLS = 10
+
+# Panel mode: one call role-plays the whole KOL panel instead of N agents
+# each re-reading the same campaign context.
+KOL_MODES = ("fanout", "panel")
+
+KOL_PERSONAS = [
+    "Academic cardiologist focused on trial design and statistical rigor",
+    "Community primary care physician with a busy, time-constrained practice",
+    "Hospital pharmacist responsible for formulary decisions",
+    "Oncologist who prioritizes safety signals and tolerability",
+    "Endocrinologist active on professional social media",
+    "Rural family physician serving an older patient population",
+    "Nurse practitioner who leads patient education programs",
+    "Payer medical director evaluating cost-effectiveness",
+    "Department chair at a teaching hospital",
+    "Patient advocacy leader with clinical background",
+]
+
+
+class KolFeedback(BaseModel):
+    kol: str = Field(description="KOL name from the panel roster")
+    notes: str
+    score: int = Field(ge=1, le=10)
+    go_no_go: Literal["go", "no-go"]
+
+
+class KolPanelFeedback(BaseModel):
+    feedback: List[KolFeedback]
+
+
+def make_kol_panel_agent(panel_size: int, roster: Optional[List[Dict[str, str]]] = None) -> LlmAgent:
+    # roster bakes the panel's personas into the instruction, for callers
+    # (the llm-mode orchestrator) that don't send one with each request.
+    panel = "".join(f"\n- {m['kol']}: {m['persona']}" for m in roster or [])
+    return LlmAgent(
+        model=model_for("kol_panel"),
+        name="kol_panel",
+        description=f"Simulates a panel of {panel_size} KOLs in one structured call",
+        instruction=(
+            f"You simulate a panel of {panel_size} distinct key opinion leaders.\n"
+            "The roster lists each KOL's name, persona and assigned variant (A or B).\n"
+            "Answer independently in each persona, judging only the assigned variant.\n"
+            "Return one entry per KOL: { 'kol': name, 'notes': str, 'score': 1-10, 'go_no_go': 'go'|'no-go' }"
+            + (f"\nPanel roster:{panel}" if panel else "")
+        ),
+        output_schema=KolPanelFeedback,
+    )
+
+
+def kol_settings(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    # KOL_MODE / KOL_PANEL_SIZE etc. from the env; overrides (the DAG's
+    # pipeline["pipeline"]["kol"]) win.
+    settings = {
+        "mode": os.getenv("KOL_MODE", "fanout"),
+        "size": int(os.getenv("KOL_PANEL_SIZE", NUM_KOLS)),
+        "personas": None,
+        # Sequential testing: run KOLs in balanced waves and stop once A vs B
+        # is decisive; "size" then acts as the maximum panel size.
+        "sequential": os.getenv("KOL_SEQUENTIAL", "0") == "1",
+        "wave_size": int(os.getenv("KOL_WAVE_SIZE", 4)),
+        "min_per_arm": int(os.getenv("KOL_MIN_PER_ARM", 4)),
+        "confidence": float(os.getenv("KOL_CONFIDENCE", 0.95)),
+    }
+    settings.update(overrides or {})
+    if settings["mode"] not in KOL_MODES:
+        raise ValueError(f"Unknown KOL mode: {settings['mode']!r} (expected one of {KOL_MODES})")
+    return settings
+
+
+def kol_panel_roster(
+    panel_size: int, personas: Optional[List[str]] = None, start: int = 1
+) -> List[Dict[str, str]]:
+    personas = personas or KOL_PERSONAS
+    return [
+        {"kol": f"kol_{i}", "persona": personas[(i - 1) % len(personas)]}
+        for i in range(start, start + panel_size)
+    ]
+
+
 aggregator_agent = LlmAgent(
-    model=LiteLlm(model="claude-3-7-sonnet-20250219"),
+    model=model_for("aggregator_agent"),
     name="aggregator_agent",
     description="Aggregates KOL feedback and recommends A or B",
     instruction=(
         "Aggregate KOL feedback in inputs['kol_feedback'].\n"
-        "Compute average scores per variant and recommend 'A' or 'B'.\n"
+        "Unless aggregated statistics are already provided, call aggregate_kol_feedback with the feedback.\n"
+        "Never compute scores yourself: write a short narrative from those numbers and keep their recommendation.\n"
         "Return JSON { 'summary': str, 'avg_scores': {'A': num, 'B': num}, 'recommendation': 'A'|'B' }"
     ),
+    tools=[aggregate_kol_feedback],
 )
 
 
@@ -89,36 +177,65 @@ aggregator_agent = LlmAgent(
 # Tools and helpers
 # -----------------------------
 
-def randomize_ab_assignment(pipeline: Dict[str, Any], kol_names: List[str]) -> Dict[str, str]:
-    assignment = {}
-    for name in kol_names:
-        assignment[name] = random.choice(["A", "B"])
-    pipeline.setdefault("meta", {})["ab_assignment"] = assignment
+def randomize_ab_assignment(
+    pipeline: Dict[str, Any], kol_names: List[str], balanced: bool = False
+) -> Dict[str, str]:
+    # balanced=True splits the KOLs as evenly as possible between A and B;
+    # repeated calls (e.g. one per KOL wave) accumulate in meta["ab_assignment"].
+    # The seed comes from the active cassette, so replays assign the same way.
+    rng = random.Random(random_seed())
+    if balanced:
+        labels = balanced_labels(len(kol_names), ["A", "B"], rng)
+        assignment = dict(zip(kol_names, labels))
+    else:
+        assignment = {}
+        for name in kol_names:
+            assignment[name] = rng.choice(["A", "B"])
+    pipeline.setdefault("meta", {}).setdefault("ab_assignment", {}).update(assignment)
     _print_header("A/B assignment for KOLs")
     for k, v in assignment.items():
         print(f"  {k}: {v}")
     return assignment
 
 
-def deploy_markdown(pipeline: Dict[str, Any], output_path: str = "deploy_output.md") -> str:
+def terminate_on_all_clear(pipeline: Dict[str, Any]) -> bool:
+    last_legal = pipeline.get("state", {}).get("legal_agent", {})
+    all_clear = bool(last_legal.get("all_clear") or last_legal.get("output", {}).get("all_clear"))
+    print(f"Loop termination check – all_clear={all_clear}")
+    return all_clear
+
+
+def render_deployment_markdown(pipeline: Dict[str, Any]) -> str:
     brief = pipeline.get("inputs", {}).get("brief", "")
     rec = pipeline.get("state", {}).get("aggregator", {}).get("recommendation", "")
     campaign_brief = pipeline.get("state", {}).get("copywriter_agent", {}).get("output", {}).get("campaign_brief", {})
-    
-    with open(output_path, "w") as f:
-        f.write(f"# Campaign Deployment\n\n")
-        f.write(f"## Recommendation: {rec}\n\n")
-        f.write(f"## Marketing Brief\n\n")
-        f.write(f"{brief}\n\n")
-        f.write(f"## Campaign Variants\n\n")
-        if campaign_brief:
-            f.write(f"### Variant A\n\n")
-            f.write(f"{campaign_brief.get('A', '')}\n\n")
-            f.write(f"### Variant B\n\n")
-            f.write(f"{campaign_brief.get('B', '')}\n")
-        else:
-            f.write("No campaign variants available.\n")
-    
+
+    parts = [
+        "# Campaign Deployment\n\n",
+        f"## Recommendation: {rec}\n\n",
+        "## Marketing Brief\n\n",
+        f"{brief}\n\n",
+        "## Campaign Variants\n\n",
+    ]
+    if campaign_brief:
+        parts += [
+            "### Variant A\n\n",
+            f"{campaign_brief.get('A', '')}\n\n",
+            "### Variant B\n\n",
+            f"{campaign_brief.get('B', '')}\n",
+        ]
+    else:
+        parts.append("No campaign variants available.\n")
+    return "".join(parts)
+
+
+def deploy_markdown(pipeline: Dict[str, Any], output_path: str = "deploy_output.md") -> str:
+    # Render in memory and write once, via a temp file renamed into place.
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(render_deployment_markdown(pipeline))
+    os.replace(tmp_path, output_path)
+
     print(f"Deployed to {output_path}")
     return output_path
 
@@ -126,7 +243,20 @@ def deploy_markdown(pipeline: Dict[str, Any], output_path: str = "deploy_output.
 # -----------------------------
 # Pipeline composition
 # -----------------------------
-def build_marketing_pipeline() -> SequentialAgent:
+PIPELINE_MODES = ("llm", "dag")
+
+
+def build_marketing_pipeline(mode: Optional[str] = None) -> Any:
+    # mode="llm" (default) lets an orchestrator agent pick AgentTools;
+    # mode="dag" runs the same steps through the deterministic stage graph.
+    mode = mode or os.getenv("MARKETING_PIPELINE_MODE", "llm")
+    if mode not in PIPELINE_MODES:
+        raise ValueError(f"Unknown pipeline mode: {mode!r} (expected one of {PIPELINE_MODES})")
+    if mode == "dag":
+        from .stages import MarketingDagPipeline
+
+        return MarketingDagPipeline()
+
     # 1) CEO reads brief
     # 2) Copywriter-Legal loop until all_clear
     # copywriter_legal_sequence = SequentialAgent(
@@ -135,12 +265,6 @@ def build_marketing_pipeline() -> SequentialAgent:
     #     sub_agents=[copywriter_agent, legal_agent],
     # )
 
-    def terminate_on_all_clear(pipeline: Dict[str, Any]) -> bool:
-        last_legal = pipeline.get("state", {}).get("legal_agent", {})
-        all_clear = bool(last_legal.get("all_clear") or last_legal.get("output", {}).get("all_clear"))
-        print(f"Loop termination check – all_clear={all_clear}")
-        return all_clear
-
     copywriter_legal_loop = LoopAgent(
         name="copywriter_legal_loop",
         description="Iterate copywriter and legal until all_clear",
@@ -148,20 +272,25 @@ def build_marketing_pipeline() -> SequentialAgent:
         max_iterations=6,
     )
 
-    # 3) Market research + Parallel KOLs
-    kol_agents = [make_kol_agent(i) for i in range(1, 11)]
-    kol_parallel = ParallelAgent(
-        name="kol_parallel",
-        description="Run 10 KOLs in parallel",
-        sub_agents=kol_agents,
-    )
+    # 3) Market research + Parallel KOLs (or a single batched panel call)
+    settings = kol_settings()
+    panel_size = settings["size"]
+    if settings["mode"] == "panel":
+        kol_stage = make_kol_panel_agent(panel_size, kol_panel_roster(panel_size, settings["personas"]))
+    else:
+        kol_agents = [make_kol_agent(i) for i in range(1, panel_size + 1)]
+        kol_stage = ParallelAgent(
+            name="kol_parallel",
+            description=f"Run {panel_size} KOLs in parallel",
+            sub_agents=kol_agents,
+        )
 
     # 4) Aggregator
     # 5) Copywriter & Legal revise again (reuse loop)
     # 6) CEO final sign-off
     pipeline = LlmAgent(
         name="marketing_agency_pipeline",
-        model=LiteLlm(model="claude-3-7-sonnet-20250219"),
+        model=model_for("marketing_agency_pipeline"),
         instruction=(
             "Oversee the end-to-end marketing campaign creation process.\n"
             "At the end, output the marketing brief in markdown format with sections for:\n"
@@ -170,9 +299,10 @@ def build_marketing_pipeline() -> SequentialAgent:
             "- Campaign Variants (A and B)"
         ),
         description="End-to-end marketing agency pipeline",
+        before_model_callback=compact_superseded_tool_results,
         tools=[AgentTool(scoping_agent), 
                AgentTool(aggregator_agent), 
-               AgentTool(kol_parallel), 
+               AgentTool(kol_stage), 
                AgentTool(market_research_agent),
                AgentTool(copywriter_agent),
                AgentTool(legal_agent)]
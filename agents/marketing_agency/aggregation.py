@@ -0,0 +1,112 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+VARIANTS = ("A", "B")
+
+
+def _parse_score(value: Any) -> float:
+    try:
+        score = float(value)
+    except (TypeError, ValueError):
+        return np.nan
+    return score if 1.0 <= score <= 10.0 else np.nan
+
+
+def _parse_go(value: Any) -> float:
+    if not isinstance(value, str):
+        return np.nan
+    normalized = value.strip().lower().replace("_", "-").replace(" ", "-")
+    if normalized == "go":
+        return 1.0
+    if normalized in ("no-go", "nogo"):
+        return 0.0
+    return np.nan
+
+
+def _round(value: float) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), 3)
+
+
+def _bootstrap_means(scores: np.ndarray, n_boot: int, rng: np.random.Generator) -> np.ndarray:
+    # One (n_boot, n) resample matrix instead of a Python loop per replicate.
+    idx = rng.integers(0, scores.size, size=(n_boot, scores.size))
+    return scores[idx].mean(axis=1)
+
+
+def aggregate_kol_feedback(
+    kol_feedback: List[Dict[str, Any]],
+    confidence: float = 0.95,
+    n_boot: int = 2000,
+    seed: Optional[int] = 0,
+) -> Dict[str, Any]:
+    """Deterministic per-variant statistics over structured KOL feedback.
+
+    Args:
+        kol_feedback: Entries with 'variant', 'score' (1-10) and 'go_no_go'
+        confidence: Level of the bootstrap confidence intervals
+        n_boot: Number of bootstrap resamples
+        seed: RNG seed so repeated aggregation of the same feedback is stable
+
+    Returns:
+        Dict with avg_scores, median_scores, go_rates, score_ci, diff_ci
+        (mean A - mean B), counts, recommendation and a plain summary
+    """
+    rng = np.random.default_rng(seed)
+    variants = np.array([str(e.get("variant", "")).strip().upper() for e in kol_feedback])
+    scores = np.array([_parse_score(e.get("score")) for e in kol_feedback], dtype=float)
+    go = np.array([_parse_go(e.get("go_no_go")) for e in kol_feedback], dtype=float)
+    tail = (1.0 - confidence) / 2.0 * 100.0
+    bounds = [tail, 100.0 - tail]
+
+    result: Dict[str, Any] = {
+        "avg_scores": {}, "median_scores": {}, "go_rates": {}, "score_ci": {}, "n": {},
+    }
+    boot: Dict[str, np.ndarray] = {}
+    for variant in VARIANTS:
+        mask = variants == variant
+        valid = scores[mask & ~np.isnan(scores)]
+        votes = go[mask & ~np.isnan(go)]
+        result["n"][variant] = int(valid.size)
+        result["avg_scores"][variant] = _round(valid.mean()) if valid.size else None
+        result["median_scores"][variant] = _round(np.median(valid)) if valid.size else None
+        result["go_rates"][variant] = _round(votes.mean()) if votes.size else None
+        if valid.size:
+            boot[variant] = _bootstrap_means(valid, n_boot, rng)
+            lo, hi = np.percentile(boot[variant], bounds)
+            result["score_ci"][variant] = [_round(lo), _round(hi)]
+        else:
+            result["score_ci"][variant] = None
+
+    if len(boot) == 2:
+        lo, hi = np.percentile(boot["A"] - boot["B"], bounds)
+        result["diff_ci"] = [_round(lo), _round(hi)]
+    else:
+        result["diff_ci"] = None
+
+    result["recommendation"] = _recommend(result)
+    result["decisive"] = bool(result["diff_ci"] and (result["diff_ci"][0] > 0 or result["diff_ci"][1] < 0))
+    result["confidence"] = confidence
+    result["summary"] = _summary(result)
+    return result
+
+
+def _recommend(result: Dict[str, Any]) -> str:
+    def key(variant: str) -> tuple:
+        avg = result["avg_scores"][variant]
+        rate = result["go_rates"][variant]
+        return (avg if avg is not None else -1.0, rate if rate is not None else -1.0)
+
+    return "B" if key("B") > key("A") else "A"
+
+
+def _summary(result: Dict[str, Any]) -> str:
+    parts = []
+    for variant in VARIANTS:
+        parts.append(
+            f"{variant}: mean {result['avg_scores'][variant]} (CI {result['score_ci'][variant]}), "
+            f"median {result['median_scores'][variant]}, go rate {result['go_rates'][variant]}, "
+            f"n={result['n'][variant]}"
+        )
+    verdict = "decisive" if result["decisive"] else "not decisive"
+    return "; ".join(parts) + f". Recommend {result['recommendation']} ({verdict} at {result['confidence']:.0%})."
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+MISSING = object()
+
+RUN_ID_PATTERN = r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$"
+_RUN_ID_RE = re.compile(RUN_ID_PATTERN)
+
+
+def input_hash(payload: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> str:
+    """Stable hash of the pipeline inputs and defaults, plus the effective stage ``config``.
+
+    ``config`` carries whatever else changes stage outputs (env-driven modes,
+    flags, models), so a resumed run never reuses checkpoints computed under
+    different settings.
+    """
+    material = {
+        "inputs": payload.get("inputs", {}),
+        "pipeline": payload.get("pipeline", {}),
+        "config": config or {},
+    }
+    encoded = json.dumps(material, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+class CheckpointStore:
+    """File-backed store of completed stage outputs.
+
+    Layout: ``<root>/<run_id>/<input_hash>/<stage>.json``. Writes go to a
+    temporary file that is renamed into place, so a crash mid-write never
+    leaves a truncated checkpoint behind. Runs not written to for ``ttl``
+    seconds (PIPELINE_CHECKPOINT_TTL_S, default 1 day) are removed by
+    ``prune``.
+    """
+
+    def __init__(self, root: Optional[str] = None, ttl: Optional[float] = None):
+        self.root = root or os.getenv(
+            "PIPELINE_CHECKPOINT_DIR",
+            os.path.join(os.getenv("TMPDIR", "/tmp"), "pipeline_checkpoints"),
+        )
+        self.ttl = ttl or float(os.getenv("PIPELINE_CHECKPOINT_TTL_S", "86400"))
+
+    def run_dir(self, run_id: str, inputs_digest: str) -> str:
+        if not _RUN_ID_RE.match(run_id):
+            raise ValueError(f"Invalid run id: {run_id!r}")
+        return os.path.join(self.root, run_id, inputs_digest)
+
+    def _path(self, run_id: str, inputs_digest: str, stage: str) -> str:
+        return os.path.join(self.run_dir(run_id, inputs_digest), f"{stage}.json")
+
+    def load(self, run_id: str, inputs_digest: str, stage: str) -> Any:
+        """Return the saved output of ``stage`` or ``MISSING`` if absent."""
+        try:
+            with open(self._path(run_id, inputs_digest, stage)) as f:
+                return json.load(f)["output"]
+        except (OSError, ValueError, KeyError):
+            return MISSING
+
+    def save(self, run_id: str, inputs_digest: str, stage: str, output: Any) -> None:
+        directory = self.run_dir(run_id, inputs_digest)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"stage": stage, "output": output}, f, default=str)
+            os.replace(tmp_path, self._path(run_id, inputs_digest, stage))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def completed(self, run_id: str, inputs_digest: str) -> List[str]:
+        directory = self.run_dir(run_id, inputs_digest)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-5] for name in os.listdir(directory) if name.endswith(".json"))
+
+    def invalidate(self, run_id: str, inputs_digest: str, stages: Iterable[str]) -> None:
+        for stage in stages:
+            path = self._path(run_id, inputs_digest, stage)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def clear(self, run_id: str) -> None:
+        shutil.rmtree(os.path.dirname(self.run_dir(run_id, "_")), ignore_errors=True)
+
+    def prune(self) -> int:
+        """Remove runs whose newest checkpoint is older than ``ttl``; returns how many."""
+        cutoff = time.time() - self.ttl
+        try:
+            run_ids = os.listdir(self.root)
+        except OSError:
+            return 0
+        removed = 0
+        for run_id in run_ids:
+            run_path = os.path.join(self.root, run_id)
+            try:
+                newest = max(
+                    [os.path.getmtime(run_path)]
+                    + [os.path.getmtime(os.path.join(d, f)) for d, _, files in os.walk(run_path) for f in files]
+                )
+            except OSError:
+                continue  # removed concurrently
+            if newest < cutoff:
+                shutil.rmtree(run_path, ignore_errors=True)
+                removed += 1
+        return removed
+
+
+class RunCheckpoint:
+    """A CheckpointStore bound to a single run id and input hash."""
+
+    def __init__(self, store: CheckpointStore, run_id: str, inputs_digest: str):
+        self.store = store
+        self.run_id = run_id
+        self.inputs_digest = inputs_digest
+
+    def load(self, stage: str) -> Any:
+        return self.store.load(self.run_id, self.inputs_digest, stage)
+
+    def save(self, stage: str, output: Any) -> None:
+        self.store.save(self.run_id, self.inputs_digest, stage, output)
+
+    def invalidate(self, stages: Iterable[str]) -> None:
+        self.store.invalidate(self.run_id, self.inputs_digest, stages)
@@ -0,0 +1,146 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..metrics import CACHE_REQUESTS
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+_NORMALIZE_RE = re.compile(r"[^a-z0-9%]+")
+
+
+def normalize_claim(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return _NORMALIZE_RE.sub(" ", text.lower()).strip()
+
+
+def claim_hash(text: str) -> str:
+    return hashlib.sha256(normalize_claim(text).encode("utf-8")).hexdigest()[:16]
+
+
+def context_hash(context: Dict[str, Any]) -> str:
+    """Hash of the product/indication context (brand, region, brief) a claim is reviewed in."""
+    canonical = json.dumps({key: normalize_claim(str(value)) for key, value in context.items()}, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def verdict_key(context_digest: str, claim_digest: str) -> str:
+    return f"{context_digest}:{claim_digest}"
+
+
+def walk_text_fields(value: Any, path: str = "") -> Iterable[Tuple[str, str]]:
+    """Yield ``(path, text)`` for every string nested in dicts and lists."""
+    if isinstance(value, dict):
+        for key, child in value.items():
+            yield from walk_text_fields(child, f"{path}.{key}" if path else str(key))
+    elif isinstance(value, list):
+        for i, child in enumerate(value):
+            yield from walk_text_fields(child, f"{path}[{i}]")
+    elif isinstance(value, str):
+        yield path, value
+
+
+def extract_claims(campaign_brief: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Split every text field of the campaign brief into sentence-level claims.
+
+    Each claim carries its field path (e.g. ``A.headline``) and a hash of
+    its normalized text, so identical claims in both variants or across
+    iterations share one verdict.
+    """
+    claims: List[Dict[str, str]] = []
+    seen = set()
+    for path, text in walk_text_fields(campaign_brief):
+        for sentence in _SENTENCE_RE.split(text):
+            sentence = sentence.strip()
+            if not normalize_claim(sentence):
+                continue
+            digest = claim_hash(sentence)
+            if (digest, path) in seen:
+                continue
+            seen.add((digest, path))
+            claims.append({"id": digest, "field": path, "text": sentence})
+    return claims
+
+
+def diff_claims(previous: List[Dict[str, str]], current: List[Dict[str, str]]) -> Dict[str, List[str]]:
+    """Claim ids that are new, unchanged or dropped relative to the previous draft."""
+    before = {c["id"] for c in previous}
+    after = {c["id"] for c in current}
+    return {
+        "new": sorted(after - before),
+        "unchanged": sorted(after & before),
+        "removed": sorted(before - after),
+    }
+
+
+class ClaimVerdictCache:
+    """Legal verdicts keyed by ``verdict_key(context, claim)``, persisted across runs.
+
+    Verdicts are ``{"approved": bool, "edit": str|None, "reason": str, "at": float}``.
+    Approvals expire after CLAIM_VERDICT_TTL_S (default 7 days) and
+    rejections after CLAIM_REJECTION_TTL_S (default 1 hour), so a rejected
+    claim is re-reviewed rather than blocked for good.
+
+    Writes hold an exclusive lock on ``<path>.lock``, merge with the file's
+    current contents and replace it atomically, so concurrent processes
+    don't drop each other's verdicts.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: Optional[float] = None,
+        rejection_ttl: Optional[float] = None,
+    ):
+        self.path = path or os.getenv(
+            "CLAIM_VERDICT_CACHE",
+            os.path.join(os.getenv("TMPDIR", "/tmp"), "claim_verdicts.json"),
+        )
+        self.ttl = ttl or float(os.getenv("CLAIM_VERDICT_TTL_S", str(7 * 86400)))
+        self.rejection_ttl = rejection_ttl or float(os.getenv("CLAIM_REJECTION_TTL_S", "3600"))
+        self._lock = threading.Lock()
+        self._verdicts: Dict[str, Dict[str, Any]] = self._read()
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path) as f:
+                verdicts = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return verdicts if isinstance(verdicts, dict) else {}
+
+    def _fresh(self, verdict: Dict[str, Any], now: float) -> bool:
+        ttl = self.ttl if verdict.get("approved") else self.rejection_ttl
+        return now - verdict.get("at", 0.0) < ttl
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        verdict = self._verdicts.get(key)
+        if verdict is not None and not self._fresh(verdict, time.time()):
+            verdict = None
+        CACHE_REQUESTS.labels(cache="claim_verdicts", result="miss" if verdict is None else "hit").inc()
+        return verdict
+
+    def update(self, verdicts: Dict[str, Dict[str, Any]]) -> None:
+        if not verdicts:
+            return
+        now = time.time()
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with self._lock, open(self.path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            merged = self._read()
+            merged.update({key: {**verdict, "at": now} for key, verdict in verdicts.items()})
+            merged = {key: verdict for key, verdict in merged.items() if self._fresh(verdict, now)}
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(merged, f)
+            os.replace(tmp_path, self.path)
+            self._verdicts = merged
+
+    def __len__(self) -> int:
+        return len(self._verdicts)
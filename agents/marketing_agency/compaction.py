@@ -0,0 +1,93 @@
+import json
+from typing import Any, Dict, Optional
+
+SCOPE_REPORT_CHARS = 4000
+SUPERSEDED_PREVIEW_CHARS = 200
+
+
+def estimate_tokens(value: Any) -> int:
+    """Rough token count (~4 characters per token of the JSON encoding)."""
+    text = value if isinstance(value, str) else json.dumps(value, default=str)
+    return (len(text) + 3) // 4
+
+
+def _truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit] + " …[truncated]"
+
+
+def compact_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Downstream view of the dag pipeline state.
+
+    Keeps only the latest campaign brief, the latest legal verdict and the
+    aggregated KOL statistics. Superseded drafts, raw per-KOL answers and
+    the survey design are dropped; the scope report is truncated.
+    """
+    compact: Dict[str, Any] = {}
+    scope_report = state.get("scoping", {}).get("scope_report")
+    if scope_report:
+        compact["scope_report"] = _truncate(scope_report, SCOPE_REPORT_CHARS)
+    if "ceo_brief" in state:
+        compact["ceo_brief"] = state["ceo_brief"]
+    latest = state.get("revision") or state.get("copywriter_legal")
+    if latest:
+        compact["campaign_brief"] = latest.get("copy", {}).get("campaign_brief", {})
+        legal = latest.get("legal", {})
+        compact["legal"] = {
+            "all_clear": legal.get("all_clear", False),
+            "edits": legal.get("output", {}).get("edits", []),
+        }
+    if "aggregator" in state:
+        stats = state["aggregator"]
+        compact["kol_stats"] = {
+            key: stats.get(key)
+            for key in ("avg_scores", "go_rates", "score_ci", "n", "recommendation", "decisive", "summary")
+        }
+    return compact
+
+
+def record_compaction(pipeline: Dict[str, Any], stage: str, uncompacted: Any, compacted: Any) -> Dict[str, Any]:
+    """Store token counts for ``stage``'s prompt with and without compaction."""
+    full_tokens = estimate_tokens(uncompacted)
+    compact_tokens = estimate_tokens(compacted)
+    report = {
+        "full_tokens": full_tokens,
+        "compact_tokens": compact_tokens,
+        "saved_tokens": max(0, full_tokens - compact_tokens),
+    }
+    pipeline.setdefault("meta", {}).setdefault("compaction", {})[stage] = report
+    print(f"[compaction] {stage}: {full_tokens} -> {compact_tokens} tokens")
+    return report
+
+
+def compact_superseded_tool_results(callback_context: Any, llm_request: Any) -> Optional[Any]:
+    """before_model_callback that shrinks superseded AgentTool results.
+
+    The orchestrator re-sends every earlier tool response on each turn. Only
+    the latest response per tool is kept verbatim; older ones (e.g. previous
+    copywriter drafts or legal verdicts) are replaced by a short preview.
+    The function call/response pairing is preserved.
+    """
+    latest: Dict[str, Any] = {}
+    for content in llm_request.contents or []:
+        for part in content.parts or []:
+            if part.function_response is not None:
+                latest[part.function_response.name] = part.function_response
+
+    saved = 0
+    for content in llm_request.contents or []:
+        for part in content.parts or []:
+            response = part.function_response
+            if response is None or latest.get(response.name) is response:
+                continue
+            if (response.response or {}).get("superseded"):
+                continue
+            before = estimate_tokens(response.response or {})
+            preview = json.dumps(response.response, default=str)[:SUPERSEDED_PREVIEW_CHARS]
+            response.response = {"superseded": True, "preview": preview}
+            saved += before - estimate_tokens(response.response)
+
+    if saved > 0:
+        total = callback_context.state.get("compaction_saved_tokens", 0) + saved
+        callback_context.state["compaction_saved_tokens"] = total
+        print(f"[compaction] orchestrator turn: dropped ~{saved} tokens of superseded tool output ({total} total)")
+    return None
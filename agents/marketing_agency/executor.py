@@ -0,0 +1,295 @@
+import asyncio
+import json
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from ..deadline import Deadline, DeadlineExceeded
+from ..metrics import CACHE_REQUESTS, QUEUE_DEPTH, STAGE_SECONDS
+from ..profiling import mark as profile_mark
+from ..tracing import span
+from .checkpoint import MISSING, RunCheckpoint
+
+APP_NAME = "marketing_agency"
+USER_ID = "pipeline"
+
+StageFn = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+# A stage that fails with less than this many seconds left is treated as
+# having run out of time: it is skipped and the run returns partial output.
+NEAR_DEADLINE_S = 2.0
+
+
+# -----------------------------
+# Agent invocation
+# -----------------------------
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", re.MULTILINE)
+
+
+def parse_agent_output(text: str) -> Any:
+    """Best-effort JSON decoding of an agent's final response.
+
+    Agents are asked to answer in JSON but often wrap it in code fences or
+    prose. Falls back to ``{"text": ...}`` when no JSON object is found.
+    """
+    cleaned = _FENCE_RE.sub("", text or "").strip()
+    for candidate in (cleaned, cleaned[cleaned.find("{"):cleaned.rfind("}") + 1]):
+        if not candidate:
+            continue
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            continue
+    return {"text": text}
+
+
+async def run_agent(agent: Any, prompt: str, state: Optional[Dict[str, Any]] = None) -> Any:
+    """Run a single ADK agent to completion and return its parsed final response."""
+    runner = InMemoryRunner(agent=agent, app_name=APP_NAME)
+    session = await runner.session_service.create_session(
+        app_name=APP_NAME, user_id=USER_ID, state=dict(state or {})
+    )
+    message = types.Content(role="user", parts=[types.Part(text=prompt)])
+    final_text = ""
+    with span(f"agent {agent.name}", agent=agent.name):
+        async for event in runner.run_async(user_id=USER_ID, session_id=session.id, new_message=message):
+            if event.is_final_response() and event.content and event.content.parts:
+                final_text = "".join(part.text or "" for part in event.content.parts)
+    return parse_agent_output(final_text)
+
+
+# -----------------------------
+# Stage graph
+# -----------------------------
+
+@dataclass
+class Stage:
+    name: str
+    fn: StageFn
+    deps: List[str] = field(default_factory=list)
+    # Optional stages are skipped when less than ``budget`` seconds remain
+    # before the request deadline.
+    optional: bool = False
+    budget: float = 0.0
+
+
+class StageGraph:
+    """Dependency-ordered executor for pipeline stages.
+
+    Each stage starts as soon as all of its dependencies have finished, so
+    independent stages overlap and end-to-end latency tracks the critical
+    path. Stage outputs are stored in ``pipeline["state"][stage.name]`` and
+    per-stage timings in ``pipeline["meta"]["timings"]``.
+
+    With a deadline, stages that cannot start in time (and everything
+    downstream of them) are skipped, stages still running when it expires
+    are cancelled, and ``meta`` reports ``partial`` and ``skipped_stages``.
+    A stage that fails with DeadlineExceeded or near the deadline is skipped
+    the same way (its error is kept in ``meta["stage_errors"]``); other
+    failures propagate, optional stage or not.
+    """
+
+    def __init__(self, stages: List[Stage]):
+        self.stages: Dict[str, Stage] = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage: {stage.name}")
+            self.stages[stage.name] = stage
+        for stage in stages:
+            missing = [d for d in stage.deps if d not in self.stages]
+            if missing:
+                raise ValueError(f"Stage {stage.name} depends on unknown stages: {missing}")
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        order: List[str] = []
+        visiting: set = set()
+
+        def visit(name: str) -> None:
+            if name in order:
+                return
+            if name in visiting:
+                raise ValueError(f"Cycle detected at stage: {name}")
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def downstream(self, names: List[str]) -> List[str]:
+        """The given stages plus every stage that transitively depends on them."""
+        affected = set(names)
+        for name in self.order:
+            if any(dep in affected for dep in self.stages[name].deps):
+                affected.add(name)
+        return [name for name in self.order if name in affected]
+
+    async def run(
+        self,
+        pipeline: Dict[str, Any],
+        checkpoint: Optional[RunCheckpoint] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> Dict[str, Any]:
+        state = pipeline.setdefault("state", {})
+        timings = pipeline.setdefault("meta", {}).setdefault("timings", {})
+        started = time.perf_counter()
+        done: set = set()
+        skipped: List[str] = []
+        errors: Dict[str, str] = {}
+        running: Dict[asyncio.Task, str] = {}
+        running_stages = QUEUE_DEPTH.labels(queue="pipeline_stages")
+
+        if checkpoint is not None:
+            # A stage is only restored if everything upstream was restored too.
+            for name in self.order:
+                if not all(dep in done for dep in self.stages[name].deps):
+                    continue
+                output = checkpoint.load(name)
+                CACHE_REQUESTS.labels(cache="stage_checkpoint", result="miss" if output is MISSING else "hit").inc()
+                if output is MISSING:
+                    continue
+                state[name] = output
+                timings[name] = {"start": 0.0, "end": 0.0, "duration": 0.0, "cached": True}
+                done.add(name)
+            pipeline["meta"]["resumed_stages"] = [name for name in self.order if name in done]
+
+        async def execute(stage: Stage) -> Any:
+            t0 = time.perf_counter()
+            status = "error"
+            running_stages.inc()
+            profile_mark(f"{stage.name}:start")
+            try:
+                with span(f"stage {stage.name}", stage=stage.name):
+                    output = await stage.fn(pipeline)
+                status = "ok"
+            except asyncio.CancelledError:
+                status = "cancelled"
+                raise
+            finally:
+                t1 = time.perf_counter()
+                running_stages.dec()
+                profile_mark(f"{stage.name}:{status}")
+                STAGE_SECONDS.labels(stage=stage.name, status=status).observe(t1 - t0)
+                timings[stage.name] = {
+                    "start": round(t0 - started, 4),
+                    "end": round(t1 - started, 4),
+                    "duration": round(t1 - t0, 4),
+                }
+                if status == "ok":
+                    print(f"[stage] {stage.name} finished in {t1 - t0:.2f}s")
+                else:
+                    print(f"[stage] {stage.name} {'cancelled' if status == 'cancelled' else 'failed'} "
+                          f"after {t1 - t0:.2f}s")
+            # Persist as soon as the stage succeeds, even if a sibling fails later,
+            # unless it cut corners for the deadline (meta["degraded"]): a resume
+            # must recompute that stage rather than reuse the partial output.
+            if checkpoint is not None and stage.name not in pipeline["meta"].get("degraded", {}):
+                checkpoint.save(stage.name, output)
+            return output
+
+        def skip(name: str, reason: str) -> None:
+            done.add(name)
+            skipped.append(name)
+            timings.setdefault(name, {"duration": 0.0})["skipped"] = reason
+            print(f"[stage] {name} skipped ({reason})")
+
+        def launch_ready() -> None:
+            progressed = True
+            while progressed:
+                progressed = False
+                scheduled = set(running.values())
+                for name in self.order:
+                    stage = self.stages[name]
+                    if name in done or name in scheduled or not all(dep in done for dep in stage.deps):
+                        continue
+                    progressed = True
+                    if any(dep in skipped for dep in stage.deps):
+                        skip(name, "upstream skipped")
+                    elif deadline is not None and (
+                        deadline.expired() or (stage.optional and deadline.remaining() < stage.budget)
+                    ):
+                        skip(name, "deadline")
+                    else:
+                        running[asyncio.create_task(execute(stage))] = name
+                        scheduled.add(name)
+
+        try:
+            while len(done) < len(self.stages):
+                launch_ready()
+                if not running:
+                    continue
+                timeout = deadline.remaining() if deadline is not None else None
+                finished, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not finished:
+                    # Deadline hit: give up on whatever is still running.
+                    for task in running:
+                        task.cancel()
+                    await asyncio.gather(*running, return_exceptions=True)
+                    for name in running.values():
+                        skip(name, "deadline")
+                    running.clear()
+                    continue
+                for task in finished:
+                    name = running.pop(task)
+                    try:
+                        state[name] = task.result()
+                    except Exception as e:
+                        if not self._degradable(e, deadline):
+                            raise
+                        errors[name] = f"{type(e).__name__}: {e}"
+                        skip(name, "deadline")
+                        continue
+                    done.add(name)
+        finally:
+            # Wait for cancelled siblings so their cleanup (metrics, timings)
+            # finishes before run() returns or raises.
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+        pipeline["meta"]["total_duration"] = round(time.perf_counter() - started, 4)
+        pipeline["meta"]["critical_path"] = self.critical_path(timings)
+        pipeline["meta"]["partial"] = bool(skipped)
+        pipeline["meta"]["skipped_stages"] = skipped
+        if errors:
+            pipeline["meta"]["stage_errors"] = errors
+        return pipeline
+
+    @staticmethod
+    def _degradable(error: Exception, deadline: Optional[Deadline]) -> bool:
+        """Whether a stage failure should be skipped (partial result) rather than fail the run.
+
+        Only running out of time degrades a run, optional stage or not; any
+        other error (auth, bad model output, bugs) fails it.
+        """
+        if isinstance(error, DeadlineExceeded):
+            return True
+        return deadline is not None and deadline.remaining() < NEAR_DEADLINE_S
+
+    def critical_path(self, timings: Dict[str, Dict[str, float]]) -> List[str]:
+        """Chain of stages that determined the end-to-end latency."""
+        finish: Dict[str, float] = {}
+        previous: Dict[str, Optional[str]] = {}
+        for name in self.order:
+            deps = self.stages[name].deps
+            slowest = max(deps, key=lambda d: finish[d], default=None)
+            previous[name] = slowest
+            base = finish[slowest] if slowest else 0.0
+            finish[name] = base + timings.get(name, {}).get("duration", 0.0)
+        if not finish:
+            return []
+        path: List[str] = []
+        node: Optional[str] = max(finish, key=finish.get)
+        while node:
+            path.append(node)
+            node = previous[node]
+        return list(reversed(path))
@@ -0,0 +1,49 @@
+from typing import Any, Dict, List
+
+from ..chief_marketing_agent.sub_agents.lead_finder_agent.agent import (
+    find_red_flags,
+    scan_compliance_rules,
+)
+from .claims import walk_text_fields
+
+
+def precheck_campaign(campaign_brief: Dict[str, Any]) -> Dict[str, Any]:
+    """Mechanical compliance check of copywriter output before legal review.
+
+    Applies the lead finder's keyword rules to each variant, matching whole
+    words only ("cure" but not "secure"), and turns every failure into a
+    concrete edit for the copywriter. Returns
+    ``{"passed": bool, "edits": [...]}`` in the same shape legal uses.
+    """
+    edits: List[Dict[str, str]] = []
+    if not isinstance(campaign_brief, dict):
+        return {"passed": True, "edits": edits}
+    for name, variant in sorted(campaign_brief.items()):
+        fields = list(walk_text_fields(variant))
+        rules = scan_compliance_rules("\n".join(text for _, text in fields), whole_words=True)
+        for path, text in fields:
+            for phrase in find_red_flags(text, whole_words=True):
+                edits.append({
+                    "field": f"{name}.{path}",
+                    "claim": text,
+                    "edit": f"Remove or qualify the absolute claim '{phrase}'.",
+                    "reason": "Potentially misleading absolute claim",
+                })
+        if not rules["has_risk"]:
+            edits.append({
+                "field": name,
+                "claim": "",
+                "edit": "Add Important Safety Information (ISI) covering key risks and side effects.",
+                "reason": (
+                    "Benefits presented without adequate risk/side effect disclosure"
+                    if rules["has_benefit_claims"] else "Missing risk information"
+                ),
+            })
+        if not rules["has_labeling_ref"]:
+            edits.append({
+                "field": name,
+                "claim": "",
+                "edit": "Add a reference to the full Prescribing Information.",
+                "reason": "Missing reference to approved labeling / prescribing information",
+            })
+    return {"passed": not edits, "edits": edits}
@@ -0,0 +1,604 @@
+import asyncio
+import json
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..chief_marketing_agent.agent import agent as scoping_agent
+from ..deadline import Deadline, current_deadline, use_deadline
+from ..model_router import router, run_call_stats, start_run_recording
+from ..tracing import span
+from .agent import (
+    aggregator_agent,
+    ceo_agent,
+    copywriter_agent,
+    legal_agent,
+    kol_panel_roster,
+    kol_settings,
+    make_kol_agent,
+    make_kol_panel_agent,
+    market_research_agent,
+    randomize_ab_assignment,
+    terminate_on_all_clear,
+    _print_header,
+)
+from .aggregation import aggregate_kol_feedback
+from .checkpoint import CheckpointStore, RunCheckpoint, input_hash
+from .claims import ClaimVerdictCache, context_hash, diff_claims, extract_claims, verdict_key
+from .compaction import compact_state, record_compaction
+from .executor import Stage, StageGraph, run_agent
+from .precheck import precheck_campaign
+from .stats import welch_t_test
+
+MAX_LOOP_ITERATIONS = 6
+
+# Sequential KOL testing: scores are 1-10 integers, so identical scores in an
+# arm are common; floor each arm's variance at that of a +/-1 score and need
+# at least MIN_KOLS_PER_ARM (never below the floor) before a look can stop.
+SCORE_VARIANCE_FLOOR = 1.0
+MIN_KOLS_PER_ARM = 4
+MIN_KOLS_PER_ARM_FLOOR = 3
+
+# Deadline degradation: below these remaining budgets (seconds) the KOL
+# panel shrinks to REDUCED_KOLS and the optional stages are skipped.
+REDUCED_KOLS = 4
+KOL_FULL_PANEL_BUDGET = 25.0
+REVISION_BUDGET = 20.0
+SIGNOFF_BUDGET = 8.0
+
+# Seconds between sweeps of expired stage checkpoints.
+CHECKPOINT_PRUNE_INTERVAL_S = 600.0
+
+
+def _dump(value: Any) -> str:
+    return json.dumps(value, indent=2, default=str)
+
+
+def _deadline(pipeline: Dict[str, Any]) -> Deadline:
+    return pipeline.get("deadline") or current_deadline()
+
+
+def _degrade(pipeline: Dict[str, Any], stage: str, note: str) -> None:
+    # Degraded outputs are returned but not checkpointed (see StageGraph.run),
+    # so a resume recomputes them in full.
+    print(f"[deadline] {stage}: {note}")
+    pipeline["meta"].setdefault("degraded", {})[stage] = note
+
+
+def _latest_loop(pipeline: Dict[str, Any]) -> Dict[str, Any]:
+    state = pipeline["state"]
+    return state.get("revision") or state.get("copywriter_legal") or {}
+
+
+def _latest_campaign(pipeline: Dict[str, Any]) -> Dict[str, Any]:
+    return _latest_loop(pipeline).get("copy", {}).get("campaign_brief", {})
+
+
+# -----------------------------
+# Stage implementations
+# -----------------------------
+
+async def scoping_stage(pipeline: Dict[str, Any]) -> Dict[str, Any]:
+    brief = pipeline["inputs"]["brief"]
+    output = await run_agent(scoping_agent, brief, state={"campaign_analysis": brief})
+    return {"scope_report": output.get("text", _dump(output))}
+
+
+async def ceo_brief_stage(pipeline: Dict[str, Any]) -> Any:
+    scope_report = pipeline["state"]["scoping"]["scope_report"]
+    prompt = (
+        f"Marketing brief:\n{pipeline['inputs']['brief']}\n\n"
+        f"Defaults:\n{_dump(pipeline.get('pipeline', {}).get('defaults', {}))}"
+    )
+    return await run_agent(ceo_agent, prompt, state={"scope_report": scope_report})
+
+
+_claim_cache: Optional[ClaimVerdictCache] = None
+
+
+def _claim_verdicts() -> ClaimVerdictCache:
+    global _claim_cache
+    if _claim_cache is None:
+        _claim_cache = ClaimVerdictCache()
+    return _claim_cache
+
+
+def _legal_settings(pipeline: Dict[str, Any]) -> Dict[str, Any]:
+    # pipeline["pipeline"]["legal"] overrides the LEGAL_* env vars.
+    settings = {
+        "incremental": os.getenv("LEGAL_INCREMENTAL", "0") == "1",
+        "precheck": os.getenv("LEGAL_PRECHECK", "0") == "1",
+    }
+    settings.update(pipeline.get("pipeline", {}).get("legal", {}))
+    return settings
+
+
+def _review_context(pipeline: Dict[str, Any]) -> Dict[str, Any]:
+    # The product, indication and market a claim is judged against; a
+    # verdict is only reused within the same context.
+    defaults = pipeline.get("pipeline", {}).get("defaults", {})
+    return {
+        "brand": defaults.get("brand", ""),
+        "region": defaults.get("region", ""),
+        "brief": pipeline["inputs"]["brief"],
+    }
+
+
+async def _full_legal_review(copy: Dict[str, Any]) -> Dict[str, Any]:
+    return await run_agent(legal_agent, f"Campaign content:\n{_dump(copy)}")
+
+
+async def _campaign_legal_review(copy: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
+    # Requirements that only make sense for the campaign as a whole.
+    prompt = (
+        "Check only campaign-level requirements: Important Safety Information (ISI) is present and "
+        "complete, and benefit claims are fairly balanced by risk information. Individual claims are "
+        "reviewed separately.\n"
+        "Return JSON { 'all_clear': true|false, 'edits': [ { 'field': str, 'edit': str, 'reason': str } ] }\n\n"
+        f"Product context:\n{_dump(context)}\n\nCampaign content:\n{_dump(copy)}"
+    )
+    return await run_agent(legal_agent, prompt)
+
+
+async def _review_claims(pending: Dict[str, Dict[str, str]], context: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    prompt = (
+        "Review only the claims below, for the product context given; all other claims in the "
+        "campaign are already settled.\n"
+        "Return JSON { 'claims': [ { 'id': str, 'approved': true|false, 'edit': str|null, 'reason': str } ] }\n\n"
+        f"Product context:\n{_dump(context)}\n\nClaims:\n{_dump(list(pending.values()))}"
+    )
+    output = await run_agent(legal_agent, prompt)
+    fresh = {}
+    for entry in output.get("claims", []):
+        if isinstance(entry, dict) and entry.get("id") in pending:
+            fresh[entry["id"]] = {
+                "approved": bool(entry.get("approved")),
+                "edit": entry.get("edit"),
+                "reason": entry.get("reason", ""),
+            }
+    return fresh
+
+
+async def _incremental_legal_review(
+    copy: Dict[str, Any], previous_claims: List[Dict[str, str]], context: Dict[str, Any]
+) -> Tuple[Dict[str, Any], List[Dict[str, str]]]:
+    # Only claims without a cached verdict for this product context go to the
+    # legal agent; ISI and fair balance are checked on the whole campaign
+    # every iteration, alongside the claim review.
+    claims = extract_claims(copy.get("campaign_brief", {}))
+    if not claims:
+        return await _full_legal_review(copy), claims
+    cache = _claim_verdicts()
+    context_digest = context_hash(context)
+    # Each claim is looked up once, so the cache hit rate counts it once.
+    verdicts: Dict[str, Optional[Dict[str, Any]]] = {}
+    pending: Dict[str, Dict[str, str]] = {}
+    for claim in claims:
+        if claim["id"] in verdicts:
+            continue
+        verdicts[claim["id"]] = cache.get(verdict_key(context_digest, claim["id"]))
+        if verdicts[claim["id"]] is None:
+            pending[claim["id"]] = {"id": claim["id"], "text": claim["text"]}
+    if pending:
+        fresh, campaign = await asyncio.gather(
+            _review_claims(pending, context), _campaign_legal_review(copy, context)
+        )
+        cache.update({verdict_key(context_digest, claim_id): verdict for claim_id, verdict in fresh.items()})
+        verdicts.update(fresh)
+    else:
+        campaign = await _campaign_legal_review(copy, context)
+    if not isinstance(campaign, dict):
+        campaign = {}
+
+    edits = []
+    all_clear = True
+    for claim in claims:
+        verdict = verdicts[claim["id"]]
+        if verdict and verdict["approved"]:
+            continue
+        all_clear = False
+        edits.append({
+            "field": claim["field"],
+            "claim": claim["text"],
+            "edit": verdict["edit"] if verdict else None,
+            "reason": verdict["reason"] if verdict else "Not reviewed",
+        })
+    campaign_edits = campaign.get("edits") or []
+    if not campaign.get("all_clear") or campaign_edits:
+        all_clear = False
+        edits.extend({**edit, "scope": "campaign"} for edit in campaign_edits if isinstance(edit, dict))
+    diff = diff_claims(previous_claims, claims)
+    return {
+        "edits": edits,
+        "all_clear": all_clear,
+        "claims": {
+            "total": len(claims),
+            "reviewed": len(pending),
+            "new": len(diff["new"]),
+            "unchanged": len(diff["unchanged"]),
+            "removed": len(diff["removed"]),
+        },
+    }, claims
+
+
+async def _copywriter_legal_loop(
+    pipeline: Dict[str, Any], context: str, copy: Optional[Dict[str, Any]] = None, stage: str = "copywriter_legal"
+) -> Dict[str, Any]:
+    # Stages only communicate through their return values so that each
+    # stage output can be checkpointed and restored on its own.
+    settings = _legal_settings(pipeline)
+    incremental = settings["incremental"]
+    copy = copy or {}
+    claims = extract_claims(copy.get("campaign_brief", {})) if incremental else []
+    legal: Dict[str, Any] = {}
+    iterations = 0
+    precheck_failures = 0
+    deadline = _deadline(pipeline)
+    loop_started = time.monotonic()
+    for iterations in range(1, MAX_LOOP_ITERATIONS + 1):
+        if iterations > 1:
+            # Stop iterating when another round would likely overrun the deadline.
+            per_iteration = (time.monotonic() - loop_started) / (iterations - 1)
+            if deadline.remaining() < 1.2 * per_iteration:
+                iterations -= 1
+                _degrade(pipeline, stage, f"stopped after {iterations} iteration(s)")
+                break
+        prompt = context
+        if legal:
+            prompt += f"\n\nPrevious draft:\n{_dump(copy)}\n\nLegal edits to apply:\n{_dump(legal['output'])}"
+        with span("copywriter_legal.iteration", iteration=iterations) as s:
+            copy = await run_agent(copywriter_agent, prompt)
+            if settings["precheck"]:
+                # Mechanical failures go straight back to the copywriter without
+                # spending a legal round on them.
+                precheck = precheck_campaign(copy.get("campaign_brief", {}))
+                if not precheck["passed"]:
+                    precheck_failures += 1
+                    print(f"Precheck failed with {len(precheck['edits'])} edits – skipping legal review")
+                    legal = {"output": {"edits": precheck["edits"], "all_clear": False, "source": "precheck"}, "all_clear": False}
+                    s.set("precheck_passed", False)
+                    continue
+            if incremental:
+                verdict, claims = await _incremental_legal_review(copy, claims, _review_context(pipeline))
+            else:
+                verdict = await _full_legal_review(copy)
+            legal = {"output": verdict, "all_clear": bool(verdict.get("all_clear"))}
+            s.set("all_clear", legal["all_clear"])
+        if terminate_on_all_clear({"state": {"legal_agent": legal}}):
+            break
+    return {
+        "copy": copy,
+        "legal": legal,
+        "iterations": iterations,
+        "precheck_failures": precheck_failures,
+        "all_clear": legal["all_clear"],
+    }
+
+
+async def copywriter_legal_stage(pipeline: Dict[str, Any]) -> Dict[str, Any]:
+    context = (
+        f"Marketing brief:\n{pipeline['inputs']['brief']}\n\n"
+        f"CEO strategy:\n{_dump(pipeline['state']['ceo_brief'])}"
+    )
+    return await _copywriter_legal_loop(pipeline, context)
+
+
+async def market_research_stage(pipeline: Dict[str, Any]) -> Any:
+    prompt = (
+        f"Marketing brief:\n{pipeline['inputs']['brief']}\n\n"
+        f"CEO strategy:\n{_dump(pipeline['state']['ceo_brief'])}"
+    )
+    return await run_agent(market_research_agent, prompt)
+
+
+def _kol_settings(pipeline: Dict[str, Any]) -> Dict[str, Any]:
+    # pipeline["pipeline"]["kol"] overrides the KOL_MODE / KOL_PANEL_SIZE env vars.
+    settings = kol_settings(pipeline.get("pipeline", {}).get("kol", {}))
+    if settings["size"] > REDUCED_KOLS and _deadline(pipeline).remaining() < KOL_FULL_PANEL_BUDGET:
+        settings["size"] = REDUCED_KOLS
+        _degrade(pipeline, "kol_feedback", f"panel reduced to {REDUCED_KOLS} KOLs")
+    return settings
+
+
+async def _kol_fanout(campaign: Dict[str, Any], survey: Any, assignment: Dict[str, str]) -> List[Dict[str, Any]]:
+    kol_agents = [make_kol_agent(_kol_index(name)) for name in assignment]
+
+    async def ask(agent: Any) -> Dict[str, Any]:
+        variant = assignment[agent.name]
+        prompt = (
+            f"You are assigned variant {variant}.\n\n"
+            f"Variant {variant}:\n{_dump(campaign.get(variant, {}))}\n\n"
+            f"Survey:\n{_dump(survey)}"
+        )
+        feedback = await run_agent(agent, prompt)
+        return {"kol": agent.name, "variant": variant, **feedback}
+
+    return list(await asyncio.gather(*(ask(agent) for agent in kol_agents)))
+
+
+async def _kol_panel(
+    campaign: Dict[str, Any], survey: Any, assignment: Dict[str, str], personas: Optional[List[str]]
+) -> List[Dict[str, Any]]:
+    start = min(_kol_index(name) for name in assignment)
+    roster = [
+        {**member, "variant": assignment[member["kol"]]}
+        for member in kol_panel_roster(len(assignment), personas, start=start)
+    ]
+    variants = sorted(set(assignment.values()))
+    prompt = (
+        "Campaign variants:\n"
+        + "\n\n".join(f"Variant {v}:\n{_dump(campaign.get(v, {}))}" for v in variants)
+        + f"\n\nSurvey:\n{_dump(survey)}\n\nPanel roster:\n{_dump(roster)}"
+    )
+    output = await run_agent(make_kol_panel_agent(len(roster)), prompt)
+    by_kol = {entry.get("kol"): entry for entry in output.get("feedback", []) if isinstance(entry, dict)}
+    # The assignment is ours, not the model's: always report the assigned variant.
+    return [
+        {**by_kol.get(member["kol"], {"notes": "", "score": None, "go_no_go": None}),
+         "kol": member["kol"], "variant": member["variant"], "persona": member["persona"]}
+        for member in roster
+    ]
+
+
+def _kol_index(name: str) -> int:
+    return int(name.rsplit("_", 1)[1])
+
+
+async def _collect_kol_feedback(
+    settings: Dict[str, Any], campaign: Dict[str, Any], survey: Any, assignment: Dict[str, str]
+) -> List[Dict[str, Any]]:
+    if settings["mode"] == "panel":
+        return await _kol_panel(campaign, survey, assignment, settings["personas"])
+    return await _kol_fanout(campaign, survey, assignment)
+
+
+def _numeric_score(entry: Dict[str, Any]) -> Optional[float]:
+    try:
+        return float(entry.get("score"))
+    except (TypeError, ValueError):
+        return None
+
+
+def sequential_decision(
+    feedback: List[Dict[str, Any]], confidence: float, looks: int, min_per_arm: int = MIN_KOLS_PER_ARM
+) -> Dict[str, Any]:
+    """Welch t-test of A vs B scores with a Bonferroni split of alpha across looks.
+
+    Splitting ``1 - confidence`` evenly over the planned number of looks keeps
+    the overall false-decision rate at the configured level despite testing
+    after every wave. No look is decisive before each arm has ``min_per_arm``
+    scores, and sample variances are floored at SCORE_VARIANCE_FLOOR.
+    """
+    scores: Dict[str, List[float]] = {"A": [], "B": []}
+    for entry in feedback:
+        score = _numeric_score(entry)
+        if score is not None and entry.get("variant") in scores:
+            scores[entry["variant"]].append(score)
+    alpha = (1.0 - confidence) / max(1, looks)
+    decision: Dict[str, Any] = {
+        "n": {v: len(s) for v, s in scores.items()},
+        "mean": {v: (sum(s) / len(s) if s else None) for v, s in scores.items()},
+        "alpha": alpha,
+        "p_value": None,
+        "decisive": False,
+    }
+    min_per_arm = max(MIN_KOLS_PER_ARM_FLOOR, min_per_arm)
+    if len(scores["A"]) >= min_per_arm and len(scores["B"]) >= min_per_arm:
+        _, _, p = welch_t_test(scores["A"], scores["B"], min_var=SCORE_VARIANCE_FLOOR)
+        decision["p_value"] = p
+        decision["decisive"] = p < alpha
+    return decision
+
+
+async def _kol_sequential(
+    pipeline: Dict[str, Any], settings: Dict[str, Any], campaign: Dict[str, Any], survey: Any
+) -> List[Dict[str, Any]]:
+    max_size = settings["size"]
+    wave_size = max(2, settings["wave_size"])
+    looks = math.ceil(max_size / wave_size)
+    feedback: List[Dict[str, Any]] = []
+    decision: Dict[str, Any] = {}
+    waves = 0
+    while len(feedback) < max_size:
+        start = len(feedback) + 1
+        names = [f"kol_{i}" for i in range(start, min(start + wave_size, max_size + 1))]
+        assignment = randomize_ab_assignment(pipeline, names, balanced=True)
+        with span("kol.wave", wave=waves + 1, kols=len(names)) as s:
+            feedback += await _collect_kol_feedback(settings, campaign, survey, assignment)
+            waves += 1
+            decision = sequential_decision(feedback, settings["confidence"], looks, settings["min_per_arm"])
+            s.set("decisive", bool(decision["decisive"]))
+        print(f"KOL wave {waves}: n={decision['n']} p={decision['p_value']} decisive={decision['decisive']}")
+        if decision["decisive"]:
+            break
+    pipeline["meta"]["kol_sequential"] = {**decision, "waves": waves, "panel_size": len(feedback)}
+    return feedback
+
+
+async def kol_feedback_stage(pipeline: Dict[str, Any]) -> List[Dict[str, Any]]:
+    settings = _kol_settings(pipeline)
+    campaign = _latest_campaign(pipeline)
+    survey = pipeline["state"]["market_research"]
+    if settings["sequential"]:
+        return await _kol_sequential(pipeline, settings, campaign, survey)
+    names = [f"kol_{i}" for i in range(1, settings["size"] + 1)]
+    assignment = randomize_ab_assignment(pipeline, names)
+    return await _collect_kol_feedback(settings, campaign, survey, assignment)
+
+
+def _aggregator_settings(pipeline: Dict[str, Any]) -> Dict[str, Any]:
+    # pipeline["pipeline"]["aggregator"] overrides the env vars.
+    settings = {
+        "narrative": os.getenv("AGGREGATOR_NARRATIVE", "0") == "1",
+        "confidence": float(os.getenv("KOL_CONFIDENCE", 0.95)),
+    }
+    settings.update(pipeline.get("pipeline", {}).get("aggregator", {}))
+    return settings
+
+
+async def aggregator_stage(pipeline: Dict[str, Any]) -> Dict[str, Any]:
+    # Statistics are computed locally; the aggregator agent is only asked for
+    # a narrative when AGGREGATOR_NARRATIVE=1 / pipeline.aggregator.narrative.
+    settings = _aggregator_settings(pipeline)
+    stats = aggregate_kol_feedback(pipeline["state"]["kol_feedback"], confidence=settings["confidence"])
+    if settings["narrative"]:
+        output = await run_agent(aggregator_agent, f"Aggregated statistics:\n{_dump(stats)}")
+        stats["summary"] = output.get("summary") or output.get("text") or stats["summary"]
+    return stats
+
+
+def _revision_context(campaign: Any, kol_feedback: Any) -> str:
+    return (
+        f"Revise the campaign using the KOL findings.\n\n"
+        f"Current campaign:\n{_dump(campaign)}\n\n"
+        f"Aggregated KOL feedback:\n{_dump(kol_feedback)}"
+    )
+
+
+async def revision_stage(pipeline: Dict[str, Any]) -> Dict[str, Any]:
+    state = pipeline["state"]
+    compact = compact_state(state)
+    context = _revision_context(compact.get("campaign_brief", {}), compact.get("kol_stats", {}))
+    # Savings are measured against the prompt this stage sent before compaction.
+    record_compaction(
+        pipeline, "revision", _revision_context(_latest_campaign(pipeline), state.get("aggregator", {})), context
+    )
+    return await _copywriter_legal_loop(pipeline, context, state["copywriter_legal"]["copy"], stage="revision")
+
+
+def _signoff_prompt(campaign: Any, recommendation: Any, legal: Any) -> str:
+    return (
+        "Provide final sign-off on the campaign.\n\n"
+        f"Campaign:\n{_dump(campaign)}\n\n"
+        f"Recommendation:\n{_dump(recommendation)}\n\n"
+        f"Legal verdict:\n{_dump(legal)}"
+    )
+
+
+async def ceo_signoff_stage(pipeline: Dict[str, Any]) -> Any:
+    state = pipeline["state"]
+    compact = compact_state(state)
+    prompt = _signoff_prompt(compact.get("campaign_brief", {}), compact.get("kol_stats", {}), compact.get("legal", {}))
+    scope_report = compact.get("scope_report", "")
+    uncompacted = _signoff_prompt(
+        _latest_campaign(pipeline),
+        state.get("aggregator", {}),
+        _latest_loop(pipeline).get("legal", {}).get("output", {}),
+    )
+    # The scope report goes in through session state, so it counts towards both sides.
+    record_compaction(
+        pipeline,
+        "ceo_signoff",
+        uncompacted + state.get("scoping", {}).get("scope_report", ""),
+        prompt + scope_report,
+    )
+    return await run_agent(ceo_agent, prompt, state={"scope_report": scope_report})
+
+
+# -----------------------------
+# Graph composition
+# -----------------------------
+
+def build_stage_graph() -> StageGraph:
+    # Mirrors the six documented steps of build_marketing_pipeline, with
+    # market research running alongside the copywriter/legal loop.
+    return StageGraph([
+        Stage("scoping", scoping_stage),
+        Stage("ceo_brief", ceo_brief_stage, ["scoping"]),
+        Stage("copywriter_legal", copywriter_legal_stage, ["ceo_brief"]),
+        Stage("market_research", market_research_stage, ["ceo_brief"]),
+        Stage("kol_feedback", kol_feedback_stage, ["copywriter_legal", "market_research"]),
+        Stage("aggregator", aggregator_stage, ["kol_feedback"]),
+        Stage("revision", revision_stage, ["aggregator"], optional=True, budget=REVISION_BUDGET),
+        Stage("ceo_signoff", ceo_signoff_stage, ["revision"], optional=True, budget=SIGNOFF_BUDGET),
+    ])
+
+
+def stage_config(pipeline: Dict[str, Any]) -> Dict[str, Any]:
+    """Effective settings that change stage outputs, for the checkpoint hash.
+
+    Models are the configured primary per role; latency fallbacks are left
+    out, since they change from call to call.
+    """
+    return {
+        "kol": kol_settings(pipeline.get("pipeline", {}).get("kol", {})),
+        "legal": _legal_settings(pipeline),
+        "aggregator": _aggregator_settings(pipeline),
+        "models": {role: router.tiers.get(router.tier_for(role)) for role in sorted(router.roles)},
+    }
+
+
+class MarketingDagPipeline:
+    """Deterministic replacement for the LLM orchestrator.
+
+    Exposes the same ``run(payload)`` entry point as the orchestrator agent
+    and returns the pipeline state, including ``meta`` with stage timings
+    and the critical path.
+
+    Pass ``run_id`` in the payload to checkpoint every completed stage; a
+    rerun with the same run id and inputs resumes after the last completed
+    stage. ``invalidate`` lists stages to recompute, together with every
+    stage downstream of them.
+
+    ``deadline_s`` bounds the whole run: the KOL panel and legal loop shrink,
+    optional stages are skipped, and the result is marked ``partial``.
+    """
+
+    name = "marketing_agency_dag"
+
+    def __init__(self, checkpoints: Optional[CheckpointStore] = None) -> None:
+        self.graph = build_stage_graph()
+        self.checkpoints = checkpoints or CheckpointStore()
+        self._prune_due = 0.0
+
+    async def run_async(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        deadline = Deadline(payload.get("deadline_s"))
+        pipeline = {
+            "inputs": dict(payload.get("inputs", {})),
+            "pipeline": dict(payload.get("pipeline", {})),
+            "state": {},
+            "meta": {},
+            "deadline": deadline,
+        }
+        checkpoint = None
+        run_id = payload.get("run_id")
+        if run_id:
+            if time.monotonic() >= self._prune_due:
+                # Every request gets a run id, so expired runs are swept now and then.
+                self._prune_due = time.monotonic() + CHECKPOINT_PRUNE_INTERVAL_S
+                self.checkpoints.prune()
+            checkpoint = RunCheckpoint(self.checkpoints, run_id, input_hash(payload, stage_config(pipeline)))
+            invalidate = payload.get("invalidate") or []
+            if invalidate:
+                checkpoint.invalidate(self.graph.downstream(list(invalidate)))
+            pipeline["meta"]["run_id"] = run_id
+
+        pipeline["meta"]["models"] = start_run_recording()
+        with use_deadline(deadline), span("pipeline.run", run_id=run_id or "") as s:
+            pipeline["meta"]["trace_id"] = s.trace_id
+            await self.graph.run(pipeline, checkpoint=checkpoint, deadline=deadline)
+            s.set("partial", pipeline["meta"]["partial"])
+        pipeline["meta"]["model_calls"] = run_call_stats()
+        _print_header("Stage timings")
+        for name, timing in pipeline["meta"]["timings"].items():
+            suffix = " (checkpoint)" if timing.get("cached") else ""
+            if timing.get("skipped"):
+                suffix = f" (skipped: {timing['skipped']})"
+            print(f"  {name}: {timing['duration']:.2f}s{suffix}")
+        print(f"  critical path: {' -> '.join(pipeline['meta']['critical_path'])}")
+        return self._result(pipeline)
+
+    @staticmethod
+    def _result(pipeline: Dict[str, Any]) -> Dict[str, Any]:
+        # Expose the latest loop output under the agent keys deploy_markdown reads.
+        latest = _latest_loop(pipeline)
+        return {
+            **pipeline["state"],
+            "copywriter_agent": {"output": latest.get("copy", {})},
+            "legal_agent": latest.get("legal", {}),
+            "meta": pipeline["meta"],
+        }
+
+    def run(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return asyncio.run(self.run_async(payload))
@@ -0,0 +1,85 @@
+import math
+from typing import List, Sequence, Tuple
+
+
+def _betacf(a: float, b: float, x: float) -> float:
+    # Continued fraction for the incomplete beta function (modified Lentz).
+    tiny = 1e-30
+    qab, qap, qam = a + b, a + 1.0, a - 1.0
+    c, d = 1.0, 1.0 - qab * x / qap
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 201):
+        m2 = 2 * m
+        aa = m * (b - m) * x / ((qam + m2) * (a + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / (d if abs(d) > tiny else tiny)
+        c = 1.0 + aa / c
+        c = c if abs(c) > tiny else tiny
+        h *= d * c
+        aa = -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / (d if abs(d) > tiny else tiny)
+        c = 1.0 + aa / c
+        c = c if abs(c) > tiny else tiny
+        delta = d * c
+        h *= delta
+        if abs(delta - 1.0) < 3e-12:
+            break
+    return h
+
+
+def regularized_beta(a: float, b: float, x: float) -> float:
+    """Regularized incomplete beta function I_x(a, b)."""
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    log_front = math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log1p(-x)
+    front = math.exp(log_front)
+    if x < (a + 1.0) / (a + b + 2.0):
+        return front * _betacf(a, b, x) / a
+    return 1.0 - front * _betacf(b, a, 1.0 - x) / b
+
+
+def _mean_var(values: Sequence[float]) -> Tuple[float, float]:
+    n = len(values)
+    mean = sum(values) / n
+    var = sum((v - mean) ** 2 for v in values) / (n - 1) if n > 1 else 0.0
+    return mean, var
+
+
+def welch_t_test(
+    a: Sequence[float], b: Sequence[float], min_var: float = 0.0
+) -> Tuple[float, float, float]:
+    """Welch's unequal-variance t-test.
+
+    Returns ``(t, df, p)`` where ``p`` is the two-sided p-value for the
+    difference in means. Both samples need at least two observations.
+    ``min_var`` floors each sample variance, so a few identical integer
+    scores don't read as a noise-free (certain) difference.
+    """
+    if len(a) < 2 or len(b) < 2:
+        raise ValueError("welch_t_test needs at least two observations per sample")
+    mean_a, var_a = _mean_var(a)
+    mean_b, var_b = _mean_var(b)
+    var_a, var_b = max(var_a, min_var), max(var_b, min_var)
+    se2_a, se2_b = var_a / len(a), var_b / len(b)
+    se2 = se2_a + se2_b
+    if se2 == 0.0:
+        # No spread at all says nothing about the noise: never significant.
+        return (0.0, float(len(a) + len(b) - 2), 1.0)
+    t = (mean_a - mean_b) / math.sqrt(se2)
+    df = se2 ** 2 / (
+        (se2_a ** 2 / (len(a) - 1) if se2_a else 0.0) + (se2_b ** 2 / (len(b) - 1) if se2_b else 0.0)
+    )
+    p = regularized_beta(df / 2.0, 0.5, df / (df + t * t))
+    return t, df, p
+
+
+def balanced_labels(count: int, labels: List[str], rng) -> List[str]:
+    """``count`` labels spread as evenly as possible, in random order."""
+    offset = rng.randrange(len(labels))
+    out = [labels[(offset + i) % len(labels)] for i in range(count)]
+    rng.shuffle(out)
+    return out
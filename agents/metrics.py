@@ -0,0 +1,264 @@
+"""
+Process-wide metrics registry with Prometheus text exposition.
+
+Modules define their metrics here once and update them from hot paths:
+
+    STAGE_SECONDS.labels(stage="kol_feedback", status="ok").observe(1.8)
+
+A labelled child is created on first use and cached, so an update is a
+dict lookup plus a locked add. ``render()`` produces the text served at
+/api/metrics. Values are per process; with several workers each one
+exposes its own series. Labels drawn from an open-ended set (scraped
+hosts) go through a ``LabelLimiter`` so the number of series stays bounded.
+"""
+
+import bisect
+import os
+import threading
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536)
+BYTES_BUCKETS = (1024, 8192, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _samples(self) -> Iterable[str]:
+        for key, child in list(self._children.items()):
+            yield f"{self.name}_total{_label_text(self.labelnames, key)} {_number(child.value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def _samples(self) -> Iterable[str]:
+        for key, child in list(self._children.items()):
+            yield f"{self.name}{_label_text(self.labelnames, key)} {_number(child.value)}"
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _samples(self) -> Iterable[str]:
+        for key, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_label_text(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_label_text(self.labelnames, key)} {_number(total)}"
+            yield f"{self.name}_count{_label_text(self.labelnames, key)} {cumulative}"
+
+
+class LabelLimiter:
+    """Caps the distinct values of an open-ended label.
+
+    The first ``limit`` values seen keep their own series; any later value
+    is reported as ``other``.
+    """
+
+    def __init__(self, limit: int, other: str = "other"):
+        self.limit = limit
+        self.other = other
+        self._seen: set = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, value: str) -> str:
+        if value in self._seen:
+            return value
+        with self._lock:
+            if len(self._seen) < self.limit:
+                self._seen.add(value)
+                return value
+        return self.other
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+# -----------------------------
+# Shared metrics
+# -----------------------------
+
+STAGE_SECONDS = histogram(
+    "pipeline_stage_seconds", "Marketing pipeline stage latency", ["stage", "status"]
+)
+LLM_CALL_SECONDS = histogram(
+    "llm_call_seconds", "Model call latency per agent role and model", ["role", "model"]
+)
+LLM_TOKENS = histogram(
+    "llm_tokens", "Tokens per model call", ["role", "kind"], buckets=TOKEN_BUCKETS
+)
+LLM_CALLS = counter(
+    "llm_calls", "Model calls by outcome (ok, error, timeout) and whether they were hedged",
+    ["role", "outcome", "hedged"],
+)
+LLM_RETRIES = counter(
+    "llm_retries", "Duplicate (hedged) model requests sent", ["role"]
+)
+# Crawls and recrawls visit an unbounded set of hosts.
+FETCH_HOST_LABEL = LabelLimiter(int(os.getenv("METRICS_MAX_HOSTS", "50")))
+FETCH_SECONDS = histogram(
+    "scraper_fetch_seconds", "Scraper HTTP fetch latency per host", ["host", "status"]
+)
+FETCH_BYTES = histogram(
+    "scraper_fetch_bytes", "Scraper response body size per host", ["host"], buckets=BYTES_BUCKETS
+)
+FETCH_BREAKER_EVENTS = counter(
+    "scraper_breaker_events", "Circuit breaker transitions and skipped fetches (opened, closed, rejected)",
+    ["host", "event"],
+)
+CACHE_REQUESTS = counter(
+    "cache_requests", "Cache lookups by cache and result (hit, miss)", ["cache", "result"]
+)
+QUEUE_DEPTH = gauge(
+    "queue_depth", "Work items currently queued or in flight", ["queue"]
+)
+API_REQUEST_SECONDS = histogram(
+    "api_request_seconds", "API request latency", ["method", "route", "status"]
+)
@@ -0,0 +1,334 @@
+"""
+Model routing - per-agent model tiers with latency-aware fallback.
+
+Every agent asks for its model through ``model_for(role)``. The role maps to
+a tier (frontier / standard / fast) and each tier to a model. When the
+observed p95 latency of a tier's model exceeds its threshold, calls fall
+back to the next faster tier until the latency recovers. Latency samples
+expire after ``sample_ttl`` seconds and every ``probe_every``-th call that
+would skip a slow model goes to it anyway, so a model that speeds up again
+gets fresh samples and is routed to again.
+
+Each call also runs under a per-role call policy: a deadline and optional
+hedging, where a duplicate request is fired once the primary has been
+outstanding longer than a latency percentile and the first answer wins.
+
+Overrides come from the MODEL_ROUTING env var, a JSON object such as
+``{"roles": {"kol": "standard"}, "tiers": {"fast": "claude-3-5-haiku-20241022"},
+"call_policies": {"kol": {"hedge": true, "timeout": 45}}}``.
+"""
+
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncGenerator, Deque, Dict, List, Optional, Tuple
+
+from google.adk.models.lite_llm import LiteLlm
+from pydantic import PrivateAttr
+
+from .deadline import current_deadline
+from .metrics import LLM_CALL_SECONDS, LLM_CALLS, LLM_RETRIES, LLM_TOKENS
+from .tracing import span
+
+TIER_ORDER = ["frontier", "standard", "fast"]
+
+DEFAULT_TIERS = {
+    "frontier": "claude-3-7-sonnet-20250219",
+    "standard": "claude-3-5-sonnet-20241022",
+    "fast": "claude-3-5-haiku-20241022",
+}
+
+DEFAULT_ROLES = {
+    "marketing_agency_pipeline": "frontier",
+    "ceo_agent": "frontier",
+    "copywriter_agent": "frontier",
+    "legal_agent": "frontier",
+    "market_research_agent": "standard",
+    "kol_panel": "standard",
+    "kol": "fast",
+    "aggregator_agent": "fast",
+    "lead_finder_agent": "standard",
+    "scope_report_agent": "standard",
+    "email_drafter_agent": "standard",
+}
+
+# Tier p95 latency (seconds) above which calls fall back to the next tier.
+DEFAULT_P95_THRESHOLDS = {"frontier": 30.0, "standard": 20.0, "fast": 15.0}
+
+# Latency samples older than this (seconds) no longer count towards p95.
+DEFAULT_SAMPLE_TTL_S = 300.0
+# While a model is over its threshold, every Nth call is still sent to it as a probe.
+DEFAULT_PROBE_EVERY = 20
+
+DEFAULT_CALL_POLICY = {
+    "timeout": 120.0,  # per-call deadline in seconds
+    "hedge": False,
+    "hedge_percentile": 0.9,  # fire the hedge after this latency percentile
+    "max_hedge_fraction": 0.1,  # cost guard: at most this share of calls hedged
+}
+
+_run_choices: contextvars.ContextVar[Optional[Dict[str, str]]] = contextvars.ContextVar(
+    "model_router_run_choices", default=None
+)
+_run_calls: contextvars.ContextVar[Optional[Dict[str, Dict[str, int]]]] = contextvars.ContextVar(
+    "model_router_run_calls", default=None
+)
+
+
+def _count_call(
+    calls: Dict[str, Dict[str, int]], role: str, hedged: bool, hedge_won: bool, timed_out: bool, failed: bool
+) -> None:
+    counts = calls.setdefault(role, {"calls": 0, "hedges": 0, "hedge_wins": 0, "timeouts": 0, "errors": 0})
+    counts["calls"] += 1
+    counts["hedges"] += int(hedged)
+    counts["hedge_wins"] += int(hedge_won)
+    counts["timeouts"] += int(timed_out)
+    counts["errors"] += int(failed)
+
+
+class ModelRouter:
+    """Resolves agent roles to models and tracks per-model latency."""
+
+    def __init__(
+        self,
+        tiers: Optional[Dict[str, str]] = None,
+        roles: Optional[Dict[str, str]] = None,
+        p95_thresholds: Optional[Dict[str, float]] = None,
+        call_policies: Optional[Dict[str, Dict[str, Any]]] = None,
+        window: int = 200,
+        min_samples: int = 20,
+        sample_ttl: float = DEFAULT_SAMPLE_TTL_S,
+        probe_every: int = DEFAULT_PROBE_EVERY,
+    ):
+        self.tiers = {**DEFAULT_TIERS, **(tiers or {})}
+        self.roles = {**DEFAULT_ROLES, **(roles or {})}
+        self.p95_thresholds = {**DEFAULT_P95_THRESHOLDS, **(p95_thresholds or {})}
+        self.window = window
+        self.min_samples = min_samples
+        self.sample_ttl = sample_ttl
+        self.probe_every = probe_every
+        self.call_policies = call_policies or {}
+        # (monotonic time, seconds) per model
+        self._latencies: Dict[str, Deque[Tuple[float, float]]] = {}
+        self._skipped: Dict[str, int] = {}
+        self._calls: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        config = json.loads(os.getenv("MODEL_ROUTING", "{}") or "{}")
+        return cls(
+            tiers=config.get("tiers"),
+            roles=config.get("roles"),
+            p95_thresholds=config.get("p95_thresholds"),
+            call_policies=config.get("call_policies"),
+            sample_ttl=config.get("sample_ttl", DEFAULT_SAMPLE_TTL_S),
+            probe_every=config.get("probe_every", DEFAULT_PROBE_EVERY),
+        )
+
+    @staticmethod
+    def _base_role(role: str) -> str:
+        # KOL personas are named kol_1..kol_N and share the "kol" role.
+        return "kol" if role.startswith("kol_") and role[4:].isdigit() else role
+
+    def tier_for(self, role: str) -> str:
+        if role not in self.roles:
+            role = self._base_role(role)
+        return self.roles.get(role, "frontier")
+
+    def policy_for(self, role: str) -> Dict[str, Any]:
+        policy = dict(DEFAULT_CALL_POLICY)
+        policy.update(self.call_policies.get(self._base_role(role), {}))
+        policy.update(self.call_policies.get(role, {}))
+        return policy
+
+    def record_latency(self, model: str, seconds: float) -> None:
+        with self._lock:
+            self._latencies.setdefault(model, deque(maxlen=self.window)).append((time.monotonic(), seconds))
+
+    def percentile(self, model: str, q: float) -> Optional[float]:
+        cutoff = time.monotonic() - self.sample_ttl
+        with self._lock:
+            samples = sorted(seconds for at, seconds in self._latencies.get(model, ()) if at >= cutoff)
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def p95(self, model: str) -> Optional[float]:
+        return self.percentile(model, 0.95)
+
+    def may_hedge(self, role: str, policy: Dict[str, Any]) -> bool:
+        # The cost guard covers the base role, so a fan-out of kol_1..kol_N shares one allowance.
+        base = self._base_role(role)
+        with self._lock:
+            matching = [counts for name, counts in self._calls.items() if self._base_role(name) == base]
+        calls = sum(counts["calls"] for counts in matching)
+        hedges = sum(counts["hedges"] for counts in matching)
+        return hedges < policy["max_hedge_fraction"] * (calls + 1)
+
+    def record_call(
+        self, role: str, hedged: bool = False, hedge_won: bool = False, timed_out: bool = False, failed: bool = False
+    ) -> None:
+        outcome = "timeout" if timed_out else "error" if failed else "ok"
+        LLM_CALLS.labels(role=role, outcome=outcome, hedged=str(hedged).lower()).inc()
+        if hedged:
+            LLM_RETRIES.labels(role=role).inc()
+        run_calls = _run_calls.get()
+        with self._lock:
+            _count_call(self._calls, role, hedged, hedge_won, timed_out, failed)
+            if run_calls is not None:
+                _count_call(run_calls, role, hedged, hedge_won, timed_out, failed)
+
+    def call_stats(self) -> Dict[str, Dict[str, int]]:
+        """Call counts per role since the process started."""
+        with self._lock:
+            return {role: dict(counts) for role, counts in self._calls.items()}
+
+    def choose(self, role: str) -> str:
+        """Model for the next call by ``role``, skipping tiers that are too slow."""
+        tier = self.tier_for(role)
+        candidates = TIER_ORDER[TIER_ORDER.index(tier):] if tier in TIER_ORDER else [tier]
+        model = DEFAULT_TIERS["frontier"]
+        for candidate in candidates:
+            model = self.tiers.get(candidate, model)
+            p95 = self.p95(model)
+            if p95 is None or p95 <= self.p95_thresholds.get(candidate, float("inf")) or self._probe_due(model):
+                break
+        choices = _run_choices.get()
+        if choices is not None:
+            choices[role] = model
+        return model
+
+    def _probe_due(self, model: str) -> bool:
+        # Without the occasional call, a slow model never gets new samples to recover with.
+        with self._lock:
+            skipped = self._skipped[model] = self._skipped.get(model, 0) + 1
+        return skipped % self.probe_every == 0
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            models = list(self._latencies)
+        return {m: {"samples": len(self._latencies[m]), "p95": self.p95(m)} for m in models}
+
+
+router = ModelRouter.from_env()
+
+
+def start_run_recording() -> Dict[str, str]:
+    """Collect the models chosen per agent for the current run (context-local)."""
+    choices: Dict[str, str] = {}
+    _run_choices.set(choices)
+    _run_calls.set({})
+    return choices
+
+
+def run_call_stats() -> Dict[str, Dict[str, int]]:
+    """Call counts per role for the current run (since ``start_run_recording``)."""
+    calls = _run_calls.get() or {}
+    with router._lock:
+        return {role: dict(counts) for role, counts in calls.items()}
+
+
+class RoutedLiteLlm(LiteLlm):
+    """LiteLlm whose model is picked by the router on every call."""
+
+    _role: str = PrivateAttr(default="")
+
+    def __init__(self, role: str, **kwargs: Any) -> None:
+        super().__init__(model=router.tiers.get(router.tier_for(role), DEFAULT_TIERS["frontier"]), **kwargs)
+        self._role = role
+
+    async def generate_content_async(self, llm_request: Any, stream: bool = False) -> AsyncGenerator[Any, None]:
+        model = router.choose(self._role)
+        llm_request.model = model
+        if stream:
+            started = time.perf_counter()
+            with span(f"llm {self._role}", role=self._role, model=model, stream=True):
+                try:
+                    async for response in super().generate_content_async(llm_request, stream=True):
+                        yield response
+                finally:
+                    self._observe(model, time.perf_counter() - started, [])
+            return
+        for response in await self._call_with_policy(llm_request, model):
+            yield response
+
+    async def _attempt(self, llm_request: Any, model: str, hedge: bool = False) -> List[Any]:
+        with span(f"llm {self._role}", role=self._role, model=model, hedge=hedge) as s:
+            started = time.perf_counter()
+            try:
+                responses = [r async for r in LiteLlm.generate_content_async(self, llm_request, stream=False)]
+            except asyncio.CancelledError:
+                # Cancelled at the call deadline or after losing a hedge race: the call
+                # took at least this long, and dropping it would bias p95 low.
+                self._observe(model, time.perf_counter() - started, [])
+                raise
+            prompt, completion = self._observe(model, time.perf_counter() - started, responses)
+            s.set("tokens.prompt", prompt)
+            s.set("tokens.completion", completion)
+            return responses
+
+    def _observe(self, model: str, seconds: float, responses: List[Any]) -> Tuple[int, int]:
+        """Record latency and token metrics; returns (prompt, completion) tokens."""
+        router.record_latency(model, seconds)
+        LLM_CALL_SECONDS.labels(role=self._role, model=model).observe(seconds)
+        prompt = completion = 0
+        for response in responses:
+            usage = getattr(response, "usage_metadata", None)
+            if usage is not None:
+                prompt += usage.prompt_token_count or 0
+                completion += usage.candidates_token_count or 0
+                LLM_TOKENS.labels(role=self._role, kind="prompt").observe(usage.prompt_token_count or 0)
+                LLM_TOKENS.labels(role=self._role, kind="completion").observe(usage.candidates_token_count or 0)
+        return prompt, completion
+
+    async def _call_with_policy(self, llm_request: Any, model: str) -> List[Any]:
+        """Run one model call under the role's deadline, hedging stragglers if enabled."""
+        policy = router.policy_for(self._role)
+        loop = asyncio.get_running_loop()
+        timeout = min(policy["timeout"], current_deadline().remaining())
+        deadline = loop.time() + timeout
+        # The model layer appends to request contents, so each attempt gets its own list.
+        hedge_request = llm_request.model_copy(update={"contents": list(llm_request.contents)})
+        primary = asyncio.ensure_future(self._attempt(llm_request, model))
+        pending = {primary}
+        hedge = None
+        error: Optional[BaseException] = None
+        try:
+            delay = router.percentile(model, policy["hedge_percentile"]) if policy["hedge"] else None
+            if delay is not None and delay < timeout and router.may_hedge(self._role, policy):
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done:
+                    hedge = asyncio.ensure_future(self._attempt(hedge_request, model, hedge=True))
+                    pending.add(hedge)
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                # Retrieve every finished attempt's exception, even past the winner.
+                outcomes = {task: task.exception() for task in done}
+                for task, exception in outcomes.items():
+                    if exception is None:
+                        router.record_call(self._role, hedged=hedge is not None, hedge_won=task is hedge)
+                        return task.result()
+                    error = exception
+        finally:
+            for task in pending:
+                task.cancel()
+            # Wait for the losers to unwind, so their errors are retrieved and
+            # their spans and metrics finish before this call returns.
+            await asyncio.gather(*pending, return_exceptions=True)
+        if error is not None and not pending:
+            router.record_call(self._role, hedged=hedge is not None, failed=True)
+            raise error
+        router.record_call(self._role, hedged=hedge is not None, timed_out=True)
+        raise TimeoutError(f"{self._role} model call exceeded its {timeout:.1f}s deadline")
+
+
+def model_for(role: str) -> RoutedLiteLlm:
+    return RoutedLiteLlm(role=role)
@@ -0,0 +1,241 @@
+"""
+On-demand profiling for single requests and audit batches.
+
+    with profile("rfp-1234") as profiler:
+        ...
+        mark("kol_feedback:end")
+    save_profile(profiler)
+
+While a profile is active, a background thread samples the Python stack of
+the thread that opened it (every PROFILE_INTERVAL_MS, default 5 ms) and
+tracemalloc records allocations. ``mark()`` - called at every pipeline
+stage boundary - snapshots traced memory and the allocation sites that
+grew the most since the previous mark.
+
+The samples export in speedscope's format (open the file at
+https://www.speedscope.app, or any speedscope-compatible flamegraph viewer).
+
+Profiling is opt-in: set PROFILE=1 to profile every /api/rfp request and
+audit batch, or send ``X-Profile: 1`` with a single /api/rfp request.
+Profiles of audit batches are written to ``$ARTIFACT_DIR/profiles``.
+
+Stack sampling costs little; tracemalloc slows allocation-heavy code
+roughly 2x and each mark takes a snapshot of the traced heap. Set
+PROFILE_MEMORY=0 for CPU-only profiles with near-native timings.
+"""
+
+import contextvars
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_INTERVAL_MS = 5.0
+TOP_ALLOCATIONS = 10
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+_active: contextvars.ContextVar[Optional["Profiler"]] = contextvars.ContextVar("profiler", default=None)
+
+# tracemalloc is process-wide; it runs while at least one profile needs it.
+_tracemalloc_users = 0
+_tracemalloc_lock = threading.Lock()
+
+
+def _truthy(value: Optional[str]) -> bool:
+    return (value or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def requested(header: Optional[str] = None) -> bool:
+    """Whether to profile: PROFILE env flag, or a truthy ``X-Profile`` header value."""
+    return _truthy(os.getenv("PROFILE")) or _truthy(header)
+
+
+def _start_tracemalloc() -> None:
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc() -> None:
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+class Profiler:
+    """Stack sampler for one thread plus tracemalloc snapshots at marks."""
+
+    def __init__(self, name: str, interval_ms: Optional[float] = None, memory: Optional[bool] = None):
+        self.name = name
+        self.interval = (interval_ms or float(os.getenv("PROFILE_INTERVAL_MS", DEFAULT_INTERVAL_MS))) / 1000
+        self.memory = memory if memory is not None else os.getenv("PROFILE_MEMORY", "1") == "1"
+        self.frames: List[Dict[str, Any]] = []
+        self._frame_index: Dict[Tuple[str, str, int], int] = {}
+        self.samples: List[List[int]] = []
+        self.weights: List[float] = []
+        self.marks: List[Dict[str, Any]] = []
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._thread_id = 0
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self.started = 0.0
+        self.elapsed = 0.0
+
+    def start(self) -> None:
+        self._thread_id = threading.get_ident()
+        if self.memory:
+            _start_tracemalloc()
+            self._snapshot = self._take_snapshot()
+        self.started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._run, name=f"profiler-{self.name}", daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self.elapsed = time.perf_counter() - self.started
+        if self.memory:
+            self.mark("end")
+            self._snapshot = None
+            _stop_tracemalloc()
+
+    def _frame_id(self, frame: Any) -> int:
+        code = frame.f_code
+        key = (code.co_qualname, code.co_filename, code.co_firstlineno)
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self.frames)
+            self.frames.append({"name": key[0], "file": key[1], "line": key[2]})
+        return index
+
+    def _run(self) -> None:
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                last = now
+                continue
+            stack: List[int] = []
+            while frame is not None:
+                stack.append(self._frame_id(frame))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+            self.weights.append(now - last)
+            last = now
+
+    @staticmethod
+    def _take_snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+
+    def mark(self, label: str) -> None:
+        """Record traced memory and the top allocation growth since the previous mark."""
+        if not self.memory or not tracemalloc.is_tracing():
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        snapshot = self._take_snapshot()
+        growth = []
+        if self._snapshot is not None:
+            for stat in snapshot.compare_to(self._snapshot, "lineno")[:TOP_ALLOCATIONS]:
+                frame = stat.traceback[0]
+                growth.append({
+                    "site": f"{frame.filename}:{frame.lineno}",
+                    "size_diff_kb": round(stat.size_diff / 1024, 1),
+                    "count_diff": stat.count_diff,
+                })
+        self._snapshot = snapshot
+        self.marks.append({
+            "label": label,
+            "at_s": round(time.perf_counter() - self.started, 4),
+            "traced_kb": round(current / 1024, 1),
+            "peak_since_last_kb": round(peak / 1024, 1),
+            "top_growth": growth,
+        })
+
+    def speedscope(self) -> Dict[str, Any]:
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": self.name,
+            "exporter": "agents.profiling",
+            "shared": {"frames": self.frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": self.name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": round(sum(self.weights), 6),
+                "samples": self.samples,
+                "weights": [round(w, 6) for w in self.weights],
+            }],
+        }
+
+    def memory_report(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "elapsed_s": round(self.elapsed, 4),
+            "samples": len(self.samples),
+            "interval_ms": self.interval * 1000,
+            "marks": self.marks,
+        }
+
+
+@contextmanager
+def profile(name: str, enabled: bool = True) -> Iterator[Optional[Profiler]]:
+    """Profile the block; yields None when disabled or already inside a profile."""
+    if not enabled or _active.get() is not None:
+        yield None
+        return
+    profiler = Profiler(name)
+    token = _active.set(profiler)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        _active.reset(token)
+
+
+def mark(label: str) -> None:
+    """Snapshot memory in the active profile, if any."""
+    profiler = _active.get()
+    if profiler is not None:
+        profiler.mark(label)
+
+
+def profile_dir() -> str:
+    root = os.getenv("ARTIFACT_DIR", os.path.join(os.getenv("TMPDIR", "/tmp"), "artifacts"))
+    return os.path.join(root, "profiles")
+
+
+def save_profile(profiler: Profiler, directory: Optional[str] = None) -> Dict[str, str]:
+    """Write ``<name>.speedscope.json`` and ``<name>.memory.json``; returns their paths."""
+    directory = directory or profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    stem = re.sub(r"[^A-Za-z0-9_.-]+", "_", profiler.name)
+    paths = {
+        "speedscope": os.path.join(directory, f"{stem}.speedscope.json"),
+        "memory": os.path.join(directory, f"{stem}.memory.json"),
+    }
+    for kind, document in (("speedscope", profiler.speedscope()), ("memory", profiler.memory_report())):
+        tmp_path = paths[kind] + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(document, f)
+        os.replace(tmp_path, paths[kind])
+    print(f"[profile] {profiler.name}: {len(profiler.samples)} samples -> {paths['speedscope']}")
+    return paths
@@ -0,0 +1,320 @@
+"""
+Continuous monitoring of a watchlist with change-aware re-crawls.
+
+    monitor = RecrawlMonitor(budget_per_hour=600)
+    monitor.watch(["https://a-bio.com", "https://b-pharma.com"])
+    monitor.run_forever()
+
+Every fetch stores a hash of the page's extracted text (or, for a company
+home page, of its product links). From each URL's history - checks made,
+changes seen, time observed - the monitor estimates a Poisson change rate
+``lambda`` (Cho & Garcia-Molina's estimator for change detected only at check
+time), so the chance the page changed since its last fetch is
+``1 - exp(-lambda * age)``.
+
+Each round (RECRAWL_ROUND_S, default 300 s) the monitor spends its share of
+RECRAWL_BUDGET_PER_HOUR fetches on the URLs most likely to have changed,
+then runs them through the polite ``CrawlScheduler``; newly watched sites
+are crawled from the same budget. Pages that change often are checked
+often, static pages wait until they have likely changed, and nothing waits
+longer than RECRAWL_MAX_INTERVAL_S (default 7 days). Only pages whose
+content changed are re-audited.
+
+A URL whose re-fetch fails (removed page, site down) is retried with
+exponential backoff from RECRAWL_MIN_INTERVAL_S, and after
+RECRAWL_MAX_FAILURES (default 5) consecutive failures it is no longer
+selected; a successful fetch (e.g. re-watching the site) resets it.
+
+    python -m agents.recrawl https://a-bio.com https://b-pharma.com --budget 600
+"""
+
+import argparse
+import hashlib
+import heapq
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .audit_store import record_audit
+from .crawler import DISCOVER_PRIORITY, PAGE_PRIORITY, CrawlScheduler, Frontier, NewTask
+from .metrics import counter
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS page_changes (
+    url TEXT PRIMARY KEY,
+    company_url TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    checks INTEGER NOT NULL DEFAULT 0,
+    changes INTEGER NOT NULL DEFAULT 0,
+    observed_s REAL NOT NULL DEFAULT 0,
+    last_fetched_at REAL NOT NULL,
+    last_changed_at REAL NOT NULL,
+    failures INTEGER NOT NULL DEFAULT 0,
+    last_failed_at REAL
+);
+"""
+
+# Columns added after the first release, for databases created before them.
+MIGRATIONS = {"failures": "INTEGER NOT NULL DEFAULT 0", "last_failed_at": "REAL"}
+
+RECRAWL_CHECKS = counter(
+    "recrawl_checks", "Monitor re-fetches by outcome (new, changed, unchanged, failed)", ["result"]
+)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def change_rate(checks: int, changes: int, observed_s: float, prior_interval: float) -> float:
+    """Estimated changes per second from ``checks`` re-fetches that found ``changes`` changes."""
+    if checks <= 0 or observed_s <= 0:
+        return 1.0 / prior_interval
+    # Unbiased for checks that only see whether a page changed, not how often.
+    estimate = -math.log((checks - changes + 0.5) / (checks + 0.5)) / (observed_s / checks)
+    # The estimate is exactly 0 until a change is seen; one prior change over one
+    # prior interval keeps quiet pages ranked, fading as their history grows.
+    return max(estimate, (changes + 1.0) / (observed_s + prior_interval))
+
+
+class ChangeHistory:
+    """Per-URL content hashes and change counts, stored next to the crawl frontier."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv(
+            "CRAWL_DB", os.path.join(os.getenv("TMPDIR", "/tmp"), "crawl_frontier.sqlite3")
+        )
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(page_changes)")}
+            for column, ddl in MIGRATIONS.items():
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE page_changes ADD COLUMN {column} {ddl}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def observe(self, task: Dict[str, Any], digest: str, now: Optional[float] = None) -> str:
+        """Record a fetch; returns "new", "changed" or "unchanged"."""
+        now = now or time.time()
+        url = task["url"]
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT content_hash, last_fetched_at FROM page_changes WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO page_changes (url, company_url, kind, content_hash, last_fetched_at, last_changed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (url, task["company_url"], task["kind"], digest, now, now),
+                )
+                return "new"
+            changed = digest != row["content_hash"]
+            conn.execute(
+                "UPDATE page_changes SET content_hash = ?, checks = checks + 1, changes = changes + ?, "
+                "observed_s = observed_s + ?, last_fetched_at = ?, failures = 0, last_failed_at = NULL, "
+                "last_changed_at = CASE WHEN ? THEN ? ELSE last_changed_at END WHERE url = ?",
+                (digest, int(changed), max(0.0, now - row["last_fetched_at"]), now, changed, now, url),
+            )
+        return "changed" if changed else "unchanged"
+
+    def fail(self, task: Dict[str, Any], now: Optional[float] = None) -> int:
+        """Record a failed re-fetch; returns the URL's consecutive failures (0 if it was never fetched).
+
+        ``last_fetched_at`` is left alone so the change-rate estimate only
+        covers intervals between successful fetches.
+        """
+        now = now or time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE page_changes SET failures = failures + 1, last_failed_at = ? WHERE url = ?",
+                (now, task["url"]),
+            )
+            row = conn.execute("SELECT failures FROM page_changes WHERE url = ?", (task["url"],)).fetchone()
+        return row["failures"] if row else 0
+
+    def rows(self) -> List[sqlite3.Row]:
+        return self._connect().execute(
+            "SELECT url, kind, checks, changes, observed_s, last_fetched_at, failures, last_failed_at "
+            "FROM page_changes"
+        ).fetchall()
+
+
+class RecrawlMonitor:
+    """Re-crawls watched sites within a fetch budget, most-likely-changed pages first."""
+
+    def __init__(
+        self,
+        frontier: Optional[Frontier] = None,
+        history: Optional[ChangeHistory] = None,
+        budget_per_hour: Optional[float] = None,
+        round_s: Optional[float] = None,
+        min_interval: Optional[float] = None,
+        max_interval: Optional[float] = None,
+        prior_interval: Optional[float] = None,
+        max_failures: Optional[int] = None,
+        workers: Optional[int] = None,
+    ):
+        self.frontier = frontier or Frontier()
+        self.history = history or ChangeHistory(self.frontier.path)
+        self.budget_per_hour = budget_per_hour or float(os.getenv("RECRAWL_BUDGET_PER_HOUR", "600"))
+        self.round_s = round_s or float(os.getenv("RECRAWL_ROUND_S", "300"))
+        self.min_interval = min_interval or float(os.getenv("RECRAWL_MIN_INTERVAL_S", "900"))
+        self.max_interval = max_interval or float(os.getenv("RECRAWL_MAX_INTERVAL_S", str(7 * 86400)))
+        # Assumed change interval for URLs without history.
+        self.prior_interval = prior_interval or float(os.getenv("RECRAWL_PRIOR_INTERVAL_S", "86400"))
+        # Consecutive failed re-fetches after which a URL is no longer selected.
+        self.max_failures = max_failures or int(os.getenv("RECRAWL_MAX_FAILURES", "5"))
+        self.scheduler = CrawlScheduler(self.frontier, workers=workers, handler=self.handle)
+        self._tokens = self.budget_per_hour * self.round_s / 3600
+        self._refilled_at = time.monotonic()
+
+    def watch(self, company_urls: Iterable[str]) -> int:
+        return self.scheduler.add_companies(company_urls)
+
+    # -----------------------------
+    # Fetch handler
+    # -----------------------------
+
+    def handle(self, task: Dict[str, Any]) -> List[NewTask]:
+        try:
+            return self._check(task)
+        except Exception:
+            failures = self.history.fail(task)
+            RECRAWL_CHECKS.labels(result="failed").inc()
+            if failures >= self.max_failures:
+                print(f"[recrawl] {task['url']} failed {failures} times in a row; no longer re-crawled")
+            raise
+
+    def _check(self, task: Dict[str, Any]) -> List[NewTask]:
+        from .chief_marketing_agent.sub_agents.lead_finder_agent.agent import (
+            check_fda_compliance,
+            find_drug_product_pages,
+            scrape_webpage,
+        )
+
+        if task["kind"] == "discover":
+            links = find_drug_product_pages(task["url"], strict=True)
+            result = self.history.observe(task, content_hash("\n".join(sorted(links))))
+            RECRAWL_CHECKS.labels(result=result).inc()
+            # Already-known pages are ignored by the frontier; only new product pages are added.
+            return [("page", link, PAGE_PRIORITY + i / 1000) for i, link in enumerate(links)]
+        content = scrape_webpage(task["url"])
+        if not content:
+            raise RuntimeError("page could not be scraped")
+        result = self.history.observe(task, content_hash(content.get("content") or ""))
+        RECRAWL_CHECKS.labels(result=result).inc()
+        if result != "unchanged":
+            record_audit(task["company_url"], [check_fda_compliance(content)])
+        return []
+
+    # -----------------------------
+    # Scheduling
+    # -----------------------------
+
+    def _last_attempt(self, row: Any) -> float:
+        return max(row["last_fetched_at"], row["last_failed_at"] or 0.0)
+
+    def retry_interval(self, row: Any) -> float:
+        """Minimum time between attempts: ``min_interval``, doubled per consecutive failure."""
+        return min(self.max_interval, self.min_interval * 2 ** row["failures"])
+
+    def score(self, row: Any, now: float) -> float:
+        """Probability the URL changed since its last fetch (above 1 once overdue).
+
+        Age counts from the last attempt, so a failing URL doesn't grow more
+        overdue (and crowd out live pages) with every failed round.
+        """
+        age = now - self._last_attempt(row)
+        if age < self.min_interval:
+            return 0.0
+        if age >= self.max_interval:
+            return 1.0 + age / self.max_interval
+        rate = change_rate(row["checks"], row["changes"], row["observed_s"], self.prior_interval)
+        return 1.0 - math.exp(-rate * age)
+
+    def select(self, limit: int, now: Optional[float] = None) -> List[Tuple[str, str, float]]:
+        """(url, kind, score) of the ``limit`` URLs most likely to have changed.
+
+        Every URL past ``min_interval`` is eligible, so budget the likely
+        changes don't need goes to the longest-unchecked pages. Failing URLs
+        wait out their backoff, and ones at ``max_failures`` are skipped.
+        """
+        now = now or time.time()
+        eligible = (
+            (row["url"], row["kind"], self.score(row, now), now - self._last_attempt(row))
+            for row in self.history.rows()
+            if row["failures"] < self.max_failures and now - self._last_attempt(row) >= self.retry_interval(row)
+        )
+        chosen = heapq.nlargest(limit, eligible, key=lambda item: (item[2], item[3]))
+        return [(url, kind, score) for url, kind, score, _ in chosen]
+
+    def _refill(self) -> int:
+        now = time.monotonic()
+        cap = self.budget_per_hour * self.round_s / 3600
+        self._tokens = min(cap, self._tokens + self.budget_per_hour * (now - self._refilled_at) / 3600)
+        self._refilled_at = now
+        return int(self._tokens)
+
+    def run_round(self) -> Dict[str, Any]:
+        """Re-queue this round's share of the budget and crawl it (plus any new pages found)."""
+        budget = self._refill()
+        if budget < 1:
+            return {"requests": 0, "selected": 0}
+        chosen = self.select(budget)
+        # Within a host, discovery pages lead, then the pages most likely to have changed.
+        self.frontier.requeue({
+            url: (DISCOVER_PRIORITY if kind == "discover" else PAGE_PRIORITY) - min(score, 2.0) / 10
+            for url, kind, score in chosen
+        })
+        # Tasks still queued from earlier rounds (e.g. newly watched sites) share the same budget.
+        stats = self.scheduler.run(max_tasks=budget)
+        self._tokens -= stats["requests"]
+        stats["selected"] = len(chosen)
+        if chosen:
+            stats["score_range"] = [round(chosen[-1][2], 3), round(chosen[0][2], 3)]
+        print(f"[recrawl] Round: budget {budget}, selected {len(chosen)}, fetched {stats['requests']}")
+        return stats
+
+    def run_forever(self) -> None:
+        while True:
+            started = time.monotonic()
+            self.run_round()
+            time.sleep(max(0.0, self.round_s - (time.monotonic() - started)))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Continuously monitor a watchlist with change-aware re-crawls")
+    parser.add_argument("company_urls", nargs="*", help="company websites to add to the watchlist")
+    parser.add_argument("--budget", type=float, help="fetches per hour (default RECRAWL_BUDGET_PER_HOUR or 600)")
+    parser.add_argument("--round", dest="round_s", type=float, help="seconds per scheduling round")
+    parser.add_argument("--workers", type=int, help="crawl worker threads")
+    parser.add_argument("--db", help="frontier and history database (default CRAWL_DB)")
+    parser.add_argument("--once", action="store_true", help="run a single re-crawl round and exit")
+    args = parser.parse_args(argv)
+
+    monitor = RecrawlMonitor(Frontier(args.db), budget_per_hour=args.budget, round_s=args.round_s, workers=args.workers)
+    if args.company_urls:
+        print(f"[recrawl] Watching {monitor.watch(args.company_urls)} new company site(s)")
+    if args.once:
+        monitor.run_round()
+    else:
+        monitor.run_forever()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
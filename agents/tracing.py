@@ -0,0 +1,259 @@
+"""
+Lightweight tracing - nested spans for requests, stages, agents, model calls and fetches.
+
+    with span("stage", stage="kol_feedback") as s:
+        ...
+        s.set("kols", 10)
+
+The active span lives in a context variable, so spans opened in asyncio
+tasks and threadpool calls nest under the span that was active when the
+work was scheduled (the same way the request deadline propagates). When
+a trace's local root span ends, its spans are exported together.
+
+Tracing is off unless an exporter is configured:
+
+- TRACE_FILE: append spans as JSON lines to this file
+- OTEL_EXPORTER_OTLP_ENDPOINT: POST spans as OTLP/HTTP JSON to
+  ``<endpoint>/v1/traces`` (e.g. a local OpenTelemetry collector or Jaeger)
+
+With tracing off, ``span()`` yields a shared no-op span.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+
+SERVICE_NAME = "sundai-api"
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "status")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.status = "ok"
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    trace_id = span_id = parent_id = None
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+# (trace_id, span_id) of the active span, or of a remote parent from a traceparent header.
+_current: contextvars.ContextVar[Optional[tuple]] = contextvars.ContextVar("trace_span", default=None)
+
+
+# -----------------------------
+# Exporters
+# -----------------------------
+
+class FileExporter:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]) -> None:
+        lines = "".join(json.dumps(s.to_dict(), default=str) + "\n" for s in spans)
+        with self._lock, open(self.path, "a") as f:
+            f.write(lines)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpHttpExporter:
+    """Sends batches to an OTLP/HTTP collector from a background thread."""
+
+    def __init__(self, endpoint: str):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self._queue: "queue.Queue[List[Span]]" = queue.Queue(maxsize=1000)
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def export(self, spans: List[Span]) -> None:
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            pass  # drop rather than block the request path
+
+    def _worker(self) -> None:
+        while True:
+            spans = self._queue.get()
+            try:
+                requests.post(self.url, json=self._payload(spans), timeout=5)
+            except requests.exceptions.RequestException as e:
+                print(f"[tracing] export to {self.url} failed: {e}")
+
+    @staticmethod
+    def _payload(spans: List[Span]) -> Dict[str, Any]:
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{
+                "scope": {"name": "agents.tracing"},
+                "spans": [{
+                    "traceId": s.trace_id,
+                    "spanId": s.span_id,
+                    "parentSpanId": s.parent_id or "",
+                    "name": s.name,
+                    "kind": 1,
+                    "startTimeUnixNano": str(s.start_ns),
+                    "endTimeUnixNano": str(s.end_ns),
+                    "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+                    "status": {"code": 2 if s.status == "error" else 1},
+                } for s in spans],
+            }],
+        }]}
+
+
+def _exporters_from_env() -> List[Any]:
+    exporters: List[Any] = []
+    if os.getenv("TRACE_FILE"):
+        exporters.append(FileExporter(os.environ["TRACE_FILE"]))
+    if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        exporters.append(OtlpHttpExporter(os.environ["OTEL_EXPORTER_OTLP_ENDPOINT"]))
+    return exporters
+
+
+_exporters = _exporters_from_env()
+_pending: Dict[str, List[Span]] = {}
+_open_roots: Dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return bool(_exporters)
+
+
+def set_exporters(exporters: List[Any]) -> None:
+    global _exporters
+    _exporters = list(exporters)
+
+
+def _finish(span: Span, local_root: bool) -> None:
+    batch: Optional[List[Span]] = None
+    with _lock:
+        if span.trace_id in _open_roots:
+            _pending.setdefault(span.trace_id, []).append(span)
+            if local_root:
+                _open_roots[span.trace_id] -= 1
+                if not _open_roots[span.trace_id]:
+                    del _open_roots[span.trace_id]
+                    batch = _pending.pop(span.trace_id)
+        else:
+            batch = [span]  # finished after its root was exported (e.g. a cancelled hedge)
+    if batch:
+        for exporter in _exporters:
+            exporter.export(batch)
+
+
+# -----------------------------
+# API
+# -----------------------------
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """Open a child of the active span (or a new trace) for the duration of the block."""
+    if not _exporters:
+        yield NOOP_SPAN
+        return
+    parent = _current.get()
+    local_root = parent is None or parent[2]
+    trace_id = parent[0] if parent else secrets.token_hex(16)
+    current = Span(name, trace_id, parent[1] if parent else None, attributes)
+    if local_root:
+        with _lock:
+            _open_roots[trace_id] = _open_roots.get(trace_id, 0) + 1
+    token = _current.set((trace_id, current.span_id, False))
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.attributes["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current.reset(token)
+        _finish(current, local_root)
+
+
+@contextmanager
+def continue_trace(traceparent: Optional[str]) -> Iterator[None]:
+    """Make spans opened in the block children of a W3C ``traceparent`` header, if valid."""
+    match = _TRACEPARENT_RE.match((traceparent or "").strip().lower())
+    if not match:
+        yield
+        return
+    token = _current.set((match.group(1), match.group(2), True))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def current_trace_id() -> Optional[str]:
+    active = _current.get()
+    return active[0] if active else None
+
+
+def traceparent() -> Optional[str]:
+    """W3C traceparent for the active span, for outgoing requests or responses."""
+    active = _current.get()
+    return f"00-{active[0]}-{active[1]}-01" if active else None
+
+
+def install_log_correlation() -> None:
+    """Add ``trace_id`` to every logging record so formats can include %(trace_id)s."""
+    factory = logging.getLogRecordFactory()
+    if getattr(factory, "_adds_trace_id", False):
+        return
+
+    def record_factory(*args: Any, **kwargs: Any) -> logging.LogRecord:
+        record = factory(*args, **kwargs)
+        record.trace_id = current_trace_id() or "-"
+        return record
+
+    record_factory._adds_trace_id = True
+    logging.setLogRecordFactory(record_factory)
@@ -0,0 +1,206 @@
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Union
+
+_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+CHUNK_SIZE = 64 * 1024
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _remove(path: str) -> None:
+    # Another process may have evicted it first.
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class ArtifactStore:
+    """Content-addressed artifact storage with per-run ids.
+
+    Blobs live under ``blobs/<sha[:2]>/<sha>`` (``.gz`` when compressed) and
+    are shared by identical outputs; each artifact id maps to a small JSON
+    record under ``refs/``. All writes are atomic renames, so concurrent
+    requests never see partial files. When the store grows past
+    ``max_bytes`` the least recently created artifacts are evicted; the
+    check scans every ref, so ``put`` runs it at most once per
+    ``retention_interval`` seconds.
+
+    ``put`` and eviction hold an exclusive lock on ``<root>/.lock``, so a
+    blob can't be evicted between ``put`` finding it and writing its ref.
+    Blobs no ref points to any more (e.g. after a ref was overwritten) are
+    removed on every retention pass. Readers should ``open_blob`` once and
+    stream from that handle, which stays readable if the blob is evicted.
+    """
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        compress: Optional[bool] = None,
+        retention_interval: Optional[float] = None,
+    ):
+        self.root = root or os.getenv("ARTIFACT_DIR", os.path.join(os.getenv("TMPDIR", "/tmp"), "artifacts"))
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("ARTIFACT_MAX_BYTES", 256 * 1024 * 1024))
+        self.compress = compress if compress is not None else os.getenv("ARTIFACT_GZIP", "1") == "1"
+        self.retention_interval = (
+            retention_interval if retention_interval is not None
+            else float(os.getenv("ARTIFACT_RETENTION_INTERVAL_S", "60"))
+        )
+        self._lock = threading.Lock()
+        self._retention_due = 0.0
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        # The thread lock serializes this process; the flock serializes processes.
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock, open(os.path.join(self.root, ".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    # -- paths -------------------------------------------------------------
+
+    def _ref_path(self, artifact_id: str) -> str:
+        if not _ID_RE.match(artifact_id):
+            raise ValueError(f"Invalid artifact id: {artifact_id!r}")
+        return os.path.join(self.root, "refs", f"{artifact_id}.json")
+
+    def blob_path(self, record: Dict[str, Any]) -> str:
+        sha = record["sha256"]
+        suffix = ".gz" if record.get("compressed") else ""
+        return os.path.join(self.root, "blobs", sha[:2], sha + suffix)
+
+    # -- API ---------------------------------------------------------------
+
+    def put(
+        self,
+        content: Union[str, bytes],
+        filename: str,
+        content_type: str = "application/octet-stream",
+        artifact_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        data = content.encode("utf-8") if isinstance(content, str) else content
+        record = {
+            "id": artifact_id or uuid.uuid4().hex,
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "filename": filename,
+            "content_type": content_type,
+            "size": len(data),
+            "compressed": self.compress,
+            "created": time.time(),
+        }
+        blob = self.blob_path(record)
+        ref = self._ref_path(record["id"])
+        # mtime=0 keeps the gzip bytes deterministic for identical content.
+        payload = gzip.compress(data, mtime=0) if self.compress else data
+        with self._locked():
+            if not os.path.exists(blob):
+                _atomic_write(blob, payload)
+            _atomic_write(ref, json.dumps(record).encode("utf-8"))
+        if time.monotonic() >= self._retention_due:
+            self._retention_due = time.monotonic() + self.retention_interval
+            self.enforce_retention()
+        return record
+
+    def get(self, artifact_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._ref_path(artifact_id)) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return record if os.path.exists(self.blob_path(record)) else None
+
+    def open_blob(self, record: Dict[str, Any]) -> BinaryIO:
+        """Open the stored (possibly gzip) bytes; raises FileNotFoundError if evicted."""
+        return open(self.blob_path(record), "rb")
+
+    def iter_content(
+        self, record: Dict[str, Any], blob: Optional[BinaryIO] = None, decompress: bool = True
+    ) -> Iterator[bytes]:
+        """Artifact bytes in chunks, from ``blob`` (see ``open_blob``) if given, which is closed at the end.
+
+        With ``decompress=False`` a compressed artifact is yielded as stored.
+        """
+        blob = blob if blob is not None else self.open_blob(record)
+        try:
+            f = gzip.GzipFile(fileobj=blob) if decompress and record.get("compressed") else blob
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            blob.close()
+
+    def enforce_retention(self) -> None:
+        with self._locked():
+            refs_dir = os.path.join(self.root, "refs")
+            if not os.path.isdir(refs_dir):
+                return
+            records = []
+            for name in os.listdir(refs_dir):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(refs_dir, name)) as f:
+                        records.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+            blob_sizes: Dict[str, int] = {}
+            for record in records:
+                path = self.blob_path(record)
+                if path not in blob_sizes and os.path.exists(path):
+                    blob_sizes[path] = os.path.getsize(path)
+            self._remove_orphans(set(blob_sizes))
+            total = sum(blob_sizes.values())
+            if total <= self.max_bytes:
+                return
+            records.sort(key=lambda r: r.get("created", 0))
+            live = {}
+            for record in records:
+                live.setdefault(self.blob_path(record), []).append(record["id"])
+            for record in records:
+                if total <= self.max_bytes:
+                    break
+                _remove(self._ref_path(record["id"]))
+                path = self.blob_path(record)
+                live[path].remove(record["id"])
+                if not live[path]:
+                    _remove(path)
+                    total -= blob_sizes.get(path, 0)
+
+    def _remove_orphans(self, referenced: set) -> None:
+        # Caller holds the lock, so no put is between writing a blob and its ref.
+        blobs_dir = os.path.join(self.root, "blobs")
+        if not os.path.isdir(blobs_dir):
+            return
+        for shard in os.listdir(blobs_dir):
+            shard_dir = os.path.join(blobs_dir, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                path = os.path.join(shard_dir, name)
+                if path not in referenced and not name.endswith(".tmp"):
+                    _remove(path)
@@ -1,9 +1,17 @@
+import json
 import os
-from typing import Any, Dict
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
 
-from fastapi import FastAPI, HTTPException
+import anyio.to_thread
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, HttpUrl
+from starlette.background import BackgroundTask
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, HttpUrl
 
 import sys
 from pathlib import Path
@@ -11,7 +19,15 @@ from pathlib import Path
 # Add project root to path so we can import agents
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from agents.marketing_agency import build_marketing_pipeline, deploy_markdown
+from agents.audit_store import MAX_PAGE_SIZE, get_audit_store
+from agents.cassette import install_from_env
+from agents.deadline import Deadline, use_deadline
+from agents.metrics import API_REQUEST_SECONDS, QUEUE_DEPTH, render as render_metrics
+from agents.marketing_agency import build_marketing_pipeline, render_deployment_markdown
+from agents.marketing_agency.checkpoint import RUN_ID_PATTERN
+from agents.profiling import Profiler, profile, requested as profiling_requested
+from agents.tracing import continue_trace, current_trace_id, install_log_correlation, span
+from app.artifacts import ArtifactStore
 
 
 class RfpRequest(BaseModel):
@@ -20,9 +36,15 @@ class RfpRequest(BaseModel):
     trialsPapers: str 
     doctorTypes: str
     brief: str
+    # Reuse a previous run id to resume from its stage checkpoints (dag mode).
+    runId: Optional[str] = Field(default=None, pattern=RUN_ID_PATTERN)
+    invalidate: List[str] = []
 
 
 app = FastAPI(title="Sundai API")
+# CASSETTE_MODE=record|replay routes HTTP and model calls through a cassette file.
+install_from_env()
+artifacts = ArtifactStore()
 
 vercel_url = os.getenv("VERCEL_URL")  # e.g. my-app.vercel.app
 allowed_origin = f"https://{vercel_url}" if vercel_url else None
@@ -42,10 +64,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+in_flight = QUEUE_DEPTH.labels(queue="api_requests")
+install_log_correlation()
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = "500"
+    in_flight.inc()
+    with continue_trace(request.headers.get("traceparent")), \
+            span(f"{request.method} {request.url.path}", **{"http.method": request.method}) as request_span:
+        try:
+            response = await call_next(request)
+            status = str(response.status_code)
+            if request_span.trace_id:
+                response.headers["X-Trace-Id"] = request_span.trace_id
+                response.headers["traceparent"] = f"00-{request_span.trace_id}-{request_span.span_id}-01"
+            return response
+        finally:
+            in_flight.dec()
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            request_span.set("http.route", route)
+            request_span.set("http.status_code", int(status))
+            if request_span.trace_id:
+                request_span.name = f"{request.method} {route}"
+            API_REQUEST_SECONDS.labels(
+                method=request.method, route=route, status=status
+            ).observe(time.perf_counter() - started)
+
 
 @app.post("/api/rfp")
-def submit_rfp(payload: RfpRequest) -> Dict[str, Any]:
-    pipeline = build_marketing_pipeline()
+def submit_rfp(payload: RfpRequest, x_profile: Optional[str] = Header(default=None)) -> Dict[str, Any]:
+    # The API defaults to the stage graph: only it honours the deadline (and
+    # runId/invalidate), so only it can return partial output before Vercel's cutoff.
+    mode = os.getenv("MARKETING_PIPELINE_MODE", "dag")
+    pipeline = build_marketing_pipeline(mode)
 
     brief_text = payload.brief or (
         f"Company: {payload.companyUrl}\nDrug: {payload.drugName}\n"
@@ -59,23 +113,210 @@ def submit_rfp(payload: RfpRequest) -> Dict[str, Any]:
         "objective": "Generate HCP awareness",
     }
 
+    run_id = payload.runId or uuid.uuid4().hex
+    # Vercel stops the function at 60s; leave headroom to write the response.
+    deadline_s = float(os.getenv("RFP_DEADLINE_S", "50"))
+
+    profiler: Optional[Profiler] = None
+    profile_links: Optional[Dict[str, str]] = None
     try:
-        print("[API] Starting marketing pipeline for RFP…")
-        result = pipeline.run({
-            "inputs": inputs,
-            "pipeline": {"defaults": defaults},
-        })
+        print(f"[API] Starting marketing pipeline for RFP (run {run_id}, trace {current_trace_id() or '-'})…")
+        profiled = profile(f"rfp-{run_id}", enabled=profiling_requested(x_profile))
+        try:
+            with use_deadline(Deadline(deadline_s)), profiled as profiler:
+                result = pipeline.run({
+                    "inputs": inputs,
+                    "pipeline": {"defaults": defaults},
+                    "run_id": run_id,
+                    "invalidate": payload.invalidate,
+                    "deadline_s": deadline_s,
+                })
+        finally:
+            # Failed runs (e.g. deadline overruns) are the ones most worth
+            # profiling, so keep the profile whatever the outcome.
+            if profiler is not None:
+                profile_links = _store_profile(profiler)
         print("[API] Pipeline completed. Preparing deployment artifact…")
-        # Write to a temp file location in serverless environments
-        temp_output = os.path.join(os.getenv("TMPDIR", "/tmp"), "deploy_output.md")
-        out_path = deploy_markdown({
-            "inputs": inputs,
-            "state": result if isinstance(result, dict) else {},
-        }, output_path=temp_output)
-        return {"ok": True, "result": result, "deploy_path": out_path}
+        # A fresh artifact id per request: runId is client-chosen, so reusing
+        # it here would let any caller overwrite another run's output.
+        artifact = artifacts.put(
+            render_deployment_markdown({
+                "inputs": inputs,
+                "state": result if isinstance(result, dict) else {},
+            }),
+            filename="deploy_output.md",
+            content_type="text/markdown",
+        )
+        artifact_url = f"/api/artifacts/{artifact['id']}"
+        response = {
+            "ok": True,
+            "run_id": run_id,
+            "trace_id": current_trace_id(),
+            "result": result,
+            "artifact_id": artifact["id"],
+            "artifact_url": artifact_url,
+            "deploy_path": artifact_url,
+            "profile": profile_links,
+        }
+        if mode == "dag":
+            meta = result.get("meta", {}) if isinstance(result, dict) else {}
+            response["partial"] = bool(meta.get("partial"))
+            response["skipped_stages"] = meta.get("skipped_stages", [])
+        return response
     except Exception as e:
-        print(f"[API] Error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        print(f"[API] Error (run {run_id}, trace {current_trace_id() or '-'}): {e}")
+        headers = {"X-Run-Id": run_id}
+        if profile_links:
+            headers["X-Profile-Speedscope"] = profile_links["speedscope_url"]
+            headers["X-Profile-Memory"] = profile_links["memory_url"]
+        raise HTTPException(status_code=500, detail=str(e), headers=headers)
+
+def _store_profile(profiler: Profiler) -> Optional[Dict[str, str]]:
+    try:
+        return _put_profile(profiler)
+    except Exception as e:
+        # Never let a failed profile upload mask the run's own result or error.
+        print(f"[API] Could not store profile {profiler.name}: {e}")
+        return None
+
+
+def _put_profile(profiler: Profiler) -> Dict[str, str]:
+    flamegraph = artifacts.put(
+        json.dumps(profiler.speedscope()),
+        filename=f"{profiler.name}.speedscope.json",
+        content_type="application/json",
+    )
+    memory = artifacts.put(
+        json.dumps(profiler.memory_report()),
+        filename=f"{profiler.name}.memory.json",
+        content_type="application/json",
+    )
+    print(f"[API] Profile {profiler.name}: {len(profiler.samples)} samples")
+    return {
+        "speedscope_url": f"/api/artifacts/{flamegraph['id']}",
+        "memory_url": f"/api/artifacts/{memory['id']}",
+    }
+
+
+@app.get("/api/artifacts/{artifact_id}")
+def get_artifact(artifact_id: str, accept_encoding: str = Header(default="")):
+    try:
+        record = artifacts.get(artifact_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid artifact id")
+    if record is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    headers = {
+        "ETag": f'"{record["sha256"]}"',
+        "Content-Disposition": f'inline; filename="{record["filename"]}"',
+    }
+    try:
+        # Open now: the handle stays readable even if retention evicts the blob.
+        blob = artifacts.open_blob(record)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    if record.get("compressed"):
+        headers["Vary"] = "Accept-Encoding"
+    if not record.get("compressed") or "gzip" in accept_encoding.lower():
+        # Serve the stored bytes (gzip included) as-is.
+        if record.get("compressed"):
+            headers["Content-Encoding"] = "gzip"
+        headers["Content-Length"] = str(os.fstat(blob.fileno()).st_size)
+        content = artifacts.iter_content(record, blob, decompress=False)
+    else:
+        content = artifacts.iter_content(record, blob)
+    return StreamingResponse(content, media_type=record["content_type"], headers=headers)
+
+
+def _epoch(value: Optional[datetime]) -> Optional[float]:
+    # Naive datetimes are UTC, not the server's local time, so a query
+    # returns the same rows on every machine.
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+@app.get("/api/audits")
+def list_audits(
+    domain: Optional[str] = None,
+    url: Optional[str] = None,
+    status: Optional[str] = None,
+    risk_level: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+) -> Dict[str, Any]:
+    """Stored compliance results, newest first, e.g. ?domain=acme.com&status=NON-COMPLIANT&since=2025-01-01."""
+    page = get_audit_store().query(
+        domain=domain,
+        url=url,
+        status=status,
+        risk_level=risk_level,
+        since=_epoch(since),
+        until=_epoch(until),
+        limit=limit,
+        offset=offset,
+    )
+    for item in page["items"]:
+        item["created_at"] = datetime.fromtimestamp(item["created_at"], timezone.utc).isoformat()
+    return page
+
+
+@app.get("/api/audits/export")
+def export_audit_results(
+    format: str = "parquet",
+    domain: Optional[str] = None,
+    url: Optional[str] = None,
+    status: Optional[str] = None,
+    risk_level: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """Matching audit results as a Parquet or Arrow IPC file."""
+    from agents.audit_export import FORMATS, export_audits
+
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown export format {format!r}; expected one of {FORMATS}")
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Audit export requires pyarrow on the server")
+
+    fd, path = tempfile.mkstemp(suffix=f".{format}")
+    os.close(fd)
+    try:
+        export_audits(
+            path,
+            fmt=format,
+            domain=domain,
+            url=url,
+            status=status,
+            risk_level=risk_level,
+            since=_epoch(since),
+            until=_epoch(until),
+        )
+    except BaseException:
+        os.remove(path)
+        raise
+    media_type = "application/vnd.apache.parquet" if format == "parquet" else "application/vnd.apache.arrow.file"
+    return FileResponse(
+        path,
+        media_type=media_type,
+        filename=f"audits.{format}",
+        background=BackgroundTask(os.remove, path),
+    )
+
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """Prometheus text exposition of this process's metrics."""
+    limiter = anyio.to_thread.current_default_thread_limiter().statistics()
+    QUEUE_DEPTH.labels(queue="threadpool_busy").set(limiter.borrowed_tokens)
+    QUEUE_DEPTH.labels(queue="threadpool_waiting").set(limiter.tasks_waiting)
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 
 @app.get("/api/health")
@@ -0,0 +1,96 @@
+"""
+Benchmark corpus of pharma web pages.
+
+Pages are generated deterministically so the corpus needs no large files
+in the repo; saved real pages can be added as ``benchmarks/corpus/*.html``
+and are picked up as well. Each page has a size class:
+
+- small: a typical product page (a few KB)
+- large: a long product page with full safety information (~1 MB)
+- pathological: deeply nested markup with thousands of links
+"""
+
+import glob
+import os
+import random
+from typing import Dict
+
+BASE_URL = "https://bench.example.com"
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "corpus")
+
+_WORDS = (
+    "patients treatment therapy clinical trial efficacy dose tablet adverse reactions "
+    "hypertension oncology indication prescribing information safety results study "
+    "placebo response rate improves symptoms benefit physician label warnings"
+).split()
+
+_LINK_TEXTS = ["Products", "Pipeline", "Therapeutic areas", "Our medicines", "Clinical trials",
+               "About us", "Careers", "Investors", "News", "Contact"]
+
+
+def _paragraph(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _nav(rng: random.Random, links: int) -> str:
+    items = []
+    for i in range(links):
+        text = rng.choice(_LINK_TEXTS)
+        href = f"/{text.lower().replace(' ', '-')}/{i}" if i % 3 else f"{BASE_URL}/page/{i}"
+        items.append(f'<li><a href="{href}">{text}</a></li>')
+    return "<nav><ul>" + "".join(items) + "</ul></nav>"
+
+
+def small_page(seed: int = 1) -> str:
+    rng = random.Random(seed)
+    body = "".join(f"<p>{_paragraph(rng, 60)}</p>" for _ in range(8))
+    return (
+        "<html><head><title>Acmezol (acmezolab) tablets</title>"
+        "<script>var tracking = {};</script><style>p {margin: 0}</style></head>"
+        f"<body>{_nav(rng, 25)}<h1>Acmezol</h1>{body}"
+        "<p>Acmezol is indicated for the treatment of adults with hypertension.</p>"
+        "<p>Important Safety Information: risk of dizziness. See full Prescribing Information.</p>"
+        "</body></html>"
+    )
+
+
+def large_page(seed: int = 2) -> str:
+    rng = random.Random(seed)
+    sections = []
+    for s in range(120):
+        rows = "".join(
+            f"<tr><td>{_paragraph(rng, 4)}</td><td>{rng.randint(1, 99)}%</td></tr>" for _ in range(20)
+        )
+        sections.append(f"<section><h2>Study {s}</h2><p>{_paragraph(rng, 400)}</p><table>{rows}</table></section>")
+    return (
+        "<html><head><title>Acmezol full product information</title></head>"
+        f"<body>{_nav(rng, 200)}{''.join(sections)}"
+        "<p>This medicine is a cure with no side effects, guaranteed.</p></body></html>"
+    )
+
+
+def pathological_page(seed: int = 3) -> str:
+    rng = random.Random(seed)
+    depth = 400
+    nested = "<div>" * depth + f"<p>{_paragraph(rng, 50)}</p>" + "</div>" * depth
+    unclosed = "".join(f"<span><b>{rng.choice(_WORDS)}" for _ in range(2000))
+    return (
+        "<html><head><title>Pipeline</title></head>"
+        f"<body>{_nav(rng, 5000)}{nested}{unclosed}</body></html>"
+    )
+
+
+def load_corpus() -> Dict[str, Dict[str, str]]:
+    """Pages by name: {"url", "size_class", "html"}."""
+    pages = {
+        "small": {"size_class": "small", "html": small_page()},
+        "large": {"size_class": "large", "html": large_page()},
+        "pathological": {"size_class": "pathological", "html": pathological_page()},
+    }
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, "*.html"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, encoding="utf-8", errors="replace") as f:
+            pages[f"saved_{name}"] = {"size_class": "saved", "html": f.read()}
+    for name, page in pages.items():
+        page["url"] = f"{BASE_URL}/{name}"
+    return pages
@@ -0,0 +1,233 @@
+"""
+Load test for POST /api/rfp.
+
+Starts a stub model server (see stub_llm.py) and the FastAPI app in this
+process, points the model router at the stub, then drives /api/rfp at a
+fixed concurrency and reports throughput, latency percentiles, error
+rates and how saturated the app's sync-handler threadpool was.
+
+    python -m benchmarks.loadtest --concurrency 16 --requests 64 --latency lognormal:1.0:0.5
+    python -m benchmarks.loadtest --concurrency 64 --threadpool 80 --mode llm
+    python -m benchmarks.loadtest --url http://localhost:8000 --concurrency 4   # existing server
+
+Artifacts, checkpoints and the audit DB go to a temporary directory.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+from benchmarks.stub_llm import DEFAULT_LATENCY, create_stub_app  # noqa: E402
+
+PAYLOAD = {
+    "companyUrl": "https://bench.example.com",
+    "drugName": "Acmezol",
+    "trialsPapers": "ACME-1 phase 3",
+    "doctorTypes": "cardiologists",
+    "brief": "Launch campaign for Acmezol aimed at cardiologists.",
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class BackgroundServer:
+    """uvicorn serving ``app`` from a daemon thread."""
+
+    def __init__(self, app: Any, port: int):
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self) -> "BackgroundServer":
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError(f"Server on port {self.port} failed to start")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+class ThreadpoolSampler:
+    """Samples the anyio limiter that bounds FastAPI's sync-handler threads."""
+
+    def __init__(self, size: Optional[int] = None, interval: float = 0.05):
+        self.size = size
+        self.interval = interval
+        self.samples: List[Dict[str, float]] = []
+
+    async def run(self) -> None:
+        import anyio.to_thread
+
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        if self.size:
+            limiter.total_tokens = self.size
+        while True:
+            stats = limiter.statistics()
+            self.samples.append({
+                "busy": stats.borrowed_tokens,
+                "total": stats.total_tokens,
+                "waiting": stats.tasks_waiting,
+            })
+            await asyncio.sleep(self.interval)
+
+    def attach(self, app: Any) -> None:
+        async def start() -> None:
+            app.state.threadpool_sampler = asyncio.ensure_future(self.run())
+
+        app.router.on_startup.append(start)
+
+    def report(self) -> Dict[str, Any]:
+        if not self.samples:
+            return {}
+        busy = [s["busy"] for s in self.samples]
+        total = self.samples[-1]["total"]
+        return {
+            "size": total,
+            "max_busy": max(busy),
+            "mean_busy": round(statistics.mean(busy), 1),
+            "saturated_fraction": round(sum(b >= total for b in busy) / len(busy), 3),
+            "max_waiting": max(s["waiting"] for s in self.samples),
+        }
+
+
+def configure_environment(stub_url: str, provider: str, mode: str, workdir: str) -> None:
+    """Point the model router and all on-disk stores at the stub and a scratch dir (before importing the app)."""
+    tiers = {tier: f"{provider}/stub-{tier}" for tier in ("frontier", "standard", "fast")}
+    os.environ["MODEL_ROUTING"] = json.dumps({"tiers": tiers})
+    if provider == "anthropic":
+        os.environ["ANTHROPIC_API_BASE"] = stub_url
+        os.environ.setdefault("ANTHROPIC_API_KEY", "stub")
+    else:
+        os.environ["OPENAI_API_BASE"] = os.environ["OPENAI_BASE_URL"] = f"{stub_url}/v1"
+        os.environ.setdefault("OPENAI_API_KEY", "stub")
+    os.environ["MARKETING_PIPELINE_MODE"] = mode
+    os.environ["ARTIFACT_DIR"] = os.path.join(workdir, "artifacts")
+    os.environ["PIPELINE_CHECKPOINT_DIR"] = os.path.join(workdir, "checkpoints")
+    os.environ["AUDIT_DB"] = os.path.join(workdir, "audits.sqlite3")
+    os.environ["CLAIM_VERDICT_CACHE"] = os.path.join(workdir, "claim_verdicts.json")
+    os.environ["FETCH_HOST_STATE"] = os.path.join(workdir, "fetch_hosts.json")
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+async def drive(url: str, concurrency: int, total: int, timeout: float) -> Dict[str, Any]:
+    latencies: List[float] = []
+    outcomes: Counter = Counter()
+    partial = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        nonlocal partial
+        while not queue.empty():
+            queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                response = await client.post(f"{url}/api/rfp", json=PAYLOAD)
+                outcomes[str(response.status_code)] += 1
+                if response.status_code == 200 and response.json().get("partial"):
+                    partial += 1
+            except httpx.HTTPError as e:
+                outcomes[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    ok = outcomes.get("200", 0)
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(total / elapsed, 3),
+        "ok_rps": round(ok / elapsed, 3),
+        "latency_s": {
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p95": round(percentile(latencies, 0.95), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "max": round(max(latencies), 3),
+        },
+        "error_rate": round(1 - ok / total, 3),
+        "outcomes": dict(outcomes),
+        "partial_responses": partial,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=32, help="total requests to send")
+    parser.add_argument("--latency", default=DEFAULT_LATENCY, help="stub model latency, e.g. lognormal:1.0:0.5")
+    parser.add_argument("--provider", choices=["anthropic", "openai"], default="anthropic")
+    parser.add_argument("--mode", choices=["dag", "llm"], default="dag", help="MARKETING_PIPELINE_MODE")
+    parser.add_argument("--threadpool", type=int, help="size of the sync-handler threadpool (default 40)")
+    parser.add_argument("--url", help="load an already running server instead of starting one")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request client timeout")
+    parser.add_argument("--json", dest="json_out", help="write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="show server/pipeline logs")
+    args = parser.parse_args(argv)
+
+    report: Dict[str, Any] = {"latency_spec": args.latency, "mode": args.mode}
+    with contextlib.ExitStack() as stack:
+        url = args.url
+        stub = None
+        sampler = None
+        if not url:
+            workdir = stack.enter_context(tempfile.TemporaryDirectory(prefix="loadtest_"))
+            stub_app = create_stub_app(args.latency)
+            stub = stack.enter_context(BackgroundServer(stub_app, _free_port()))
+            configure_environment(stub.url, args.provider, args.mode, workdir)
+            from app.server import app
+
+            sampler = ThreadpoolSampler(args.threadpool)
+            sampler.attach(app)
+            url = stack.enter_context(BackgroundServer(app, _free_port())).url
+        if not args.verbose:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+
+        report.update(asyncio.run(drive(url, args.concurrency, args.requests, args.timeout)))
+        if sampler is not None:
+            report["threadpool"] = sampler.report()
+        if stub is not None:
+            report["stub_model"] = stub_app.state.stats.snapshot()
+
+    print(json.dumps(report, indent=2))
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""
+Microbenchmarks for the lead finder hot paths.
+
+Runs scrape_webpage, find_drug_product_pages and the heuristic
+check_fda_compliance over the benchmark corpus (see corpus.py) and reports
+throughput (pages/s, MB/s of HTML), peak traced memory, the number of
+memory blocks a call allocates (counted while its result is still held) and
+memory still held after the result is released. HTTP is replayed from a
+cassette generated from the corpus, so no network is used, and fetch host
+state goes to a temporary file rather than FETCH_HOST_STATE.
+
+    python -m benchmarks.run                 # compare against baselines.json
+    python -m benchmarks.run --save          # record new baselines
+    python -m benchmarks.run --filter large --threshold 0.3
+
+Exits with status 1 when a case is slower (pages/s) or uses more peak
+memory or allocations than its baseline by more than ``--threshold`` (default 20%).
+Timing baselines are relative: each run also times a fixed calibration
+workload, and baseline pages/s are scaled by how fast this machine runs it
+compared with the machine that recorded them. Without a recorded
+calibration only peak memory is compared.
+"""
+
+import argparse
+import base64
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents import fetch as fetch_module  # noqa: E402
+from agents.cassette import CASSETTE_VERSION, request_key, use_cassette  # noqa: E402
+from agents.chief_marketing_agent.sub_agents.lead_finder_agent.agent import (  # noqa: E402
+    check_fda_compliance,
+    find_drug_product_pages,
+    scrape_webpage,
+)
+from benchmarks.corpus import load_corpus  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+DEFAULT_THRESHOLD = 0.2
+CALIBRATION_CASE = "_calibration"
+
+
+def _write_corpus_cassette(pages: Dict[str, Dict[str, str]], path: str) -> None:
+    interactions = []
+    for page in pages.values():
+        body = page["html"].encode("utf-8")
+        interactions.append({
+            "kind": "http",
+            "key": request_key("http", "GET", page["url"]),
+            "request": {"method": "GET", "url": page["url"]},
+            "response": {
+                "status_code": 200,
+                "reason": "OK",
+                "url": page["url"],
+                "headers": {"Content-Type": "text/html; charset=utf-8"},
+                "encoding": "utf-8",
+                "body": base64.b64encode(body).decode("ascii"),
+            },
+            "latency": 0.0,
+        })
+    with open(path, "w") as f:
+        json.dump({"version": CASSETTE_VERSION, "interactions": interactions}, f)
+
+
+def build_cases(pages: Dict[str, Dict[str, str]]) -> List[Tuple[str, int, Callable[[], Any]]]:
+    """(case name, input bytes, zero-argument callable) for every function x page."""
+    cases = []
+    for name, page in pages.items():
+        size = len(page["html"].encode("utf-8"))
+        url = page["url"]
+        content = scrape_webpage(url)
+        cases.append((f"scrape_webpage[{name}]", size, lambda url=url: scrape_webpage(url)))
+        cases.append((f"find_drug_product_pages[{name}]", size, lambda url=url: find_drug_product_pages(url)))
+        # check_fda_compliance only sees the scraped text (capped at 10k chars),
+        # so its MB/s is measured against that, not the page's HTML.
+        text_size = len(content["content"].encode("utf-8"))
+        cases.append((f"check_fda_compliance[{name}]", text_size, lambda content=content: check_fda_compliance(content)))
+    return cases
+
+
+def _calibration_workload() -> Any:
+    # Fixed pure-Python work (no repo code) that tracks interpreter/CPU speed.
+    words = [format(i * 2654435761 % 2**32, "x") for i in range(20_000)]
+    return json.dumps(sorted(words)).count("a")
+
+
+def measure(fn: Callable[[], Any], size: int, min_time: float, min_rounds: int = 3) -> Dict[str, float]:
+    warmup_until = time.perf_counter() + min_time / 5
+    fn()
+    while time.perf_counter() < warmup_until:
+        fn()
+    timings: List[float] = []
+    started = time.perf_counter()
+    while len(timings) < min_rounds or time.perf_counter() - started < min_time:
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    median = statistics.median(timings)
+
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    before_snapshot = tracemalloc.take_snapshot()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    # Blocks allocated by the call and still alive while its result is held.
+    allocations = sum(
+        max(0, stat.count_diff) for stat in tracemalloc.take_snapshot().compare_to(before_snapshot, "lineno")
+    )
+    del result
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "rounds": len(timings),
+        "median_ms": round(median * 1000, 3),
+        "pages_per_s": round(1 / median, 2),
+        "mb_per_s": round(size / median / 1e6, 2),
+        "peak_kb": round((peak - before) / 1024, 1),
+        "allocations": allocations,
+        "retained_kb": round(max(0, after - before) / 1024, 1),
+    }
+
+
+def machine_speed(results: Dict[str, Dict[str, float]], baselines: Dict[str, Dict[str, float]]) -> Optional[float]:
+    """This machine's calibration speed relative to the baselines' machine, if both were measured."""
+    current = results.get(CALIBRATION_CASE)
+    recorded = baselines.get(CALIBRATION_CASE)
+    if not current or not recorded:
+        return None
+    return current["pages_per_s"] / recorded["pages_per_s"]
+
+
+def compare(results: Dict[str, Dict[str, float]], baselines: Dict[str, Dict[str, float]], threshold: float) -> List[str]:
+    regressions = []
+    speed = machine_speed(results, baselines)
+    for case, stats in results.items():
+        base = baselines.get(case)
+        if not base or case == CALIBRATION_CASE:
+            continue
+        expected = base["pages_per_s"] * speed if speed else None
+        if expected and stats["pages_per_s"] < expected * (1 - threshold):
+            regressions.append(
+                f"{case}: {stats['pages_per_s']} pages/s vs scaled baseline {expected:.2f} "
+                f"({stats['pages_per_s'] / expected - 1:+.0%})"
+            )
+        if base["peak_kb"] > 0 and stats["peak_kb"] > base["peak_kb"] * (1 + threshold):
+            regressions.append(
+                f"{case}: peak {stats['peak_kb']} KB vs baseline {base['peak_kb']} KB "
+                f"({stats['peak_kb'] / base['peak_kb'] - 1:+.0%})"
+            )
+        # Baselines recorded before allocation counts were added have none.
+        if base.get("allocations") and stats["allocations"] > base["allocations"] * (1 + threshold):
+            regressions.append(
+                f"{case}: {stats['allocations']} allocations vs baseline {base['allocations']} "
+                f"({stats['allocations'] / base['allocations'] - 1:+.0%})"
+            )
+    return regressions
+
+
+def run(case_filter: Optional[str] = None, min_time: float = 0.5) -> Dict[str, Dict[str, float]]:
+    pages = load_corpus()
+    results: Dict[str, Dict[str, float]] = {CALIBRATION_CASE: measure(_calibration_workload, 0, min_time)}
+    print(f"{CALIBRATION_CASE:<48} {results[CALIBRATION_CASE]['median_ms']:>10.3f} ms")
+    with tempfile.TemporaryDirectory() as tmp:
+        cassette_path = os.path.join(tmp, "corpus.json")
+        _write_corpus_cassette(pages, cassette_path)
+        # Keep benchmark fetches out of the shared breaker state.
+        shared_hosts = fetch_module.hosts
+        fetch_module.hosts = fetch_module.HostHealth(os.path.join(tmp, "fetch_hosts.json"))
+        try:
+            results.update(_run_cases(pages, cassette_path, case_filter, min_time))
+        finally:
+            fetch_module.hosts = shared_hosts
+    return results
+
+
+def _run_cases(
+    pages: Dict[str, Dict[str, str]], cassette_path: str, case_filter: Optional[str], min_time: float
+) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+    with use_cassette(cassette_path, mode="replay", allow_repeats=True):
+        for case, size, fn in build_cases(pages):
+            if case_filter and case_filter not in case:
+                continue
+            results[case] = measure(fn, size, min_time)
+            stats = results[case]
+            print(
+                f"{case:<48} {stats['median_ms']:>10.3f} ms {stats['pages_per_s']:>10.1f} pages/s "
+                f"{stats['mb_per_s']:>8.2f} MB/s  peak {stats['peak_kb']:>9.1f} KB  "
+                f"{stats['allocations']:>7} allocs  retained {stats['retained_kb']:>7.1f} KB"
+            )
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--save", action="store_true", help="write results as the new baselines")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed regression (0.2 = 20%%)")
+    parser.add_argument("--filter", dest="case_filter", help="only run cases containing this substring")
+    parser.add_argument("--min-time", type=float, default=0.5, help="minimum seconds of timing per case")
+    parser.add_argument("--json", dest="json_out", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    results = run(args.case_filter, args.min_time)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.save:
+        baselines: Dict[str, Any] = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baselines = json.load(f)
+        baselines.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Saved {len(results)} baselines to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baselines at {args.baseline}; run with --save to create them")
+        return 0
+    with open(args.baseline) as f:
+        baselines = json.load(f)
+    speed = machine_speed(results, baselines)
+    if speed:
+        print(f"\nMachine speed vs baselines: {speed:.2f}x (timing baselines scaled to match)")
+    else:
+        print(f"\nNo calibration in {args.baseline}; comparing peak memory only (re-record with --save)")
+    regressions = compare(results, baselines, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"\nNo regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+Local stand-in for the model APIs, used by the load test.
+
+Serves Anthropic-style ``POST /v1/messages`` and OpenAI-style
+``POST /v1/chat/completions`` with a canned JSON answer that satisfies
+every marketing pipeline stage (copy variants that pass the compliance
+precheck, an all-clear legal verdict, KOL scores). Each response is
+delayed by a sample from a configurable latency distribution:
+
+    fixed:1.5            always 1.5 s
+    uniform:0.5:3        uniformly between 0.5 and 3 s
+    lognormal:1.2:0.6    median 1.2 s, sigma 0.6 (long right tail)
+
+Run standalone with ``python -m benchmarks.stub_llm --port 8100``.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List
+
+from fastapi import FastAPI, Request
+
+DEFAULT_LATENCY = "lognormal:1.0:0.5"
+
+_VARIANT_BODY = (
+    "Indicated for the treatment of adults with hypertension. Important Safety Information: "
+    "risk of dizziness and other side effects. See full Prescribing Information."
+)
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """Sampler for a latency spec (see module docstring)."""
+    kind, *args = spec.split(":")
+    values = [float(a) for a in args]
+    if kind == "fixed" and len(values) == 1:
+        return lambda: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal" and len(values) == 2:
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1])
+    raise ValueError(f"Invalid latency spec {spec!r}; use fixed:S, uniform:LO:HI or lognormal:MEDIAN:SIGMA")
+
+
+def canned_answer() -> str:
+    score = random.randint(5, 9)
+    return json.dumps({
+        "campaign_brief": {
+            "A": {"headline": "Steady control, every day", "body": _VARIANT_BODY},
+            "B": {"headline": "Trusted by cardiologists", "body": _VARIANT_BODY},
+        },
+        "edits": [],
+        "all_clear": True,
+        "notes": "Clear and balanced.",
+        "score": score,
+        "go_no_go": "go" if score >= 6 else "no-go",
+        "summary": "Variant A preferred.",
+        "recommendation": "A",
+        "feedback": [],
+    })
+
+
+class StubStats:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.delays: List[float] = []
+        self._lock = threading.Lock()
+
+    def start(self, delay: float) -> None:
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.delays.append(delay)
+
+    def finish(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            delays = list(self.delays)
+        return {
+            "calls": self.calls,
+            "max_in_flight": self.max_in_flight,
+            "mean_delay_s": round(sum(delays) / len(delays), 3) if delays else 0.0,
+        }
+
+
+def create_stub_app(latency: str = DEFAULT_LATENCY) -> FastAPI:
+    sample = parse_latency(latency)
+    app = FastAPI(title="Stub LLM")
+    app.state.stats = StubStats()
+
+    async def delay() -> None:
+        seconds = sample()
+        app.state.stats.start(seconds)
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            app.state.stats.finish()
+
+    @app.post("/v1/messages")
+    async def anthropic_messages(request: Request) -> Dict[str, Any]:
+        body = await request.json()
+        await delay()
+        return {
+            "id": f"msg_{uuid.uuid4().hex[:24]}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "stub"),
+            "content": [{"type": "text", "text": canned_answer()}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": 100, "output_tokens": 100},
+        }
+
+    @app.post("/v1/chat/completions")
+    async def openai_chat(request: Request) -> Dict[str, Any]:
+        body = await request.json()
+        await delay()
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": canned_answer()},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 100, "total_tokens": 200},
+        }
+
+    @app.get("/stats")
+    def stats() -> Dict[str, Any]:
+        return app.state.stats.snapshot()
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Stub Anthropic/OpenAI-compatible model server")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", default=DEFAULT_LATENCY)
+    args = parser.parse_args()
+    uvicorn.run(create_stub_app(args.latency), host="127.0.0.1", port=args.port, log_level="warning")
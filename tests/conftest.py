@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Modules create their shared stores on import; keep them out of the real ones.
+_scratch = tempfile.mkdtemp(prefix="agents-tests-")
+os.environ.setdefault("FETCH_HOST_STATE", os.path.join(_scratch, "fetch_hosts.json"))
+os.environ.setdefault("AUDIT_DB", os.path.join(_scratch, "audits.sqlite3"))
+os.environ.setdefault("CRAWL_DB", os.path.join(_scratch, "crawl_frontier.sqlite3"))
+os.environ.setdefault("PIPELINE_CHECKPOINT_DIR", os.path.join(_scratch, "checkpoints"))
+os.environ.setdefault("CLAIM_VERDICT_CACHE", os.path.join(_scratch, "claim_verdicts.json"))
+os.environ.setdefault("ARTIFACT_DIR", os.path.join(_scratch, "artifacts"))
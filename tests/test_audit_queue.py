@@ -0,0 +1,112 @@
+import time
+
+import pytest
+
+import agents.audit_queue as audit_queue
+from agents.audit_queue import AuditQueue, LeaseLost, run_worker
+
+
+def _result(status="COMPLIANT"):
+    return {"url": "https://a.example/p", "title": "P", "compliance_status": status, "analysis": "", "content_preview": ""}
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return AuditQueue(str(tmp_path / "audits.sqlite3"), lease_s=0.05, max_attempts=2)
+
+
+def test_lease_claims_oldest_job_once(queue):
+    queue.enqueue(["https://a.example", "https://b.example"])
+    assert queue.enqueue(["https://a.example"]) == 0
+
+    first = queue.lease("w1")
+    second = queue.lease("w2")
+
+    assert first == {"company_url": "https://a.example", "attempt": 1}
+    assert second["company_url"] == "https://b.example"
+    assert queue.lease("w3") is None
+
+
+def test_expired_lease_is_taken_over(queue):
+    queue.enqueue(["https://a.example"])
+    queue.lease("w1")
+    assert queue.lease("w2") is None
+
+    time.sleep(0.06)
+
+    assert queue.lease("w2") == {"company_url": "https://a.example", "attempt": 2}
+
+
+def test_previous_worker_is_fenced_after_takeover(queue):
+    queue.enqueue(["https://a.example"])
+    queue.lease("w1")
+    time.sleep(0.06)
+    queue.lease("w2")
+
+    assert not queue.heartbeat("https://a.example", "w1")
+    with pytest.raises(LeaseLost):
+        queue.complete("https://a.example", "w1", [_result()])
+    assert queue.fail("https://a.example", "w1", "boom") == "lost"
+
+    assert queue.complete("https://a.example", "w2", [_result()]) == 1
+    assert queue.counts() == {"done": 1}
+
+
+def test_heartbeat_keeps_the_lease(queue):
+    queue.enqueue(["https://a.example"])
+    queue.lease("w1")
+    for _ in range(3):
+        time.sleep(0.03)
+        assert queue.heartbeat("https://a.example", "w1")
+
+    assert queue.lease("w2") is None
+
+
+def test_failed_job_is_retried_then_marked_failed(queue):
+    queue.enqueue(["https://a.example"])
+    queue.lease("w1")
+    assert queue.fail("https://a.example", "w1", "boom") == "queued"
+    queue.lease("w1")
+
+    assert queue.fail("https://a.example", "w1", "boom") == "failed"
+    assert queue.lease("w1") is None
+
+
+def test_job_whose_worker_keeps_dying_is_failed_not_re_leased(queue):
+    queue.enqueue(["https://a.example"])
+    for _ in range(queue.max_attempts):
+        assert queue.lease("w1") is not None
+        time.sleep(0.06)  # the worker died without calling fail()
+
+    assert queue.lease("w2") is None
+    assert queue.counts() == {"failed": 1}
+
+
+def test_worker_completes_empty_sites_and_retries_all_error_sites(queue, monkeypatch):
+    def audit(company_url, record=True, strict=False):
+        assert strict and not record
+        if company_url == "https://errors.example":
+            yield _result("ERROR")
+        elif company_url == "https://ok.example":
+            yield _result()
+
+    monkeypatch.setattr(audit_queue, "_iter_audit", lambda analyzer: audit)
+    monkeypatch.setenv("AUDIT_JOB_MAX_ATTEMPTS", str(queue.max_attempts))
+    queue.enqueue(["https://empty.example", "https://errors.example", "https://ok.example"])
+
+    outcomes = run_worker(queue.path, poll_s=0.01, worker_id="w1")
+
+    assert outcomes == {"done": 2, "retried": 1, "failed": 1, "lost": 0}
+    assert queue.counts() == {"done": 2, "failed": 1}
+
+
+def test_heartbeat_gives_up_the_lease_after_persistent_database_errors(queue, monkeypatch):
+    def locked(company_url, worker_id):
+        raise audit_queue.sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(queue, "heartbeat", locked)
+    heartbeat = audit_queue._Heartbeat(queue, "https://a.example", "w1")
+    heartbeat.start()
+
+    assert heartbeat.lost.wait(1.0)
+    heartbeat.stop()
@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+
+from agents.deadline import Deadline, DeadlineExceeded
+from agents.marketing_agency.checkpoint import CheckpointStore, RunCheckpoint
+from agents.marketing_agency.executor import Stage, StageGraph
+
+
+def _returning(value, delay=0.0, calls=None):
+    async def fn(pipeline):
+        if calls is not None:
+            calls.append(value)
+        await asyncio.sleep(delay)
+        return value
+
+    return fn
+
+
+def _run(graph, **kwargs):
+    return asyncio.run(graph.run({}, **kwargs))
+
+
+def test_runs_stages_after_their_dependencies():
+    async def b(pipeline):
+        await asyncio.sleep(0.01)
+        return pipeline["state"]["a"] + 1
+
+    pipeline = _run(StageGraph([Stage("b", b, ["a"]), Stage("a", _returning(1, 0.01))]))
+
+    assert pipeline["state"] == {"a": 1, "b": 2}
+    assert pipeline["meta"]["partial"] is False
+    assert pipeline["meta"]["critical_path"] == ["a", "b"]
+
+
+def test_independent_stages_overlap():
+    graph = StageGraph([Stage("a", _returning(1, 0.2)), Stage("b", _returning(2, 0.2))])
+
+    pipeline = _run(graph)
+
+    assert pipeline["meta"]["total_duration"] < 0.35
+
+
+def test_rejects_cycles_and_unknown_dependencies():
+    with pytest.raises(ValueError, match="Cycle"):
+        StageGraph([Stage("a", _returning(1), ["b"]), Stage("b", _returning(2), ["a"])])
+    with pytest.raises(ValueError, match="unknown"):
+        StageGraph([Stage("a", _returning(1), ["missing"])])
+
+
+def test_skips_optional_stage_without_budget_and_its_downstream():
+    graph = StageGraph([
+        Stage("a", _returning(1)),
+        Stage("optional", _returning(2), ["a"], optional=True, budget=60.0),
+        Stage("after", _returning(3), ["optional"]),
+    ])
+
+    pipeline = _run(graph, deadline=Deadline(5.0))
+
+    assert pipeline["state"] == {"a": 1}
+    assert pipeline["meta"]["partial"] is True
+    assert pipeline["meta"]["skipped_stages"] == ["optional", "after"]
+    assert pipeline["meta"]["timings"]["after"]["skipped"] == "upstream skipped"
+
+
+def test_cancels_stages_still_running_at_the_deadline():
+    cancelled = []
+
+    async def slow(pipeline):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append("slow")
+            raise
+
+    graph = StageGraph([Stage("fast", _returning(1)), Stage("slow", slow)])
+
+    pipeline = _run(graph, deadline=Deadline(0.2))
+
+    assert cancelled == ["slow"]
+    assert pipeline["state"] == {"fast": 1}
+    assert pipeline["meta"]["skipped_stages"] == ["slow"]
+    assert pipeline["meta"]["timings"]["slow"]["skipped"] == "deadline"
+
+
+def test_deadline_failure_degrades_instead_of_failing():
+    async def timed_out(pipeline):
+        raise DeadlineExceeded("model call")
+
+    pipeline = _run(StageGraph([Stage("a", timed_out), Stage("b", _returning(2))]), deadline=Deadline(30.0))
+
+    assert pipeline["meta"]["skipped_stages"] == ["a"]
+    assert "DeadlineExceeded" in pipeline["meta"]["stage_errors"]["a"]
+
+
+def test_other_failures_propagate_after_siblings_are_cancelled():
+    cleaned_up = []
+
+    async def broken(pipeline):
+        await asyncio.sleep(0.05)
+        raise RuntimeError("bad model output")
+
+    async def sibling(pipeline):
+        try:
+            await asyncio.sleep(10)
+        finally:
+            cleaned_up.append("sibling")
+
+    async def main():
+        graph = StageGraph([Stage("broken", broken), Stage("sibling", sibling)])
+        with pytest.raises(RuntimeError, match="bad model output"):
+            await graph.run({}, deadline=Deadline(30.0))
+        # The cancelled sibling finished its cleanup before run() raised.
+        assert cleaned_up == ["sibling"]
+
+    asyncio.run(main())
+
+
+def test_resumes_from_checkpoints_and_recomputes_invalidated_stages(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    calls = []
+
+    def graph():
+        return StageGraph([
+            Stage("a", _returning("a", calls=calls)),
+            Stage("b", _returning("b", calls=calls), ["a"]),
+            Stage("c", _returning("c", calls=calls), ["b"]),
+        ])
+
+    _run(graph(), checkpoint=RunCheckpoint(store, "run-1", "inputs"))
+    assert calls == ["a", "b", "c"]
+
+    calls.clear()
+    pipeline = _run(graph(), checkpoint=RunCheckpoint(store, "run-1", "inputs"))
+    assert calls == []
+    assert pipeline["meta"]["resumed_stages"] == ["a", "b", "c"]
+    assert pipeline["state"] == {"a": "a", "b": "b", "c": "c"}
+
+    checkpoint = RunCheckpoint(store, "run-1", "inputs")
+    checkpoint.invalidate(graph().downstream(["b"]))
+    calls.clear()
+    pipeline = _run(graph(), checkpoint=checkpoint)
+    assert calls == ["b", "c"]
+    assert pipeline["meta"]["resumed_stages"] == ["a"]
+
+
+def test_does_not_checkpoint_degraded_stages(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+
+    async def degraded(pipeline):
+        pipeline["meta"].setdefault("degraded", {})["a"] = "panel reduced"
+        return "partial"
+
+    _run(StageGraph([Stage("a", degraded)]), checkpoint=RunCheckpoint(store, "run-1", "inputs"))
+
+    assert store.completed("run-1", "inputs") == []
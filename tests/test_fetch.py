@@ -0,0 +1,103 @@
+import json
+import time
+
+import pytest
+
+from agents.fetch import HostHealth
+
+
+@pytest.fixture
+def health(tmp_path):
+    return HostHealth(
+        path=str(tmp_path / "hosts.json"),
+        min_samples=5,
+        timeout_multiplier=3,
+        min_timeout=2,
+        failure_threshold=3,
+        cooloff=0.05,
+        max_cooloff=0.5,
+    )
+
+
+def _trip(health, host="a.example"):
+    for _ in range(health.failure_threshold):
+        health.record_failure(host)
+
+
+def test_timeout_follows_recent_p95(health):
+    assert health.timeout_for("a.example", 10.0) == 10.0  # too few samples
+    for _ in range(10):
+        health.record_success("a.example", 1.0)
+    assert health.timeout_for("a.example", 10.0) == 3.0
+    assert health.timeout_for("a.example", 2.5) == 2.5
+
+
+def test_timeouts_lengthen_the_adaptive_timeout(health):
+    for _ in range(10):
+        health.record_success("a.example", 0.5)
+    assert health.timeout_for("a.example", 10.0) == 2.0
+
+    health.record_failure("a.example", timed_out_after=2.0)
+
+    assert health.timeout_for("a.example", 10.0) == 6.0
+
+
+def test_latency_samples_expire(tmp_path):
+    health = HostHealth(path=str(tmp_path / "hosts.json"), min_samples=5, sample_ttl=0.05)
+    for _ in range(10):
+        health.record_success("a.example", 0.5)
+    time.sleep(0.1)
+
+    assert health.timeout_for("a.example", 10.0) == 10.0
+
+
+def test_breaker_opens_after_consecutive_failures(health):
+    health.record_failure("a.example")
+    health.record_success("a.example", 0.1)  # resets the count
+    health.record_failure("a.example")
+    health.record_failure("a.example")
+    assert health.allow("a.example")
+
+    health.record_failure("a.example")
+
+    assert not health.allow("a.example")
+    assert health.allow("b.example")
+
+
+def test_probe_after_cooloff_uses_full_timeout_and_success_closes(health):
+    for _ in range(10):
+        health.record_success("a.example", 0.5)
+    _trip(health)
+    time.sleep(0.06)
+
+    assert health.allow("a.example", probe_timeout=10.0)
+    # Only one probe at a time; it gets the caller's full timeout.
+    assert not health.allow("a.example", probe_timeout=10.0)
+    assert health.timeout_for("a.example", 10.0) == 10.0
+
+    health.record_success("a.example", 0.5)
+
+    assert health.allow("a.example")
+    assert health.allow("a.example")
+
+
+def test_failed_probe_reopens_with_doubled_cooloff(health):
+    _trip(health)
+    first = health.open_until("a.example") - time.time()
+    time.sleep(0.06)
+    assert health.allow("a.example")
+
+    health.record_failure("a.example")
+
+    assert not health.allow("a.example")
+    assert health.open_until("a.example") - time.time() > first * 1.5
+
+
+def test_breaker_state_is_shared_through_the_state_file(health):
+    _trip(health)
+
+    other = HostHealth(path=health.path, failure_threshold=3)
+
+    assert not other.allow("a.example")
+    with open(health.path) as f:
+        assert json.load(f)["hosts"]["a.example"]["failures"] == 3
@@ -0,0 +1,77 @@
+import math
+
+import pytest
+
+from agents.marketing_agency.stages import MIN_KOLS_PER_ARM_FLOOR, sequential_decision
+from agents.marketing_agency.stats import welch_t_test
+
+
+def _feedback(a_scores, b_scores):
+    return [{"variant": "A", "score": s} for s in a_scores] + [{"variant": "B", "score": s} for s in b_scores]
+
+
+def test_welch_t_test_matches_reference_values():
+    # scipy.stats.ttest_ind([1, 2, 3, 4, 5], [2, 4, 6, 8, 10], equal_var=False)
+    t, df, p = welch_t_test([1, 2, 3, 4, 5], [2, 4, 6, 8, 10])
+    assert t == pytest.approx(-1.8974, abs=1e-4)
+    assert df == pytest.approx(5.8824, abs=1e-4)
+    assert p == pytest.approx(0.1075, abs=1e-4)
+
+
+def test_welch_t_test_floors_variance_of_identical_scores():
+    _, _, p = welch_t_test([8, 8, 8], [7, 7, 7], min_var=1.0)
+    assert 0.05 < p < 1.0
+
+
+def test_clear_difference_is_decisive():
+    decision = sequential_decision(_feedback([9, 9, 8, 9, 9, 8], [3, 4, 3, 2, 3, 4]), confidence=0.95, looks=3)
+
+    assert decision["decisive"] is True
+    assert decision["p_value"] < decision["alpha"]
+    assert decision["alpha"] == pytest.approx(0.05 / 3)
+    assert decision["n"] == {"A": 6, "B": 6}
+
+
+def test_no_difference_is_not_decisive():
+    decision = sequential_decision(_feedback([7, 6, 8, 7], [7, 8, 6, 7]), confidence=0.95, looks=2)
+
+    assert decision["decisive"] is False
+    assert decision["p_value"] > 0.5
+
+
+def test_not_decisive_before_each_arm_has_minimum_scores():
+    decision = sequential_decision(_feedback([10, 10, 10, 10, 10], [1, 1]), confidence=0.95, looks=1)
+
+    assert decision["decisive"] is False
+    assert decision["p_value"] is None
+
+
+def test_min_per_arm_cannot_go_below_the_floor():
+    scores = [10] * (MIN_KOLS_PER_ARM_FLOOR - 1), [1] * (MIN_KOLS_PER_ARM_FLOOR - 1)
+    decision = sequential_decision(_feedback(*scores), confidence=0.95, looks=1, min_per_arm=1)
+
+    assert decision["p_value"] is None
+
+
+def test_ignores_unscored_and_unknown_variants():
+    feedback = _feedback([9, 9, 9, 9], [2, 2, 2, 2]) + [
+        {"variant": "A", "score": "n/a"},
+        {"variant": "C", "score": 5},
+        {"variant": "B"},
+    ]
+
+    decision = sequential_decision(feedback, confidence=0.95, looks=1)
+
+    assert decision["n"] == {"A": 4, "B": 4}
+    assert decision["mean"] == {"A": 9.0, "B": 2.0}
+
+
+def test_splitting_alpha_across_looks_is_more_conservative():
+    feedback = _feedback([8, 7, 8, 9, 7], [6, 7, 5, 6, 6])
+
+    single = sequential_decision(feedback, confidence=0.95, looks=1)
+    many = sequential_decision(feedback, confidence=0.95, looks=10)
+
+    assert single["p_value"] == many["p_value"]
+    assert math.isclose(many["alpha"], single["alpha"] / 10)
+    assert single["decisive"] and not many["decisive"]